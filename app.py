@@ -34,18 +34,24 @@ def prepare_data():
             st.error("❌ Data folder empty! Please commit your 'data/raw' folder to Git and redeploy.")
             st.stop()
 
-    # 3. Check if indices exist, if not run ingestion (Skip for Pinecone)
     # 3. Check if indices exist (Files should be baked in)
-    bm25_path = os.path.join(INDEX_DIR, "bm25.pkl")
+    bm25_dir = os.path.join(INDEX_DIR, "bm25")
+    chunks_dir = os.path.join(INDEX_DIR, "chunks")
+    legacy_bm25_path = os.path.join(INDEX_DIR, "bm25.pkl")
     
     # Only download if absolutely missing (Fallback for dev env)
-    if not os.path.exists(bm25_path):
+    if not (os.path.isdir(bm25_dir) and os.path.isdir(chunks_dir)) and not os.path.exists(legacy_bm25_path):
         with st.spinner("Downloading Knowledge Base (Dev Mode)..."):
              try:
-                from huggingface_hub import hf_hub_download
+                from huggingface_hub import hf_hub_download, snapshot_download
                 os.makedirs(INDEX_DIR, exist_ok=True)
-                hf_hub_download(repo_id="yuvis/enterprise-rag-index", filename="index/bm25.pkl", repo_type="dataset", local_dir="data")
-                hf_hub_download(repo_id="yuvis/enterprise-rag-index", filename="index/doc_map.pkl", repo_type="dataset", local_dir="data")
+                # Pickle-free BM25 index and chunk store (memory-mapped at load time)
+                snapshot_download(repo_id="yuvis/enterprise-rag-index", repo_type="dataset", local_dir="data",
+                                  allow_patterns=["index/bm25/*", "index/chunks/*"])
+                if not (os.path.isdir(bm25_dir) and os.path.isdir(chunks_dir)):
+                    # Index uploaded before the pickle-free format
+                    hf_hub_download(repo_id="yuvis/enterprise-rag-index", filename="index/bm25.pkl", repo_type="dataset", local_dir="data")
+                    hf_hub_download(repo_id="yuvis/enterprise-rag-index", filename="index/doc_map.pkl", repo_type="dataset", local_dir="data")
              except Exception:
                  pass
 
@@ -115,54 +121,64 @@ if prompt := st.chat_input("Ask a question about your documents..."):
     
     # Generate response
     with st.chat_message("assistant"):
-        with st.spinner("Searching and generating answer..."):
-            pipeline = load_pipeline()
-            
-            if pipeline is None:
-                st.error("Pipeline not loaded. Please check configuration.")
-            else:
-                try:
-                    result = pipeline.run(
+        pipeline = load_pipeline()
+        
+        if pipeline is None:
+            st.error("Pipeline not loaded. Please check configuration.")
+        else:
+            try:
+                # Stream tokens into the placeholder as the LLM generates them
+                answer_box = st.empty()
+                answer = ""
+                result = None
+                with st.spinner("Searching documents..."):
+                    events = pipeline.run_stream(
                         query=prompt,
                         top_k_retrieval=top_k_retrieval,
                         top_k_rerank=top_k_rerank
                     )
+                    # Retrieval + reranking run before the first (context) event is produced
+                    next(events)
+                for event in events:
+                    if event["type"] == "token":
+                        answer += event["content"]
+                        answer_box.markdown(answer + "▌")
+                    elif event["type"] == "done":
+                        result = event
+                answer_box.markdown(result["answer"])
+                
+                # Display metadata in expander
+                with st.expander("📋 View Details"):
+                    col1, col2, col3 = st.columns(3)
                     
-                    # Display answer
-                    st.markdown(result["answer"])
+                    with col1:
+                        st.metric("Retrieval Score", f"{result.get('retrieval_score', 'N/A'):.2f}")
                     
-                    # Display metadata in expander
-                    with st.expander("📋 View Details"):
-                        col1, col2, col3 = st.columns(3)
-                        
-                        with col1:
-                            st.metric("Retrieval Score", f"{result.get('retrieval_score', 'N/A'):.2f}")
-                        
-                        with col2:
-                            hallucination = result.get('hallucination_score', 'N/A')
-                            if hallucination != 'N/A':
-                                st.metric("Hallucination Score", f"{hallucination:.2f}")
-                        
-                        with col3:
-                            groundedness = result.get('groundedness', 'N/A')
-                            if groundedness != 'N/A':
-                                st.metric("Groundedness", f"{groundedness:.2f}")
-                        
-                        # Show retrieved context
-                        if result.get("context"):
-                            st.markdown("**Retrieved Context:**")
-                            for i, (doc, score) in enumerate(result["context"][:3], 1):
-                                st.markdown(f"{i}. [Score: {score:.2f}] {doc[:200]}...")
+                    with col2:
+                        hallucination = result.get('hallucination_score', 'N/A')
+                        if hallucination != 'N/A':
+                            st.metric("Hallucination Score", f"{hallucination:.2f}")
                     
-                    # Add to chat history
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": result["answer"]
-                    })
+                    with col3:
+                        groundedness = result.get('groundedness', 'N/A')
+                        if groundedness != 'N/A':
+                            st.metric("Groundedness", f"{groundedness:.2f}")
                     
-                except Exception as e:
-                    st.error(f"Error generating response: {e}")
-                    st.exception(e)
+                    # Show retrieved context
+                    if result.get("context"):
+                        st.markdown("**Retrieved Context:**")
+                        for i, (doc, score) in enumerate(result["context"][:3], 1):
+                            st.markdown(f"{i}. [Score: {score:.2f}] {doc[:200]}...")
+                
+                # Add to chat history
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": result["answer"]
+                })
+                
+            except Exception as e:
+                st.error(f"Error generating response: {e}")
+                st.exception(e)
 
 # Footer
 st.divider()
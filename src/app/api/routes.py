@@ -1,22 +1,58 @@
+import asyncio
+import json
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from src.config import get_section
 from src.pipeline.query_pipeline import QueryPipeline
+from src.utils.startup import ComponentLoader
 
 router = APIRouter()
 _pipeline = None
+# Load state of the pipeline and each of its components, for /ready
+_startup = ComponentLoader()
+
+def _build_pipeline() -> QueryPipeline:
+    pipe = QueryPipeline(loader=_startup)
+    if get_section("startup").get("warmup", True):
+        try:
+            _startup.run("warmup", pipe.warmup)
+        except Exception as e:
+            # A failed warmup only means a slower first request
+            print(f"WARNING: Pipeline warmup failed ({e}).")
+    return pipe
+
+def start_pipeline():
+    """Starts loading (and warming up) the pipeline in the background; no-op once started, unless it failed."""
+    _startup.start("pipeline", _build_pipeline)
 
 def get_pipeline():
+    """The pipeline, waiting for it to finish loading if needed."""
     global _pipeline
     if _pipeline is None:
-        _pipeline = QueryPipeline()
+        start_pipeline()
+        _pipeline = _startup.get("pipeline")
     return _pipeline
 
+def readiness() -> Tuple[bool, Dict[str, dict]]:
+    """(ready, per-component state and load seconds). Ready once the pipeline is loaded and warmed up."""
+    ready = _pipeline is not None or _startup.state("pipeline") == "ready"
+    return ready, _startup.status()
+
 class QueryRequest(BaseModel):
     query: str
     top_k_retrieval: Optional[int] = 20
     top_k_rerank: Optional[int] = 5
     use_hyde: Optional[bool] = False
+    # Query-time ANN knobs for HNSW/IVF indexes, e.g. {"ef_search": 128} or {"nprobe": 32}
+    search_params: Optional[Dict[str, int]] = None
+    # Dense weight in hybrid fusion (0 = pure BM25, 1 = pure dense); None uses retrieval.weights
+    alpha: Optional[float] = None
+    # Cross-encoder latency budget for this request; None uses reranker.cascade.budget_ms
+    rerank_budget_ms: Optional[float] = None
+    # Return the per-stage latency breakdown (ms) in the response
+    include_timings: Optional[bool] = False
 
 class DocResponse(BaseModel):
     content: str
@@ -26,17 +62,111 @@ class QueryResponse(BaseModel):
     query: str
     answer: str
     context: List[tuple]
+    cache_hit: bool = False
+    # Cascade rerank report: candidates, pairs_scored, batches, stop_reason, elapsed_ms
+    rerank_stats: Optional[Dict[str, Any]] = None
+    # Context packing report: max_tokens, tokens, tokenizer, input_tokens, units, selected_units, passages
+    context_stats: Optional[Dict[str, Any]] = None
+    # Per-stage latency in ms (embed, bm25, vector_search, fusion, dedup, rerank, llm, ...), if requested
+    timings: Optional[Dict[str, float]] = None
+
+class DocumentIn(BaseModel):
+    # Replaces every chunk of a document already indexed under this id (ingested files use their path)
+    id: str
+    text: str
+
+class UpsertRequest(BaseModel):
+    documents: List[DocumentIn]
+
+class DeleteRequest(BaseModel):
+    ids: List[str]
 
 @router.post("/chat", response_model=QueryResponse)
 async def chat(request: QueryRequest):
     try:
-        pipe = get_pipeline()
+        # Waits off the event loop while the pipeline is still loading
+        pipe = _pipeline or await asyncio.to_thread(get_pipeline)
         
-        result = pipe.run(
+        # Awaited: CPU stages run on the pipeline executor and the LLM call is async,
+        # so concurrent chats are not serialized on the event loop
+        result = await pipe.arun(
             query=request.query, 
             top_k_retrieval=request.top_k_retrieval,
-            top_k_rerank=request.top_k_rerank
+            top_k_rerank=request.top_k_rerank,
+            search_params=request.search_params,
+            alpha=request.alpha,
+            rerank_budget_ms=request.rerank_budget_ms
         )
+        if not request.include_timings:
+            result = {**result, "timings": None}
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/chat/stream")
+def chat_stream(request: QueryRequest):
+    """
+    Server-Sent Events: a `context` event once retrieval and reranking finish,
+    `token` events as the LLM generates, then `done` with the full response.
+    The generator is synchronous, so Starlette drives it from its threadpool.
+    """
+    try:
+        pipe = get_pipeline()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    def events():
+        try:
+            for event in pipe.run_stream(
+                query=request.query,
+                top_k_retrieval=request.top_k_retrieval,
+                top_k_rerank=request.top_k_rerank,
+                search_params=request.search_params,
+                alpha=request.alpha,
+                rerank_budget_ms=request.rerank_budget_ms
+            ):
+                if event["type"] == "done" and not request.include_timings:
+                    event = {**event, "timings": None}
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'detail': str(e)})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Document endpoints are sync: Starlette runs them in its threadpool (chunking and embedding are CPU-bound)
+@router.post("/documents")
+def upsert_documents(request: UpsertRequest):
+    """Adds or replaces documents; they are searchable as soon as the call returns."""
+    try:
+        live = get_pipeline().index.live
+        return live.upsert([{"id": doc.id, "text": doc.text} for doc in request.documents])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/documents/delete")
+def delete_documents(request: DeleteRequest):
+    """Removes documents by id; unknown ids are listed under `missing`."""
+    try:
+        return get_pipeline().index.live.delete(request.ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/documents/{doc_id:path}")
+def delete_document(doc_id: str):
+    """Removes one document by id; 404 if it is unknown."""
+    try:
+        result = get_pipeline().index.live.delete([doc_id])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if result["missing"]:
+        raise HTTPException(status_code=404, detail=f"Unknown document '{doc_id}'")
+    return result
+
+@router.get("/documents/stats")
+def document_stats():
+    """Live index state: snapshot version, segments, live chunks, pending deletes, merges run."""
+    try:
+        return get_pipeline().index.live.stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,9 @@
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from src.app.api import routes
+from src.config import get_section
+from src.utils.tracing import HTTP_LATENCY
 import uvicorn
 import os
 from dotenv import load_dotenv
@@ -9,11 +13,58 @@ load_dotenv()
 
 app = FastAPI(title="Enterprise RAG Search API")
 
-app.include_router(routes.router, prefix="/api/v1")
+API_PREFIX = "/api/v1"
+app.include_router(routes.router, prefix=API_PREFIX)
+
+@app.middleware("http")
+async def observe_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Labelled with the matched route's template (/api/v1/documents/{doc_id}); unmatched paths share one
+    # label, to keep label cardinality bounded
+    route = request.scope.get("route")
+    path = "unmatched"
+    if route is not None:
+        path = getattr(route, "path_format", route.path)
+        # Depending on the FastAPI version, routes of an included router carry the prefix or not
+        if request.url.path.startswith(API_PREFIX + "/") and not path.startswith(API_PREFIX + "/"):
+            path = API_PREFIX + path
+    HTTP_LATENCY.labels(request.method, path, str(response.status_code)).observe(time.perf_counter() - start)
+    return response
+
+@app.on_event("startup")
+def preload_pipeline():
+    """Starts loading models and indexes at process start, instead of on the first request."""
+    if get_section("startup").get("preload", True):
+        routes.start_pipeline()
+
+@app.on_event("shutdown")
+def fold_live_documents():
+    """Persists documents upserted at runtime that are still only held in memory."""
+    pipeline = routes._pipeline
+    if pipeline is not None and pipeline.index.live.persist:
+        pipeline.index.live.fold()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus exposition: per-stage latency histograms, cache and rerank counters, HTTP latency."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready(response: Response):
+    """
+    Readiness (unlike /health, which only says the process is up): 503 until the
+    pipeline is loaded and warmed up, then 200. Reports each component's state
+    (loading | ready | failed) and load seconds.
+    """
+    is_ready, components = routes.readiness()
+    if not is_ready:
+        response.status_code = 503
+    return {"ready": is_ready, "components": components}
+
 if __name__ == "__main__":
     uvicorn.run("src.app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,17 @@
+import os
+from functools import lru_cache
+import yaml
+
+CONFIG_PATH = os.getenv("RAG_CONFIG", "configs/default.yaml")
+
+@lru_cache(maxsize=None)
+def load_config(path: str = CONFIG_PATH) -> dict:
+    """Loads the YAML config once per process. A missing file yields an empty config."""
+    if not os.path.exists(path):
+        print(f"Config file {path} not found, using built-in defaults.")
+        return {}
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+def get_section(name: str) -> dict:
+    return load_config().get(name) or {}
@@ -1,14 +1,103 @@
-from sentence_transformers import SentenceTransformer
-import torch
+import numpy as np
+from typing import Optional
+from src.config import get_section
+from src.utils.cache import FileCache, LRUCache, normalize_text
+from src.utils.batching import MicroBatcher
+from src.inference.onnx_export import load_model
+from src.utils.tracing import cache_event, span
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of query embeddings keyed by model name + normalized query.
+    An optional FileCache tier lets uvicorn workers on one host share entries.
+    """
+    def __init__(self, model_name: str, max_entries: int = 10000, max_bytes: Optional[int] = None,
+                 file_path: Optional[str] = None):
+        self.model_name = model_name
+        self.memory = LRUCache(max_entries=max_entries, max_bytes=max_bytes, sizeof=lambda v: v.nbytes)
+        self.file = FileCache(file_path, max_entries=max_entries * 10) if file_path else None
+
+    @classmethod
+    def from_config(cls, model_name: str) -> Optional["QueryEmbeddingCache"]:
+        """Builds the cache from embeddings.query_cache, or returns None if it is disabled."""
+        cfg = get_section("embeddings").get("query_cache") or {}
+        if not cfg.get("enabled"):
+            return None
+        file_path = cfg.get("path") if cfg.get("backend") == "file" else None
+        return cls(model_name, max_entries=cfg.get("max_entries", 10000),
+                   max_bytes=cfg.get("max_bytes"), file_path=file_path)
+
+    def key(self, text: str) -> str:
+        return f"{self.model_name}\x00{normalize_text(text)}"
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.key(text)
+        vector = self.memory.get(key)
+        if vector is None and self.file is not None:
+            blob = self.file.get(key)
+            if blob is not None:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                self.memory.put(key, vector)
+        return vector
+
+    def put(self, text: str, vector: np.ndarray):
+        key = self.key(text)
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        self.memory.put(key, vector)
+        if self.file is not None:
+            self.file.put(key, vector.tobytes())
+
+    def stats(self) -> dict:
+        return self.memory.stats()
+
 
 class Embedder:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", device: str = None):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", device: str = None,
+                 query_cache: Optional[QueryEmbeddingCache] = None, batching: Optional[dict] = None,
+                 backend: Optional[str] = None, quantization: Optional[str] = None):
+        # Heavy imports deferred to model construction, off the module import path
+        import torch
+        from sentence_transformers import SentenceTransformer
         if device is None:
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
         else:
             self.device = device
-            
-        self.model = SentenceTransformer(model_name, device=self.device)
 
-    def embed(self, texts: list[str]):
+        self.model_name = model_name
+        # torch or ONNX Runtime (optionally int8), per the inference config unless overridden
+        self.model = load_model(SentenceTransformer, model_name, backend=backend, quantization=quantization,
+                                device=self.device)
+        self.query_cache = query_cache
+        # Concurrent embed calls share encode batches (embeddings.batching in the config)
+        if batching is None:
+            batching = get_section("embeddings").get("batching")
+        self.batcher = MicroBatcher.from_config(self._encode, batching, name="embedder-batcher")
+
+    def _encode(self, texts: list[str]):
         return self.model.encode(texts, convert_to_numpy=True)
+
+    def embed(self, texts: list[str]):
+        if self.batcher is not None:
+            return self.batcher.submit(list(texts))
+        return self._encode(texts)
+
+    def embed_queries(self, queries: list[str]) -> np.ndarray:
+        """
+        Like embed, but goes through the query cache when one is configured:
+        only cache misses reach the model, in a single encode call.
+        """
+        if self.query_cache is None:
+            with span("embed"):
+                return self.embed(queries)
+
+        vectors = [self.query_cache.get(q) for q in queries]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        for vector in vectors:
+            cache_event("query_embedding", vector is not None)
+        if missing:
+            with span("embed"):
+                fresh = self.embed([queries[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                self.query_cache.put(queries[i], vector)
+                vectors[i] = vector
+        return np.vstack(vectors).astype(np.float32, copy=False)
@@ -1,46 +1,312 @@
-import pickle
-from rank_bm25 import BM25Okapi
-from typing import List
+import copy
+import re
+from typing import Iterable, List, Optional, Tuple
 import os
+import numpy as np
+from src.indexer import storage
+
+_TOKEN_RE = re.compile(r'\w+')
 
 class BM25Index:
-    def __init__(self):
-        self.bm25 = None
-        self.corpus = []
+    """
+    Okapi BM25 over a CSR-style inverted index.
+
+    Postings for term t live in postings_doc/postings_tf[term_ptr[t]:term_ptr[t + 1]],
+    so a query only touches the posting lists of its own terms instead of
+    scoring every document. Scoring matches rank_bm25.BM25Okapi (k1, b, epsilon).
+    Documents are addressed by row id; their text lives in the ChunkStore.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.vocab = {}
+        self.term_ptr = None
+        self.postings_doc = None
+        self.postings_tf = None
+        self.doc_len = None
+        self.idf = None
+        self.avgdl = 0.0
+        # Boolean mask of tombstoned rows (None = nothing deleted)
+        self.deleted = None
+        self._stats = None
 
     def _tokenize(self, text: str) -> List[str]:
-        import re
-        return re.findall(r'\w+', text.lower())
+        return _TOKEN_RE.findall(text.lower())
 
-    def build(self, corpus: List[str]):
+    @property
+    def num_docs(self) -> int:
+        return 0 if self.doc_len is None else len(self.doc_len)
+
+    def build(self, corpus: Iterable[str]):
         """
         Builds the BM25 index from a list of documents/chunks.
         """
-        self.corpus = corpus
-        tokenized_corpus = [self._tokenize(doc) for doc in corpus]
-        self.bm25 = BM25Okapi(tokenized_corpus)
+        self.vocab = {}
+        self.term_ptr = np.zeros(1, dtype=np.int64)
+        self.postings_doc = np.zeros(0, dtype=np.int32)
+        self.postings_tf = np.zeros(0, dtype=np.float32)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.deleted = None
+        self.add_documents(corpus)
+
+    def _block_postings(self, docs: List[str], vocab: dict, first_doc: int):
+        """(term, doc, tf) postings of a block of documents, sorted by term then doc, plus doc lengths."""
+        term_ids = []
+        doc_ids = []
+        doc_len = np.zeros(len(docs), dtype=np.float32)
+        for doc_id, doc in enumerate(docs):
+            tokens = self._tokenize(doc)
+            doc_len[doc_id] = len(tokens)
+            for token in tokens:
+                term_ids.append(vocab.setdefault(token, len(vocab)))
+            doc_ids.append(np.full(len(tokens), doc_id, dtype=np.int32))
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.concatenate(doc_ids) if doc_ids else np.zeros(0, dtype=np.int32)
+
+        # Collapse (term, doc) occurrences into postings sorted by term then doc
+        keys = term_ids * max(len(docs), 1) + doc_ids
+        unique_keys, tf = np.unique(keys, return_counts=True)
+        terms = unique_keys // max(len(docs), 1)
+        doc_ids = (unique_keys % max(len(docs), 1)).astype(np.int32) + first_doc
+        return terms, doc_ids, tf.astype(np.float32), doc_len
+
+    def add_documents(self, corpus: Iterable[str], block_size: int = 10000) -> np.ndarray:
+        """
+        Appends documents as new rows (num_docs, num_docs + 1, ...) and returns
+        their row ids. Only the new documents are tokenized, block_size at a time
+        (corpus may be a generator, e.g. streamed from disk); their postings are
+        merged into the existing CSR arrays and corpus statistics recomputed.
+        """
+        start = self.num_docs
+        vocab = dict(self.vocab)
+        # Existing postings first; every block's doc ids are larger than all before it
+        terms = [np.repeat(np.arange(len(self.vocab), dtype=np.int64), np.diff(self.term_ptr))]
+        docs, tfs, doc_lens = [self.postings_doc], [self.postings_tf], [self.doc_len]
+        block = []
+        count = 0
+        for doc in corpus:
+            block.append(doc)
+            if len(block) == block_size:
+                for out, part in zip((terms, docs, tfs, doc_lens), self._block_postings(block, vocab, start + count)):
+                    out.append(part)
+                count += len(block)
+                block = []
+        if block:
+            for out, part in zip((terms, docs, tfs, doc_lens), self._block_postings(block, vocab, start + count)):
+                out.append(part)
+            count += len(block)
 
-    def search(self, query: str, top_k: int = 10):
-        if not self.bm25:
+        # A stable sort by term keeps each merged posting list sorted by doc
+        post_terms = np.concatenate(terms)
+        order = np.argsort(post_terms, kind="stable")
+        self.postings_doc = np.concatenate(docs)[order]
+        self.postings_tf = np.concatenate(tfs)[order]
+
+        self.vocab = vocab
+        self.term_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(post_terms, minlength=len(vocab)), out=self.term_ptr[1:])
+        self.doc_len = np.concatenate(doc_lens)
+        if self.deleted is not None:
+            self.deleted = np.concatenate([self.deleted, np.zeros(count, dtype=bool)])
+        self._finalize()
+        return np.arange(start, start + count, dtype=np.int32)
+
+    def delete(self, rows) -> None:
+        """
+        Tombstones rows: they never score again and drop out of the corpus
+        statistics (N, df, avgdl), but keep their row ids so the other indexes
+        stay aligned. Rows are only reclaimed by a full rebuild.
+        """
+        deleted = np.zeros(self.num_docs, dtype=bool) if self.deleted is None else np.array(self.deleted)
+        deleted[np.asarray(rows, dtype=np.int64)] = True
+        self.deleted = deleted
+        self._finalize()
+
+    @property
+    def num_deleted(self) -> int:
+        return 0 if self.deleted is None else int(self.deleted.sum())
+
+    def term_stats(self) -> Tuple[int, float, np.ndarray]:
+        """(live documents, their total length, document frequency of every term) of the live corpus."""
+        if self._stats is None:
+            if self.deleted is None or not self.deleted.any():
+                live_len = self.doc_len
+                df = np.diff(self.term_ptr).astype(np.float64)
+            else:
+                live_len = self.doc_len[~self.deleted]
+                post_terms = np.repeat(np.arange(len(self.vocab)), np.diff(self.term_ptr))
+                df = np.bincount(post_terms[~self.deleted[self.postings_doc]],
+                                 minlength=len(self.vocab)).astype(np.float64)
+            self._stats = (len(live_len), float(live_len.sum()), df)
+        return self._stats
+
+    def _finalize(self):
+        """Derives corpus statistics (avgdl, idf) of the live documents from the posting arrays."""
+        self._stats = None
+        n_docs, total_len, df = self.term_stats()
+        self._set_stats(n_docs, total_len / n_docs if n_docs else 0.0, df)
+
+    def _set_stats(self, n_docs: int, avgdl: float, df: np.ndarray, mean_idf: Optional[float] = None):
+        self.avgdl = avgdl
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+        # Same negative-idf floor as rank_bm25.BM25Okapi (epsilon x the mean idf of the vocabulary)
+        if len(idf):
+            idf[idf < 0] = self.epsilon * (idf.mean() if mean_idf is None else mean_idf)
+        self.idf = idf.astype(np.float32)
+        self._norm = (self.k1 * (1 - self.b + self.b * self.doc_len / max(self.avgdl, 1e-9))).astype(np.float32)
+
+    def with_corpus_stats(self, n_docs: int, avgdl: float, df: np.ndarray,
+                          mean_idf: Optional[float] = None) -> "BM25Index":
+        """
+        Shallow copy that scores with externally supplied corpus statistics
+        (df aligned with this index's vocab), e.g. summed over several indexes
+        searched together so that their scores are comparable. mean_idf is the
+        mean over the combined vocabulary, for the negative-idf floor.
+        """
+        view = copy.copy(self)
+        view._set_stats(n_docs, avgdl, np.asarray(df, dtype=np.float64), mean_idf=mean_idf)
+        return view
+
+    def _query_terms(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Maps a query to (known term ids, multiplicity); unknown terms score zero."""
+        counts = {}
+        for token in self._tokenize(query):
+            term_id = self.vocab.get(token)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0) + 1
+        return np.fromiter(counts.keys(), dtype=np.int64), np.fromiter(counts.values(), dtype=np.float32)
+
+    def _term_scores(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 contribution of one term to every document in its posting list."""
+        start, end = self.term_ptr[term_id], self.term_ptr[term_id + 1]
+        docs = self.postings_doc[start:end]
+        tf = self.postings_tf[start:end]
+        return docs, self.idf[term_id] * (tf * (self.k1 + 1)) / (tf + self._norm[docs])
+
+    def get_scores(self, query: str) -> np.ndarray:
+        """Dense score vector over the whole corpus (docs without query terms score 0)."""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term_id, count in zip(*self._query_terms(query)):
+            docs, contrib = self._term_scores(term_id)
+            # Doc ids are unique within a posting list, so fancy-index add is safe
+            scores[docs] += count * contrib
+        if self.deleted is not None:
+            scores[self.deleted] = 0
+        return scores
+
+    def search(self, query: str, top_k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (row ids, scores) of the top_k documents, best first."""
+        return self.search_batch([query], top_k=top_k)[0]
+
+    def search_batch(self, queries: List[str], top_k: int = 10, block_size: int = 32,
+                     exclude: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Scores many queries at once. Each posting list is read and scored once per
+        block of queries, then scattered into every query of the block that uses the term.
+        block_size bounds the (queries x docs) score matrix held in memory.
+        exclude: rows left out of the results, like deleted ones (e.g. rows deleted from a live index).
+        """
+        if self.term_ptr is None:
             raise ValueError("Index not built.")
-        tokenized_query = self._tokenize(query)
-        scores = self.bm25.get_scores(tokenized_query)
-        top_n = self.bm25.get_top_n(tokenized_query, self.corpus, n=top_k)
-        return top_n, scores
+        parsed = [self._query_terms(q) for q in queries]
+        results = []
+        for start in range(0, len(parsed), block_size):
+            block = parsed[start:start + block_size]
+            term_users = {}
+            for qi, (term_ids, counts) in enumerate(block):
+                for term_id, count in zip(term_ids.tolist(), counts.tolist()):
+                    term_users.setdefault(term_id, []).append((qi, count))
+
+            scores = np.zeros((len(block), self.num_docs), dtype=np.float32)
+            for term_id, users in term_users.items():
+                docs, contrib = self._term_scores(term_id)
+                for qi, count in users:
+                    scores[qi, docs] += count * contrib
+            if self.deleted is not None:
+                scores[:, self.deleted] = 0
+            if exclude is not None and len(exclude):
+                scores[:, exclude] = 0
+            results.extend(self._top_k(scores, top_k))
+        return results
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Row-wise top_k of a (queries x docs) score matrix via argpartition."""
+        top_k = min(top_k, scores.shape[1])
+        if top_k <= 0:
+            return [(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)) for _ in range(len(scores))]
+
+        top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1).astype(np.int32)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        # Documents sharing no term with the query are not hits
+        return [(rows[row_scores > 0], row_scores[row_scores > 0]) for rows, row_scores in zip(top, top_scores)]
 
     def save(self, path: str):
-        with open(path, 'wb') as f:
-            pickle.dump((self.bm25, self.corpus), f)
+        """
+        Writes the index as a versioned directory of raw arrays (see src.indexer.storage).
+        """
+        with storage.atomic_dir(path) as tmp:
+            storage.write_meta(tmp, "bm25", num_docs=self.num_docs, num_terms=len(self.vocab),
+                               k1=self.k1, b=self.b, epsilon=self.epsilon, avgdl=self.avgdl,
+                               num_deleted=self.num_deleted)
+            terms = [None] * len(self.vocab)
+            for term, term_id in self.vocab.items():
+                terms[term_id] = term
+            with open(os.path.join(tmp, "vocab.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(terms))
+            storage.save_array(tmp, "term_ptr", self.term_ptr)
+            storage.save_array(tmp, "postings_doc", self.postings_doc)
+            storage.save_array(tmp, "postings_tf", self.postings_tf)
+            storage.save_array(tmp, "doc_len", self.doc_len)
+            storage.save_array(tmp, "idf", self.idf)
+            storage.save_array(tmp, "doc_norm", self._norm)
+            if self.num_deleted:
+                storage.save_array(tmp, "deleted", self.deleted)
 
     def load(self, path: str):
+        """
+        Memory-maps an index directory written by `save`. Falls back to the legacy
+        pickle (`<path>.pkl`, optionally gzipped) when no directory is present.
+        """
+        if not os.path.isdir(path):
+            self._load_pickle(path)
+            return
+
+        meta = storage.read_meta(path, "bm25")
+        self.k1, self.b, self.epsilon, self.avgdl = meta["k1"], meta["b"], meta["epsilon"], meta["avgdl"]
+        with open(os.path.join(path, "vocab.txt"), encoding="utf-8") as f:
+            terms = f.read().split("\n") if meta["num_terms"] else []
+        self.vocab = dict(zip(terms, range(len(terms))))
+        self.term_ptr = storage.load_array(path, "term_ptr")
+        self.postings_doc = storage.load_array(path, "postings_doc")
+        self.postings_tf = storage.load_array(path, "postings_tf")
+        self.doc_len = storage.load_array(path, "doc_len")
+        self.idf = storage.load_array(path, "idf")
+        self._norm = storage.load_array(path, "doc_norm")
+        self.deleted = storage.load_array(path, "deleted") if meta.get("num_deleted") else None
+        self._stats = None
+
+    def _load_pickle(self, path: str):
         import gzip
+        import pickle
+        if not path.endswith((".pkl", ".gz")) and not os.path.exists(path):
+            path = path + ".pkl"
         # Check for gzip file if original path absent or has .gz extension
         if path.endswith(".gz") or (not os.path.exists(path) and os.path.exists(path + ".gz")):
             real_path = path if path.endswith(".gz") else path + ".gz"
             print(f"Loading compressed index from {real_path}")
             with gzip.open(real_path, 'rb') as f:
-                self.bm25, self.corpus = pickle.load(f)
-            return
+                state = pickle.load(f)
+        else:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
 
-        with open(path, 'rb') as f:
-            self.bm25, self.corpus = pickle.load(f)
+        # Legacy artifacts are (rank_bm25.BM25Okapi, corpus) tuples: rebuild natively from the corpus
+        print("Legacy pickled BM25 index detected, rebuilding inverted index from corpus")
+        self.build(list(state[1]))
@@ -0,0 +1,168 @@
+import hashlib
+import os
+from typing import Iterable, List, Optional
+import numpy as np
+from src.indexer import storage
+from src.indexer.near_dup import NearDupIndex
+
+def hash_key(value: str) -> int:
+    """Stable 64-bit key for a string (chunk ids, chunk text)."""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+class ChunkStore:
+    """
+    Single columnar store for every chunk, addressed by int32 row id.
+
+    Columns: `text` (one contiguous UTF-8 blob + offsets), `source`, `id`,
+    `content_hash` (uint64, for exact-duplicate collapsing without touching
+    the text) and `cluster_id` (uint64 near-duplicate cluster assigned at
+    ingestion, see src.indexer.near_dup; equal to content_hash for stores
+    built without it). A prebuilt open-addressing table maps chunk ids
+    (e.g. Pinecone match ids) back to rows, and `near_dup` holds the LSH band
+    table new chunks are clustered against. Retrieval works on row ids and
+    only materializes text for the handful of rows it returns.
+    """
+    def __init__(self, text: storage.StringColumn, source: storage.StringColumn, chunk_id: storage.StringColumn,
+                 content_hash: np.ndarray, id_table_keys: np.ndarray, id_table_rows: np.ndarray,
+                 cluster_id: Optional[np.ndarray] = None, near_dup: Optional[NearDupIndex] = None):
+        self.text = text
+        self.source = source
+        self.chunk_id = chunk_id
+        self.content_hash = content_hash
+        self.cluster_id = content_hash if cluster_id is None else cluster_id
+        self.near_dup = near_dup
+        self._id_table_keys = id_table_keys
+        self._id_table_rows = id_table_rows
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def texts(self, rows: Iterable[int]) -> List[str]:
+        return self.text.take(rows)
+
+    def record(self, row: int) -> dict:
+        row = int(row)
+        return {"content": self.text[row], "source": self.source[row], "id": self.chunk_id[row],
+                "cluster_id": int(self.cluster_id[row])}
+
+    def records(self):
+        """Every row as a record dict, in row order (for rewriting the store)."""
+        for row in range(len(self)):
+            yield self.record(row)
+
+    def row_for_id(self, chunk_id: str) -> int:
+        """Row of a chunk id, or -1 if unknown."""
+        mask = len(self._id_table_keys) - 1
+        if mask < 0:
+            return -1
+        key = hash_key(chunk_id)
+        slot = key & mask
+        while True:
+            row = int(self._id_table_rows[slot])
+            if row == -1:
+                return -1
+            # Keys are 64-bit hashes; confirm against the stored id to rule out collisions
+            if int(self._id_table_keys[slot]) == key and self.chunk_id[row] == chunk_id:
+                return row
+            slot = (slot + 1) & mask
+
+    def rows_for_ids(self, chunk_ids: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self.row_for_id(i) for i in chunk_ids), dtype=np.int32)
+
+    @staticmethod
+    def _build_columns(records: List[dict]):
+        content_hash = np.fromiter((hash_key(r["content"]) for r in records), dtype=np.uint64, count=len(records))
+        # Records carry a cluster_id when near-dup detection ran; otherwise the chunk is its own cluster
+        cluster_id = np.fromiter((r.get("cluster_id", h) for r, h in zip(records, content_hash.tolist())),
+                                 dtype=np.uint64, count=len(records))
+
+        # Open addressing with linear probing at load factor <= 0.5
+        size = 1
+        while size < 2 * len(records):
+            size *= 2
+        keys = np.zeros(size if records else 0, dtype=np.uint64)
+        rows = np.full(size if records else 0, -1, dtype=np.int32)
+        mask = size - 1
+        for row, r in enumerate(records):
+            chunk_id = r.get("id")
+            if not chunk_id:
+                continue
+            key = hash_key(chunk_id)
+            slot = key & mask
+            while rows[slot] != -1:
+                slot = (slot + 1) & mask
+            keys[slot] = key
+            rows[slot] = row
+        return content_hash, cluster_id, keys, rows
+
+    @classmethod
+    def from_records(cls, records: List[dict], near_dup: Optional[NearDupIndex] = None) -> "ChunkStore":
+        """In-memory store from a list of {"content", "source", "id"[, "cluster_id"]} dicts."""
+        content_hash, cluster_id, keys, rows = cls._build_columns(records)
+        return cls(
+            storage.StringColumn.from_strings(r["content"] for r in records),
+            storage.StringColumn.from_strings(r.get("source", "") for r in records),
+            storage.StringColumn.from_strings(r.get("id", "") for r in records),
+            content_hash, keys, rows, cluster_id=cluster_id, near_dup=near_dup,
+        )
+
+    @staticmethod
+    def save(records: List[dict], path: str, near_dup: Optional[NearDupIndex] = None):
+        """
+        records: list, or any sized re-iterable of dicts (several passes are made).
+        near_dup: LSH band table the records were clustered with, stored alongside.
+        """
+        content_hash, cluster_id, keys, rows = ChunkStore._build_columns(records)
+        with storage.atomic_dir(path) as tmp:
+            storage.write_meta(tmp, "chunk_store", num_chunks=len(records))
+            storage.save_strings(tmp, "text", (r["content"] for r in records))
+            storage.save_strings(tmp, "source", (r.get("source", "") for r in records))
+            storage.save_strings(tmp, "id", (r.get("id", "") for r in records))
+            storage.save_array(tmp, "content_hash", content_hash)
+            storage.save_array(tmp, "cluster_id", cluster_id)
+            storage.save_array(tmp, "id_table_keys", keys)
+            storage.save_array(tmp, "id_table_rows", rows)
+            if near_dup is not None:
+                lsh_keys, lsh_clusters = near_dup.arrays()
+                storage.save_array(tmp, "lsh_keys", lsh_keys)
+                storage.save_array(tmp, "lsh_clusters", lsh_clusters)
+
+    @classmethod
+    def load(cls, path: str) -> "ChunkStore":
+        storage.read_meta(path, "chunk_store")
+        # Stores written before near-dup clustering have neither column nor band table
+        has = lambda name: os.path.exists(os.path.join(path, name + ".npy"))
+        near_dup = None
+        if has("lsh_keys"):
+            near_dup = NearDupIndex(storage.load_array(path, "lsh_keys"), storage.load_array(path, "lsh_clusters"))
+        return cls(
+            storage.StringColumn.open(path, "text"),
+            storage.StringColumn.open(path, "source"),
+            storage.StringColumn.open(path, "id"),
+            storage.load_array(path, "content_hash"),
+            storage.load_array(path, "id_table_keys"),
+            storage.load_array(path, "id_table_rows"),
+            cluster_id=storage.load_array(path, "cluster_id") if has("cluster_id") else None,
+            near_dup=near_dup,
+        )
+
+
+def load_chunk_store(path: str, legacy_doc_map_path: Optional[str] = None) -> ChunkStore:
+    """
+    Opens a chunk store directory. When it is missing, falls back to a legacy
+    doc_map pickle (`legacy_doc_map_path`, optionally gzipped) and builds the
+    store in memory.
+    """
+    if os.path.isdir(path):
+        return ChunkStore.load(path)
+
+    import gzip
+    import pickle
+    legacy_path = legacy_doc_map_path or path
+    if legacy_path.endswith(".gz") or (not os.path.exists(legacy_path) and os.path.exists(legacy_path + ".gz")):
+        real_path = legacy_path if legacy_path.endswith(".gz") else legacy_path + ".gz"
+        print(f"Loading compressed doc_map from {real_path}")
+        with gzip.open(real_path, 'rb') as f:
+            return ChunkStore.from_records(pickle.load(f))
+    with open(legacy_path, 'rb') as f:
+        return ChunkStore.from_records(pickle.load(f))
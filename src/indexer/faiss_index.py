@@ -1,24 +1,245 @@
-import faiss
+import copy
 import numpy as np
+import json
 import os
+from typing import Optional
+from src.config import get_section
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat")
+
+DEFAULT_PARAMS = {
+    "hnsw": {"m": 32, "ef_construction": 200, "ef_search": 64},
+    "ivf_flat": {"nlist": 1024, "nprobe": 16},
+}
+
+def _faiss():
+    """faiss, imported on first use: it is slow to import, and BM25-only or Pinecone deployments never need it."""
+    import faiss
+    return faiss
 
 class FaissIndex:
-    def __init__(self, dimension: int):
+    """
+    L2 vector index with selectable structure:
+      - flat:     exact brute-force scan (IndexFlatL2)
+      - hnsw:     graph-based ANN (IndexHNSWFlat), recall tuned by ef_search
+      - ivf_flat: inverted lists over k-means cells (IndexIVFFlat), recall tuned by nprobe;
+                  must be trained before vectors are added
+    The type and its parameters are stored next to the index in `<path>.meta.json`.
+
+    Vector ids are chunk-store row ids given at add time and survive removals:
+    IVF stores ids natively, new flat/HNSW indexes are wrapped in IndexIDMap2.
+    flat and ivf_flat delete natively (remove_ids); HNSW graphs cannot, so
+    removed ids are tombstoned and excluded inside the search by an id selector
+    (tombstones persist in `<path>.tombstones.npy`).
+
+    Stored vectors can be read back by row id (reconstruct); IVF indexes keep
+    an id -> list entry hash table for that.
+    """
+    def __init__(self, dimension: int, index_type: str = "flat", params: dict = None):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type '{index_type}'. Expected one of {INDEX_TYPES}")
         self.dimension = dimension
-        self.index = faiss.IndexFlatL2(dimension)
-        # Store metadata/mapping if needed, for now just simpler index
+        self.index_type = index_type
+        self.params = {**DEFAULT_PARAMS.get(index_type, {}), **(params or {})}
+        self.tombstones = np.zeros(0, dtype=np.int64)
+        self._live_selector = None
+        self.next_id = 0
+        self.index = self._create_index()
+
+    @classmethod
+    def from_config(cls, dimension: int) -> "FaissIndex":
+        """Builds an empty index from the `vector_index` section of the config."""
+        cfg = get_section("vector_index")
+        index_type = cfg.get("type", "flat")
+        params = cfg.get({"hnsw": "hnsw", "ivf_flat": "ivf"}.get(index_type, ""), {})
+        return cls(dimension, index_type=index_type, params=params)
+
+    def _create_index(self):
+        faiss = _faiss()
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self.dimension, self.params["m"])
+            index.hnsw.efConstruction = self.params["ef_construction"]
+            index.hnsw.efSearch = self.params["ef_search"]
+            return faiss.IndexIDMap2(index)
+        if self.index_type == "ivf_flat":
+            # Built for real in train(), once the corpus size is known and nlist can be clamped
+            return None
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+
+    @property
+    def id_mapped(self) -> bool:
+        """False for flat/HNSW indexes written before id mapping, where ids are insertion positions."""
+        faiss = _faiss()
+        return isinstance(self.index, (faiss.IndexIDMap2, faiss.IndexIVF))
+
+    def _inner(self):
+        """The underlying HNSW / IVF / flat index, below the id map."""
+        faiss = _faiss()
+        return faiss.downcast_index(self.index.index) if isinstance(self.index, faiss.IndexIDMap2) else self.index
+
+    @property
+    def is_trained(self) -> bool:
+        return self.index is not None and self.index.is_trained
 
-    def add(self, embeddings: np.ndarray):
+    def train(self, embeddings: np.ndarray):
+        """Trains the coarse quantizer (IVF only; no-op for other types)."""
+        if self.index_type != "ivf_flat":
+            return
+        # FAISS wants ~39 training points per centroid; shrink nlist on small corpora
+        nlist = max(1, min(self.params["nlist"], len(embeddings) // 39))
+        if nlist != self.params["nlist"]:
+            print(f"Clamping IVF nlist from {self.params['nlist']} to {nlist} for {len(embeddings)} training vectors")
+            self.params["nlist"] = nlist
+        quantizer = _faiss().IndexFlatL2(self.dimension)
+        # IVF keeps caller-given ids in its inverted lists; no id map needed
+        self.index = _faiss().IndexIVFFlat(quantizer, self.dimension, nlist)
+        self.index.train(np.ascontiguousarray(embeddings, dtype=np.float32))
+        self.index.nprobe = self.params["nprobe"]
+        self._enable_direct_map()
+
+    def _enable_direct_map(self):
+        """IVF only: id -> inverted list entry map, which reconstruct needs (arbitrary ids, so a hash table)."""
+        faiss = _faiss()
+        inner = self._inner()
+        if isinstance(inner, faiss.IndexIVF) and inner.direct_map.type != faiss.DirectMap.Hashtable:
+            inner.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+    def add(self, embeddings: np.ndarray, ids: np.ndarray = None):
+        """
+        ids: row ids of the vectors. Defaults to the ids following the largest
+        one added so far, which matches row ids when rows are only appended.
+        """
         if embeddings.shape[1] != self.dimension:
             raise ValueError(f"Embedding dimension mismatch. Expected {self.dimension}, got {embeddings.shape[1]}")
-        self.index.add(embeddings)
+        if not self.is_trained:
+            raise ValueError(f"{self.index_type} index must be trained before adding vectors.")
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        ids = np.arange(self.next_id, self.next_id + len(embeddings)) if ids is None else np.asarray(ids, dtype=np.int64)
+        if self.id_mapped:
+            self.index.add_with_ids(embeddings, ids)
+        elif np.array_equal(ids, np.arange(self.index.ntotal, self.index.ntotal + len(ids))):
+            self.index.add(embeddings)
+        else:
+            raise ValueError("Index has no id map; vectors can only be appended at the next positions.")
+        if len(ids):
+            self.next_id = max(self.next_id, int(ids.max()) + 1)
+
+    def remove(self, ids) -> None:
+        """Deletes vectors by row id (native removal, or tombstones for HNSW and legacy indexes)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        if self.id_mapped and self.index_type != "hnsw":
+            faiss = _faiss()
+            # An IVF direct map (hash table) can only remove ids given as an explicit array
+            direct_map = isinstance(self.index, faiss.IndexIVF) and self.index.direct_map.type != faiss.DirectMap.NoMap
+            selector = faiss.IDSelectorArray(ids) if direct_map else faiss.IDSelectorBatch(ids)
+            self.index.remove_ids(selector)
+        else:
+            self.tombstones = np.union1d(self.tombstones, ids)
+            self._live_selector = None
+
+    def reconstruct(self, ids) -> np.ndarray:
+        """Stored vectors of the given row ids, (len(ids) x dimension). Raises if an id is not in the index."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return self.index.reconstruct_batch(ids)
+
+    def clone(self) -> "FaissIndex":
+        """Independent copy (vectors included), to modify while readers keep searching this one."""
+        other = copy.copy(self)
+        other.index = _faiss().clone_index(self.index)
+        other.params = dict(self.params)
+        other.tombstones = self.tombstones.copy()
+        other._live_selector = None
+        return other
 
-    def search(self, query_embedding: np.ndarray, top_k: int = 10):
-        distances, indices = self.index.search(query_embedding, top_k)
-        return distances, indices
+    def _selector(self, exclude: Optional[np.ndarray] = None):
+        """
+        (selector of the ids to search, the selectors it points to) or None when
+        nothing is filtered. The tombstone selector is built once per tombstone
+        set; `exclude` ids are merged in per call.
+        """
+        faiss = _faiss()
+        if exclude is not None and len(exclude):
+            dead = faiss.IDSelectorBatch(np.union1d(self.tombstones, np.asarray(exclude, dtype=np.int64)))
+            return faiss.IDSelectorNot(dead), dead
+        if not len(self.tombstones):
+            return None
+        if self._live_selector is None:
+            dead = faiss.IDSelectorBatch(self.tombstones)
+            # The pair is kept together: IDSelectorNot only holds a pointer to the batch selector
+            self._live_selector = (faiss.IDSelectorNot(dead), dead)
+        return self._live_selector
+
+    def _search_parameters(self, params: dict = None, selector=None):
+        """Per-call query knobs plus the id filter; leaves the index's stored defaults untouched."""
+        params = params or {}
+        faiss = _faiss()
+        if self.index_type == "hnsw" and (selector is not None or params.get("ef_search")):
+            # The parameter structs always override the index's knob, so fall back to the configured value
+            ef_search = int(params.get("ef_search") or self.params["ef_search"])
+            if selector is None:
+                return faiss.SearchParametersHNSW(efSearch=ef_search)
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+        if self.index_type == "ivf_flat" and (selector is not None or params.get("nprobe")):
+            nprobe = int(params.get("nprobe") or self.params["nprobe"])
+            if selector is None:
+                return faiss.SearchParametersIVF(nprobe=nprobe)
+            return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+        if selector is not None:
+            return faiss.SearchParameters(sel=selector)
+        return None
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 10, params: dict = None,
+               exclude: Optional[np.ndarray] = None):
+        """
+        params: optional query-time overrides, {"ef_search": int} for HNSW or
+        {"nprobe": int} for IVF. Ignored for flat indexes.
+        exclude: ids filtered out inside the search, like tombstones (e.g. rows
+        deleted from a live index but not yet removed here).
+        Tombstoned and excluded ids never appear in the results; slots without a hit hold id -1.
+        """
+        # Held until the search returns: the parameters only point to the selectors
+        selector = self._selector(exclude)
+        search_params = self._search_parameters(params, None if selector is None else selector[0])
+        if search_params is None:
+            return self.index.search(query_embedding, top_k)
+        return self.index.search(query_embedding, top_k, params=search_params)
 
     def save(self, path: str):
-        faiss.write_index(self.index, path)
+        _faiss().write_index(self.index, path)
+        with open(path + ".meta.json", "w") as f:
+            json.dump({"index_type": self.index_type, "params": self.params, "dimension": self.dimension,
+                       "next_id": self.next_id}, f, indent=2)
+        tombstones_path = path + ".tombstones.npy"
+        if len(self.tombstones):
+            np.save(tombstones_path, self.tombstones)
+        elif os.path.exists(tombstones_path):
+            os.remove(tombstones_path)
 
     def load(self, path: str):
-        self.index = faiss.read_index(path)
+        self.index = _faiss().read_index(path)
+        meta_path = path + ".meta.json"
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self.index_type = meta["index_type"]
+            self.params = meta["params"]
+            self.next_id = meta.get("next_id", self.index.ntotal)
+        else:
+            # Indexes written before index types existed are always flat
+            self.index_type, self.params = "flat", {}
+            self.next_id = self.index.ntotal
+
+        tombstones_path = path + ".tombstones.npy"
+        self.tombstones = np.load(tombstones_path) if os.path.exists(tombstones_path) else np.zeros(0, dtype=np.int64)
+        self._live_selector = None
+
+        if self.index_type == "hnsw":
+            self._inner().hnsw.efSearch = self.params["ef_search"]
+        elif self.index_type == "ivf_flat":
+            self._inner().nprobe = self.params["nprobe"]
+            # Indexes written before reconstruct was supported have no direct map yet
+            self._enable_direct_map()
@@ -0,0 +1,149 @@
+"""
+Near-duplicate chunk detection, done once at ingestion (and on runtime upserts).
+
+Every chunk gets a MinHash signature over its word shingles, cut into LSH
+bands; chunks that share any band key are near-duplicates with high
+probability (roughly Jaccard similarity above (1/bands)^(1/rows_per_band)).
+A chunk joins the cluster of the first earlier chunk it shares a band with,
+otherwise it starts its own. Cluster ids are the content hash of the
+cluster's first chunk, so exact duplicates and chunks without near-duplicates
+keep the key exact-match dedup already used, and query-time dedup is a set
+lookup on one stored column.
+"""
+import hashlib
+import re
+import zlib
+from typing import Dict, Optional, Tuple
+import numpy as np
+from src.config import get_section
+
+# Smallest prime above 2^32: universal hashing of 32-bit shingle hashes
+_PRIME = np.uint64(4294967311)
+_WORD = re.compile(r"\w+")
+
+
+class MinHasher:
+    """
+    Text -> LSH band keys (uint64, one per band; all zeros for text without
+    words). Parameters are derived from `seed`, so keys computed in different
+    processes and runs are comparable. Picklable, for ingestion workers.
+    """
+    def __init__(self, num_perm: int = 128, bands: int = 16, shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # a, b < 2^32 keep a * x + b within uint64 for 32-bit x
+        self._a = rng.integers(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+
+    @classmethod
+    def from_config(cls) -> Optional["MinHasher"]:
+        """From the `near_dup` section of the config; None when near-dup detection is disabled."""
+        cfg = get_section("near_dup")
+        if not cfg.get("enabled", True):
+            return None
+        return cls(num_perm=cfg.get("num_perm", 128), bands=cfg.get("bands", 16),
+                   shingle_size=cfg.get("shingle_size", 5))
+
+    def shingles(self, text: str) -> np.ndarray:
+        """CRC32 of each run of shingle_size words (the whole text if shorter)."""
+        words = _WORD.findall(text.lower())
+        if not words:
+            return np.zeros(0, dtype=np.uint64)
+        k = min(self.shingle_size, len(words))
+        return np.unique(np.fromiter((zlib.crc32(" ".join(words[i:i + k]).encode("utf-8"))
+                                      for i in range(len(words) - k + 1)), dtype=np.uint64))
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = self.shingles(text)
+        if not len(shingles):
+            return np.zeros(self.num_perm, dtype=np.uint64)
+        return ((self._a[:, None] * shingles[None, :] + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def band_keys(self, text: str) -> np.ndarray:
+        signature = self.signature(text)
+        keys = np.zeros(self.bands, dtype=np.uint64)
+        if not signature.any():
+            return keys
+        for band, values in enumerate(np.split(signature, self.bands)):
+            digest = hashlib.blake2b(values.tobytes(), digest_size=8, salt=band.to_bytes(8, "little")).digest()
+            keys[band] = int.from_bytes(digest, "little")
+        return keys
+
+
+class NearDupIndex:
+    """
+    Band key -> cluster id table. The persisted part is a pair of sorted
+    arrays (memory-mapped from the chunk store); keys registered since it was
+    loaded live in a dict until the next save. Not thread-safe: callers
+    serialize assign / copy.
+    """
+    def __init__(self, keys: Optional[np.ndarray] = None, clusters: Optional[np.ndarray] = None):
+        self._keys = np.zeros(0, dtype=np.uint64) if keys is None else keys
+        self._clusters = np.zeros(0, dtype=np.uint64) if clusters is None else clusters
+        self._added: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._added)
+
+    def copy(self) -> "NearDupIndex":
+        other = NearDupIndex(self._keys, self._clusters)
+        other._added = dict(self._added)
+        return other
+
+    def assign(self, band_keys: np.ndarray, content_hash: np.ndarray) -> np.ndarray:
+        """
+        Cluster ids for a batch of chunks in row order ((n x bands) keys and
+        their content hashes), registering their keys for later chunks.
+        """
+        band_keys = np.asarray(band_keys, dtype=np.uint64).reshape(len(content_hash), -1)
+        # Lookups against the persisted table for the whole batch at once
+        found = np.zeros(band_keys.shape, dtype=bool)
+        persisted = np.zeros(band_keys.shape, dtype=np.uint64)
+        if len(self._keys):
+            pos = np.minimum(np.searchsorted(self._keys, band_keys), len(self._keys) - 1)
+            found = self._keys[pos] == band_keys
+            persisted = np.asarray(self._clusters)[pos]
+
+        clusters = np.asarray(content_hash, dtype=np.uint64).copy()
+        for i, keys in enumerate(band_keys.tolist()):
+            cluster = None
+            for band, key in enumerate(keys):
+                if not key:
+                    continue
+                if found[i, band]:
+                    cluster = int(persisted[i, band])
+                    break
+                cluster = self._added.get(key)
+                if cluster is not None:
+                    break
+            if cluster is not None:
+                clusters[i] = cluster
+            for band, key in enumerate(keys):
+                if key and not found[i, band]:
+                    self._added.setdefault(key, int(clusters[i]))
+        return clusters
+
+    def register(self, band_keys: np.ndarray, clusters: np.ndarray):
+        """Re-registers chunks clustered earlier (e.g. finished shards of a resumed run)."""
+        for keys, cluster in zip(np.asarray(band_keys, dtype=np.uint64).tolist(), np.asarray(clusters).tolist()):
+            for key in keys:
+                if key and key not in self._added and not self._persisted(key):
+                    self._added[key] = cluster
+
+    def _persisted(self, key: int) -> bool:
+        pos = int(np.searchsorted(self._keys, np.uint64(key)))
+        return pos < len(self._keys) and int(self._keys[pos]) == key
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(sorted keys, clusters) of the whole table, for saving."""
+        if not self._added:
+            return np.asarray(self._keys), np.asarray(self._clusters)
+        keys = np.concatenate([self._keys, np.fromiter(self._added.keys(), dtype=np.uint64, count=len(self._added))])
+        clusters = np.concatenate([self._clusters,
+                                   np.fromiter(self._added.values(), dtype=np.uint64, count=len(self._added))])
+        order = np.argsort(keys, kind="stable")
+        return keys[order], clusters[order]
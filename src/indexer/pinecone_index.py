@@ -1,111 +1,198 @@
 import os
+import random
 import time
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
 import numpy as np
-from pinecone import Pinecone, ServerlessSpec
+from src.config import get_section
+
+# Statuses worth retrying: throttling and transient server errors
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+# Transport failures worth retrying besides the built-in ConnectionError / TimeoutError: urllib3's (the
+# SDK's HTTP client) and requests', matched by class name so that neither has to be importable
+RETRYABLE_ERRORS = ("ConnectionError", "ProtocolError", "NewConnectionError", "ConnectTimeoutError",
+                    "ReadTimeoutError", "MaxRetryError", "ConnectTimeout", "ReadTimeout", "Timeout")
+# Largest top_k a Pinecone query accepts
+MAX_TOP_K = 10000
 
 class PineconeIndex:
-    def __init__(self, dimension: int, index_name: str = "enterprise-rag"):
+    """
+    Serverless Pinecone index (cosine), addressed by chunk id.
+
+    Vectors carry no metadata: the chunk text and source live in the local
+    ChunkStore, and match ids map back to rows through its id table. Upserts,
+    deletes and multi-vector queries are split into requests that run on a
+    bounded thread pool, each retried with jittered exponential backoff on
+    throttling (429) and transient server errors.
+
+    `client` replaces the Pinecone SDK client, e.g. with the in-process
+    LocalPinecone stand-in (src.indexer.pinecone_local) for tests.
+    """
+    def __init__(self, dimension: int, index_name: str = "enterprise-rag", client=None,
+                 upsert_batch_size: int = 100, workers: int = 8, max_retries: int = 5,
+                 backoff_seconds: float = 0.5, max_backoff_seconds: float = 8.0):
         self.dimension = dimension
         self.index_name = index_name
-        self.api_key = os.getenv("PINECONE_API_KEY")
-        if not self.api_key:
-            raise ValueError("PINECONE_API_KEY not found in environment variables")
-        
-        self.pc = Pinecone(api_key=self.api_key)
+        self.upsert_batch_size = upsert_batch_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.retries = 0
+
+        if client is None:
+            from pinecone import Pinecone
+            self.api_key = os.getenv("PINECONE_API_KEY")
+            if not self.api_key:
+                raise ValueError("PINECONE_API_KEY not found in environment variables")
+            client = Pinecone(api_key=self.api_key)
+        self.pc = client
         self.index = None
-        
+
         # Check if index exists, create if not
         self._ensure_index_exists()
         self.index = self.pc.Index(self.index_name)
+        # Long-lived pool shared by upserts, deletes and queries
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pinecone")
+        self.workers = workers
+
+    @classmethod
+    def from_config(cls, dimension: int) -> "PineconeIndex":
+        """
+        Settings from the `pinecone` section of the config. PINECONE_LOCAL=1
+        swaps the SDK for the in-process stand-in (no network, no API key).
+        """
+        cfg = get_section("pinecone")
+        client = None
+        if os.getenv("PINECONE_LOCAL"):
+            from src.indexer.pinecone_local import LocalPinecone
+            client = LocalPinecone.shared()
+        return cls(dimension, index_name=cfg.get("index_name", "enterprise-rag"), client=client,
+                   upsert_batch_size=cfg.get("upsert_batch_size", 100), workers=cfg.get("workers", 8),
+                   max_retries=cfg.get("max_retries", 5), backoff_seconds=cfg.get("backoff_seconds", 0.5),
+                   max_backoff_seconds=cfg.get("max_backoff_seconds", 8.0))
 
     def _ensure_index_exists(self):
         """Create a serverless index if it doesn't exist"""
         existing_indexes = [i.name for i in self.pc.list_indexes()]
-        
+
         if self.index_name not in existing_indexes:
             print(f"Creating Pinecone index '{self.index_name}'...")
+            spec = None
+            if not getattr(self.pc, "local", False):
+                from pinecone import ServerlessSpec
+                spec = ServerlessSpec(cloud="aws", region="us-east-1")
             self.pc.create_index(
                 name=self.index_name,
                 dimension=self.dimension,
                 metric="cosine",
-                spec=ServerlessSpec(
-                    cloud="aws",
-                    region="us-east-1"
-                )
+                spec=spec
             )
             # Wait for index to be ready
             while not self.pc.describe_index(self.index_name).status['ready']:
                 time.sleep(1)
             print("Pinecone index created successfully.")
 
-    def add(self, embeddings: np.ndarray, metadata: List[dict] = None):
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        """Throttling and transient server errors (by HTTP status), and connection failures or timeouts."""
+        status = getattr(error, "status", None) or getattr(error, "status_code", None)
+        if status is not None:
+            try:
+                return int(status) in RETRYABLE_STATUS
+            except (TypeError, ValueError):
+                return False
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+    def _call(self, fn: Callable, *args, **kwargs):
+        """fn(*args, **kwargs) with up to max_retries retries on retryable errors."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not self._retryable(e):
+                    raise
+                self.retries += 1
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def _map(self, fn: Callable, items: Sequence) -> list:
+        """fn over items on the pool (at most `workers` requests in flight), results in order."""
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        return list(self._executor.map(fn, items))
+
+    def add(self, embeddings: np.ndarray, metadata: List[dict] = None, ids: Optional[Sequence[str]] = None):
         """
-        Add embeddings to Pinecone.
-        metadata is expected to be a list of dicts corresponding to each embedding.
-        If None, we'll generate dummy IDs.
+        Upserts embeddings under their chunk ids: `ids`, or the "id" of each
+        metadata record (the rest of the record is not uploaded).
         """
         if embeddings.shape[1] != self.dimension:
             raise ValueError(f"Embedding dimension mismatch. Expected {self.dimension}, got {embeddings.shape[1]}")
-            
-        # Pinecone expects (id, vector, metadata)
-        vectors = []
-        for i, embedding in enumerate(embeddings):
-            # If metadata provided, use a hash or index as ID. For now simple index fallback.
-            # In a real pipeline, better to pass explicit unique doc_ids.
-            vector_id = str(hash(embedding.tobytes())) if metadata is None else metadata[i].get("id", f"vec_{i}")
-             # Ensure metadata is flat dict if possible, or limited
-            meta = metadata[i] if metadata else {}
-            
-            vectors.append({
-                "id": vector_id,
-                "values": embedding.tolist(),
-                "metadata": meta
-            })
-            
-        # Upsert in batches of 100
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i : i + batch_size]
-            self.index.upsert(vectors=batch)
+        if ids is None:
+            if metadata is None:
+                raise ValueError("PineconeIndex.add needs chunk ids (ids=..., or metadata records with an 'id').")
+            ids = [record["id"] for record in metadata]
+        if len(ids) != len(embeddings):
+            raise ValueError(f"Got {len(ids)} ids for {len(embeddings)} embeddings")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        def upsert(start: int):
+            # Vectors are converted to lists per request, not for the whole batch up front
+            end = start + self.upsert_batch_size
+            vectors = list(zip(ids[start:end], embeddings[start:end].tolist()))
+            self._call(self.index.upsert, vectors=vectors)
+
+        self._map(upsert, range(0, len(ids), self.upsert_batch_size))
+
+    def delete(self, ids: List[str]):
+        """Delete vectors by chunk id."""
+        batch_size = 1000
+        self._map(lambda start: self._call(self.index.delete, ids=list(ids[start:start + batch_size])),
+                  range(0, len(ids), batch_size))
+
+    def fetch(self, ids: Sequence[str]) -> np.ndarray:
+        """Stored vectors of the given chunk ids, (len(ids) x dimension). Raises KeyError if one is missing."""
+        batch_size = 1000
+
+        def fetch_batch(start: int) -> dict:
+            response = self._call(self.index.fetch, ids=list(ids[start:start + batch_size]))
+            vectors = response["vectors"] if isinstance(response, dict) else response.vectors
+            return {vector_id: (v["values"] if isinstance(v, dict) else v.values) for vector_id, v in vectors.items()}
+
+        found = {}
+        for batch in self._map(fetch_batch, range(0, len(ids), batch_size)):
+            found.update(batch)
+        matrix = np.zeros((len(ids), self.dimension), dtype=np.float32)
+        for i, vector_id in enumerate(ids):
+            matrix[i] = found[vector_id]
+        return matrix
 
     def search(self, query_embedding: np.ndarray, top_k: int = 10):
         """
-        Search for nearest neighbors.
-        Returns:
-            distances: list of list of float (scores)
-            indices: list of list of doc_ids (or whatever ID was stored)
-            matches: Full match objects if needed later
+        Nearest neighbours of each query row, queried concurrently.
+        Returns (scores, ids) like FaissIndex.search: a (queries x top_k) array
+        of cosine scores (padded with -inf) and one list of chunk ids per query.
+        top_k is capped at MAX_TOP_K.
         """
-        # Pinecone query expects a list of vectors
-        # If passed a batch (N, dim), loop
-        
-        # Ensure query is (1, dim) or (dim,)
+        top_k = min(top_k, MAX_TOP_K)
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
         if len(query_embedding.shape) == 1:
             query_embedding = query_embedding.reshape(1, -1)
-            
-        results = []
-        
-        for q_vec in query_embedding:
-            response = self.index.query(
-                vector=q_vec.tolist(),
-                top_k=top_k,
-                include_metadata=True
-            )
-            results.append(response)
-            
-        # Format to match FAISS return style: (distances, indices)
-        # Distances in Pinecone (cosine) are scores.
-        all_scores = []
+
+        def query(vector: np.ndarray):
+            return self._call(self.index.query, vector=vector.tolist(), top_k=top_k,
+                              include_metadata=False, include_values=False)
+
+        responses = self._map(query, list(query_embedding))
+        all_scores = np.full((len(responses), top_k), -np.inf, dtype=np.float32)
         all_ids = []
-        
-        for res in results:
-            scores = [match['score'] for match in res['matches']]
-            ids = [match['id'] for match in res['matches']]
-            all_scores.append(scores)
-            all_ids.append(ids)
-            
-        return np.array(all_scores), all_ids
+        for qi, response in enumerate(responses):
+            matches = response['matches']
+            all_scores[qi, :len(matches)] = [match['score'] for match in matches]
+            all_ids.append([match['id'] for match in matches])
+        return all_scores, all_ids
 
     def save(self, path: str):
         """Pinecone is serverless, no local save needed."""
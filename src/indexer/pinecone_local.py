@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import List, Optional
+import numpy as np
+
+class LocalPineconeError(Exception):
+    """Error raised by the stand-in, with an HTTP-like status like the SDK's exceptions."""
+    def __init__(self, status: int, message: str):
+        super().__init__(f"({status}) {message}")
+        self.status = status
+
+
+class LocalPineconeIndex:
+    """
+    In-memory, brute-force cosine index with the part of the pinecone.Index
+    API that PineconeIndex uses (upsert, delete, query, fetch, describe_index_stats).
+    latency_ms delays every request; throttle_rate fails that fraction of
+    requests with a 429, to exercise concurrency and retries.
+    """
+    def __init__(self, dimension: int, latency_ms: float = 0.0, throttle_rate: float = 0.0, seed: int = 0):
+        self.dimension = dimension
+        self.latency = latency_ms / 1000.0
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._slots = {}
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        self.requests = {"upsert": 0, "delete": 0, "query": 0, "fetch": 0, "throttled": 0}
+
+    def _request(self, kind: str):
+        with self._lock:
+            self.requests[kind] += 1
+            throttled = self._random.random() < self.throttle_rate
+            if throttled:
+                self.requests["throttled"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttled:
+            raise LocalPineconeError(429, "Too Many Requests")
+
+    def upsert(self, vectors: list, namespace: Optional[str] = None):
+        """vectors: (id, values) tuples or {"id", "values"} dicts."""
+        self._request("upsert")
+        parsed = [(v["id"], v["values"]) if isinstance(v, dict) else (v[0], v[1]) for v in vectors]
+        if not parsed:
+            return {"upserted_count": 0}
+        matrix = np.asarray([values for _, values in parsed], dtype=np.float32)
+        if matrix.shape[1] != self.dimension:
+            raise LocalPineconeError(400, f"Vector dimension {matrix.shape[1]} does not match {self.dimension}")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.maximum(norms, 1e-12)
+        with self._lock:
+            fresh = []
+            for (vector_id, _), vector in zip(parsed, matrix):
+                slot = self._slots.get(vector_id)
+                if slot is None:
+                    self._slots[vector_id] = len(self._ids)
+                    fresh.append(vector)
+                    self._ids.append(vector_id)
+                else:
+                    self._vectors[slot] = vector
+            if fresh:
+                self._vectors = np.vstack([self._vectors, np.asarray(fresh)])
+        return {"upserted_count": len(parsed)}
+
+    def delete(self, ids: List[str], namespace: Optional[str] = None):
+        self._request("delete")
+        with self._lock:
+            doomed = sorted((self._slots.pop(i) for i in ids if i in self._slots), reverse=True)
+            if not doomed:
+                return {}
+            keep = np.ones(len(self._ids), dtype=bool)
+            keep[doomed] = False
+            self._vectors = self._vectors[keep]
+            self._ids = [vector_id for vector_id, k in zip(self._ids, keep) if k]
+            self._slots = {vector_id: slot for slot, vector_id in enumerate(self._ids)}
+        return {}
+
+    def query(self, vector: List[float], top_k: int = 10, include_metadata: bool = False,
+              include_values: bool = False, namespace: Optional[str] = None):
+        self._request("query")
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        with self._lock:
+            vectors, ids = self._vectors, list(self._ids)
+        scores = vectors @ query
+        top = np.argsort(-scores, kind="stable")[:top_k]
+        return {"matches": [{"id": ids[i], "score": float(scores[i])} for i in top]}
+
+    def fetch(self, ids: List[str], namespace: Optional[str] = None):
+        """Stored (unit-normalized) vectors of the ids that exist."""
+        self._request("fetch")
+        with self._lock:
+            found = [(i, self._slots[i]) for i in ids if i in self._slots]
+            return {"vectors": {i: {"id": i, "values": self._vectors[slot].tolist()} for i, slot in found}}
+
+    def describe_index_stats(self):
+        with self._lock:
+            return {"dimension": self.dimension, "total_vector_count": len(self._ids)}
+
+
+class LocalPinecone:
+    """
+    In-process stand-in for the pinecone.Pinecone client (list_indexes,
+    create_index, describe_index, Index), for tests and benchmarks without
+    network access. State lives in this process only.
+    """
+    local = True
+    _shared = None
+
+    def __init__(self, latency_ms: float = 0.0, throttle_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.indexes = {}
+
+    @classmethod
+    def shared(cls) -> "LocalPinecone":
+        """Process-wide client, so that ingestion and retrieval in one process see the same indexes."""
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def list_indexes(self):
+        return [SimpleNamespace(name=name) for name in self.indexes]
+
+    def create_index(self, name: str, dimension: int, metric: str = "cosine", spec=None):
+        if metric != "cosine":
+            raise LocalPineconeError(400, "The local stand-in only supports the cosine metric")
+        self.indexes[name] = LocalPineconeIndex(dimension, latency_ms=self.latency_ms,
+                                                throttle_rate=self.throttle_rate)
+
+    def describe_index(self, name: str):
+        return SimpleNamespace(name=name, status={"ready": name in self.indexes})
+
+    def Index(self, name: str) -> LocalPineconeIndex:
+        return self.indexes[name]
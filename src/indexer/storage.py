@@ -0,0 +1,176 @@
+"""
+Pickle-free on-disk layout for index artifacts.
+
+Each artifact is a directory holding a `meta.json` manifest plus raw `.npy`
+arrays that are opened with `np.load(mmap_mode="r")`. Loading therefore only
+maps files: pages are faulted in on demand and shared by the OS page cache
+across every worker process that opens the same directory.
+"""
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from typing import Iterable, List
+
+import numpy as np
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+
+
+@contextmanager
+def atomic_dir(path: str, carry_over: bool = False):
+    """
+    Yields a scratch directory that replaces `path` once the block succeeds.
+    Processes that still map the old files keep reading them until they reload.
+    carry_over: entries of the current `path` that the block did not write are
+    hard-linked (copied across filesystems) into the new directory before the
+    swap, so a partial rewrite keeps the untouched artifacts.
+    """
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        yield tmp_path
+        if carry_over and os.path.isdir(path):
+            for name in os.listdir(path):
+                src, dst = os.path.join(path, name), os.path.join(tmp_path, name)
+                if os.path.exists(dst):
+                    continue
+                if os.path.isdir(src):
+                    shutil.copytree(src, dst, copy_function=_link_or_copy)
+                else:
+                    _link_or_copy(src, dst)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    old_path = path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+@contextmanager
+def locked(path: str):
+    """
+    Exclusive advisory lock on `<path>.lock`, held for the block: serializes
+    the processes (ingestion, API workers) that rewrite the artifacts at `path`.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def write_meta(path: str, kind: str, **meta):
+    meta = {"kind": kind, "version": FORMAT_VERSION, **meta}
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def read_meta(path: str, kind: str) -> dict:
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get("kind") != kind:
+        raise ValueError(f"{path} holds a '{meta.get('kind')}' artifact, expected '{kind}'")
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {meta.get('version')}, expected {FORMAT_VERSION}")
+    return meta
+
+
+def artifact_fingerprint(paths: Iterable[str]) -> str:
+    """
+    Cheap version stamp for a set of artifacts (directories or plain files),
+    derived from file metadata only. Changes whenever an artifact is rewritten.
+    """
+    import hashlib
+    h = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        target = os.path.join(path, META_FILE) if os.path.isdir(path) else path
+        try:
+            st = os.stat(target)
+            h.update(f"{target}:{st.st_mtime_ns}:{st.st_size};".encode())
+        except OSError:
+            h.update(f"{target}:missing;".encode())
+    return h.hexdigest()
+
+
+def save_array(path: str, name: str, array: np.ndarray):
+    np.save(os.path.join(path, name + ".npy"), np.ascontiguousarray(array))
+
+
+def load_array(path: str, name: str) -> np.ndarray:
+    file_path = os.path.join(path, name + ".npy")
+    try:
+        return np.load(file_path, mmap_mode="r")
+    except ValueError:
+        # Zero-length arrays cannot be mapped
+        return np.load(file_path)
+
+
+def save_strings(path: str, name: str, strings: Iterable[str]):
+    """Writes strings as one UTF-8 blob (`<name>.bin`) plus an int64 offsets array."""
+    offsets = [0]
+    with open(os.path.join(path, name + ".bin"), "wb") as f:
+        for s in strings:
+            data = s.encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    save_array(path, name + ".offsets", np.asarray(offsets, dtype=np.int64))
+
+
+class StringColumn:
+    """Read-only sequence of strings stored as one UTF-8 blob plus an offsets array."""
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def open(cls, path: str, name: str) -> "StringColumn":
+        """Memory-maps a column written by `save_strings`."""
+        offsets = load_array(path, name + ".offsets")
+        blob_path = os.path.join(path, name + ".bin")
+        if os.path.getsize(blob_path):
+            blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.zeros(0, dtype=np.uint8)
+        return cls(blob, offsets)
+
+    @classmethod
+    def from_strings(cls, strings: Iterable[str]) -> "StringColumn":
+        """Builds an in-memory column (used for legacy artifacts)."""
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def take(self, indices: Iterable[int]) -> List[str]:
+        return [self[int(i)] for i in indices]
@@ -0,0 +1,67 @@
+"""
+Selectable inference backend for the sentence-transformers models.
+
+`torch` (default) loads the model as before. `onnx` runs it with ONNX Runtime:
+the model is exported once to `<cache_dir>/<model name>/`, optionally with
+dynamic int8 quantization, and later processes load the cached files.
+Backend and quantization come from the `inference` config section or the
+INFERENCE_BACKEND / INFERENCE_QUANTIZATION environment variables.
+"""
+import glob
+import os
+from typing import Optional
+from src.config import get_section
+
+BACKENDS = ("torch", "onnx")
+# Instruction-set targets understood by sentence_transformers.export_dynamic_quantized_onnx_model
+QUANTIZATION_TARGETS = ("arm64", "avx2", "avx512", "avx512_vnni")
+
+
+def inference_settings() -> dict:
+    cfg = get_section("inference")
+    backend = os.getenv("INFERENCE_BACKEND", cfg.get("backend", "torch")).lower()
+    quantization = os.getenv("INFERENCE_QUANTIZATION", cfg.get("quantization") or "") or None
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Expected one of {BACKENDS}")
+    if quantization and quantization not in QUANTIZATION_TARGETS:
+        raise ValueError(f"Unknown quantization target '{quantization}'. Expected one of {QUANTIZATION_TARGETS}")
+    return {"backend": backend, "quantization": quantization, "cache_dir": cfg.get("cache_dir", "data/models")}
+
+
+def _find_onnx_file(export_dir: str, quantization: Optional[str]) -> Optional[str]:
+    """Path of the exported .onnx file relative to export_dir, or None if not exported yet."""
+    files = glob.glob(os.path.join(export_dir, "**", "*.onnx"), recursive=True)
+    if quantization:
+        files = [f for f in files if f.endswith(f"_qint8_{quantization}.onnx")]
+    else:
+        files = [f for f in files if "_qint8_" not in os.path.basename(f)]
+    return os.path.relpath(sorted(files)[0], export_dir) if files else None
+
+
+def load_model(model_cls, model_name: str, backend: Optional[str] = None, quantization: Optional[str] = None,
+               **kwargs):
+    """
+    Instantiates a SentenceTransformer or CrossEncoder on the configured backend.
+    Explicit backend/quantization arguments override the config.
+    """
+    settings = inference_settings()
+    backend = backend or settings["backend"]
+    if backend == "torch":
+        return model_cls(model_name, **kwargs)
+    quantization = quantization if quantization is not None else settings["quantization"]
+
+    export_dir = os.path.join(settings["cache_dir"], model_name.replace("/", "__"))
+    onnx_file = _find_onnx_file(export_dir, quantization)
+    if onnx_file is None:
+        print(f"Exporting {model_name} to ONNX in {export_dir} (one-time)...")
+        model = model_cls(model_name, backend="onnx", **kwargs)
+        model.save_pretrained(export_dir)
+        if quantization:
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+            print(f"Quantizing {model_name} to dynamic int8 ({quantization})...")
+            export_dynamic_quantized_onnx_model(model, quantization, export_dir)
+        onnx_file = _find_onnx_file(export_dir, quantization)
+        if onnx_file is None:
+            raise RuntimeError(f"ONNX export of {model_name} produced no model file in {export_dir}")
+
+    return model_cls(export_dir, backend="onnx", model_kwargs={"file_name": onnx_file}, **kwargs)
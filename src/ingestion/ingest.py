@@ -3,7 +3,9 @@ import glob
 from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
 import numpy as np
 from tqdm import tqdm
 
@@ -14,85 +16,271 @@ from src.ingestion.chunkers import SlidingWindowChunker
 from src.indexer.bm25_index import BM25Index
 from src.indexer.faiss_index import FaissIndex
 from src.indexer.pinecone_index import PineconeIndex
+from src.indexer.chunk_store import ChunkStore
+from src.indexer import storage
+from src.indexer.near_dup import MinHasher, NearDupIndex
+from src.ingestion.manifest import MANIFEST_FILE, Manifest
+from src.ingestion.shards import RecordStream, ShardSet, ShardWriter, plan_id
+from src.config import get_section
 import uuid
 
 DATA_DIR = "data"
 RAW_DIR = os.path.join(DATA_DIR, "raw")
 INDEX_DIR = os.path.join(DATA_DIR, "index")
+MANIFEST_PATH = os.path.join(INDEX_DIR, MANIFEST_FILE)
+# Outside INDEX_DIR: the index directory is replaced as a whole by every save
+SHARD_DIR = os.path.join(DATA_DIR, "shards")
+
+def process_file(file_path: str, chunker: SlidingWindowChunker, minhasher: Optional[MinHasher] = None):
+    """
+    Read, clean and chunk one file (runs in a worker process).
+    minhasher: when set, each record also gets its LSH band keys ("lsh") for near-dup clustering.
+    Returns (records, error): chunk records in document order, or the error message.
+    """
+    path = Path(file_path)
+    try:
+        reader = get_reader(path)
+        raw_text = reader.read(path)
+        cleaned_text = clean_text(raw_text)
+        records = []
+        for chunk in chunker.chunk(cleaned_text):
+            # Generate a stable ID for metadata (for Pinecone)
+            chunk_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, str(path) + chunk[:50]))
+            record = {"source": str(path), "content": chunk, "id": chunk_id}
+            if minhasher is not None:
+                record["lsh"] = minhasher.band_keys(chunk)
+            records.append(record)
+        return records, None
+    except Exception as e:
+        return [], str(e)
+
+def process_files(file_paths: List[str], chunker: SlidingWindowChunker, minhasher: Optional[MinHasher] = None):
+    """process_file over a group of files, so small files do not pay one IPC round trip each."""
+    return [(file_path, *process_file(file_path, chunker, minhasher)) for file_path in file_paths]
+
 
 class IngestionPipeline:
     def __init__(self):
         self.chunker = SlidingWindowChunker()
+        # Near-duplicate clustering (signatures computed in the chunking workers); None when disabled
+        self.minhasher = MinHasher.from_config()
+        self.near_dup = NearDupIndex() if self.minhasher is not None else None
         # self.embedder = Embedder(model_name="all-MiniLM-L6-v2")
         self.bm25_index = BM25Index()
         
         # Check Vector DB Type
         self.vector_db_type = os.getenv("VECTOR_DB_TYPE", "faiss").lower()
         if self.vector_db_type == "pinecone":
-            self.vector_index = PineconeIndex(dimension=384)
+            self.vector_index = PineconeIndex.from_config(dimension=384)
         else:
-            self.vector_index = FaissIndex(dimension=384)
+            self.vector_index = FaissIndex.from_config(dimension=384)
         
-    def run(self):
+        cfg = get_section("ingestion")
+        self.workers = cfg.get("workers") or os.cpu_count() or 1
+        # Tasks submitted to the pool but not yet consumed; bounds memory held by finished results
+        self.max_in_flight = cfg.get("max_in_flight") or self.workers * 4
+        self.files_per_task = cfg.get("files_per_task") or 8
+        # Chunks buffered (text + embeddings) before a shard is written to disk
+        self.shard_size = cfg.get("shard_size") or 4096
+
+    def iter_files(self, files: List[str]) -> Iterator[Tuple[str, List[dict]]]:
+        """
+        (file path, chunk records) for every file, in file order. Groups of files_per_task files
+        are read, cleaned and chunked on a process pool with at most max_in_flight
+        groups outstanding, so the caller can embed earlier chunks while later
+        files are processed.
+        """
+        tasks = (files[i:i + self.files_per_task] for i in range(0, len(files), self.files_per_task))
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.submit(process_files, task, self.chunker, self.minhasher))
+                if len(pending) >= self.max_in_flight:
+                    break
+            with tqdm(total=len(files), desc="Processing files", unit="file") as progress:
+                while pending:
+                    future = pending.popleft()
+                    # Refill before blocking on the oldest task, to keep the workers busy
+                    task = next(tasks, None)
+                    if task is not None:
+                        pending.append(pool.submit(process_files, task, self.chunker, self.minhasher))
+                    for file_path, records, error in future.result():
+                        progress.update(1)
+                        if error:
+                            print(f"Error processing {file_path}: {error}")
+                        yield file_path, records
+
+    def run(self, full: bool = False):
+        """
+        Incremental by default: only new or modified files are chunked and
+        embedded, and chunks of modified or deleted files are removed. Falls back
+        to a full rebuild when `full` is set or there is no manifest / index yet.
+        """
         print("Starting ingestion...")
-        files = glob.glob(os.path.join(RAW_DIR, "*.*"))
-        
-        all_chunks = []
-        doc_map = [] # To map chunk index back to metadata/content if needed
-        
-        # 1. Read, Clean, Chunk
-        print("Processing files...")
-        for file_path in tqdm(files):
-            path = Path(file_path)
-            try:
-                reader = get_reader(path)
-                raw_text = reader.read(path)
-                cleaned_text = clean_text(raw_text)
-                chunks = self.chunker.chunk(cleaned_text)
-                
-                for chunk in chunks:
-                    all_chunks.append(chunk)
-                    # Generate a stable ID for metadata (for Pinecone)
-                    chunk_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, str(path) + chunk[:50]))
-                    doc_map.append({"source": str(path), "content": chunk, "id": chunk_id})
-            except Exception as e:
-                print(f"Error processing {path}: {e}")
-                
-        print(f"Total chunks generated: {len(all_chunks)}")
-        
-        # 2. Build BM25 Index
+        files = sorted(glob.glob(os.path.join(RAW_DIR, "*.*")))
+        manifest = None if full else Manifest.load(MANIFEST_PATH)
+        if manifest is None or not os.path.isdir(os.path.join(INDEX_DIR, "chunks")):
+            self.run_full(files)
+        else:
+            self.run_incremental(files, manifest)
+        print("Ingestion complete.")
+
+    def _embedder(self):
+        if not hasattr(self, "embedder"):
+            from src.embeddings.embedder import Embedder
+            self.embedder = Embedder(model_name="all-MiniLM-L6-v2")
+        return self.embedder
+
+    def _chunk_and_embed(self, files: List[str], first_row: int) -> ShardSet:
+        """
+        Chunks `files` on the process pool and streams the chunks into on-disk
+        shards under SHARD_DIR, embedding each shard as it is flushed. Memory
+        stays bounded by one shard plus the files in flight. If a previous run
+        with the same plan was interrupted, files already in finished shards are
+        skipped. The new chunks become rows first_row, first_row + 1, ...
+        and are clustered against self.near_dup as they are written.
+        """
+        embed = not os.getenv("DISABLE_VECTOR_DB")
+        if not embed:
+            print("Skipping Vector DB build due to DISABLE_VECTOR_DB environment variable.")
+        writer = ShardWriter(SHARD_DIR, plan_id(files, first_row, embed, self.minhasher), shard_size=self.shard_size,
+                             embed=(lambda texts: self._embedder().embed(texts)) if embed else None,
+                             near_dup=self.near_dup)
+        if writer.files_done:
+            print(f"Resuming: {writer.files_done} files already in {len(writer.shards)} shards")
+
+        remaining = files[writer.files_done:]
+        print(f"Processing {len(remaining)} files with {self.workers} workers...")
+        for _, records in self.iter_files(remaining):
+            writer.add_file(records)
+        shards = writer.finish()
+        print(f"Chunks generated: {len(shards)}")
+        return shards
+
+    def _index_vectors(self, shards: ShardSet, first_row: int):
+        """Adds the shards' embeddings to the vector index as rows first_row, first_row + 1, ..."""
+        if os.getenv("DISABLE_VECTOR_DB"):
+            return
+        # IVF needs its quantizer trained before any vector is added; a sample is enough
+        if self.vector_db_type != "pinecone" and not self.vector_index.is_trained:
+            sample = shards.sample_embeddings(max_vectors=256 * self.vector_index.params.get("nlist", 1024))
+            if len(sample):
+                print(f"Training {self.vector_index.index_type} index on {len(sample)} vectors...")
+                self.vector_index.train(sample)
+
+        print(f"Updating {self.vector_db_type.upper()} Index...")
+        for offset, records, embeddings in shards.batches():
+            if embeddings is None or not len(records):
+                continue
+            # Add to index (Pinecone vectors are keyed by chunk id)
+            if self.vector_db_type == "pinecone":
+                self.vector_index.add(np.asarray(embeddings), ids=[r["id"] for r in records])
+            else:
+                self.vector_index.add(np.asarray(embeddings), ids=np.arange(first_row + offset,
+                                                                            first_row + offset + len(records)))
+
+    def _save(self, doc_map, manifest: Manifest):
+        """
+        doc_map: sized, re-iterable records (list or RecordStream) in row order.
+        All artifacts are written as one generation into a staging copy of
+        INDEX_DIR that replaces it once complete, so readers and later runs never
+        see a vector index, BM25 index, chunk store and manifest from different
+        runs. Artifacts not rewritten (the FAISS index under DISABLE_VECTOR_DB)
+        are carried over from the current generation.
+        """
+        # The lock keeps API workers from persisting a live-index fold over this generation meanwhile
+        with storage.locked(INDEX_DIR), storage.atomic_dir(INDEX_DIR, carry_over=True) as staging:
+            if not os.getenv("DISABLE_VECTOR_DB"):
+                self.vector_index.save(os.path.join(staging, "faiss.index")) # No-op for Pinecone
+            self.bm25_index.save(os.path.join(staging, "bm25"))
+            # Save chunk store (text + metadata columns, addressed by row id)
+            ChunkStore.save(doc_map, os.path.join(staging, "chunks"), near_dup=self.near_dup)
+            # Written last: a staging directory without a manifest is never swapped in
+            manifest.save(os.path.join(staging, MANIFEST_FILE))
+
+    @staticmethod
+    def _record_files(manifest: Manifest, files: List[str], records, first_row: int):
+        """Stores each file's chunk ids and rows (files that failed to chunk get none)."""
+        by_source = {path: ([], []) for path in files}
+        for offset, record in enumerate(records):
+            chunk_ids, rows = by_source[record["source"]]
+            chunk_ids.append(record["id"])
+            rows.append(first_row + offset)
+        for path, (chunk_ids, rows) in by_source.items():
+            manifest.set(path, chunk_ids, rows)
+
+    def run_full(self, files: List[str]):
+        print("Full rebuild...")
+        shards = self._chunk_and_embed(files, first_row=0)
+        self._index_vectors(shards, first_row=0)
+
+        # Build BM25 Index (texts streamed back from the shards)
         print("Building BM25 Index...")
-        self.bm25_index.build(all_chunks)
-        os.makedirs(INDEX_DIR, exist_ok=True)
-        self.bm25_index.save(os.path.join(INDEX_DIR, "bm25.pkl"))
-        
-        # 3. Embed and Build Vector Index
-        print(f"Embedding chunks and updating {self.vector_db_type.upper()} Index...")
-        if not os.getenv("DISABLE_VECTOR_DB"):
-            batch_size = 32
-            for i in range(0, len(all_chunks), batch_size):
-                batch = all_chunks[i : i + batch_size]
-                batch_meta = doc_map[i : i + batch_size]
-                
-                embeddings = self.embedder.embed(batch)
-                
-                # Add to index (with metadata for Pinecone)
+        self.bm25_index.build(shards.texts())
+
+        manifest = Manifest()
+        self._record_files(manifest, files, shards.records(), first_row=0)
+        self._save(shards.as_stream(), manifest)
+        shards.cleanup()
+
+    def run_incremental(self, files: List[str], manifest: Manifest):
+        new, modified, deleted = manifest.diff(files)
+        print(f"Incremental update: {len(new)} new, {len(modified)} modified, {len(deleted)} deleted files")
+        if not (new or modified or deleted):
+            manifest.save(MANIFEST_PATH)
+            return
+
+        # Existing artifacts; rows keep their ids, removed rows become empty tombstones
+        store = ChunkStore.load(os.path.join(INDEX_DIR, "chunks"))
+        if self.near_dup is not None and store.near_dup is not None:
+            # New chunks join clusters of existing ones (stores built without clustering start an empty table)
+            self.near_dup = store.near_dup
+        self.bm25_index.load(os.path.join(INDEX_DIR, "bm25"))
+        use_vectors = not os.getenv("DISABLE_VECTOR_DB")
+        if use_vectors and self.vector_db_type != "pinecone":
+            self.vector_index.load(os.path.join(INDEX_DIR, "faiss.index"))
+
+        # 1. Remove chunks of modified and deleted files (before re-adding: chunk ids can repeat)
+        removed_rows, removed_ids = [], []
+        for path in modified + deleted:
+            entry = manifest.remove(path)
+            removed_rows.extend(entry["rows"])
+            removed_ids.extend(entry["chunk_ids"])
+        if removed_rows:
+            print(f"Removing {len(removed_rows)} chunks...")
+            self.bm25_index.delete(removed_rows)
+            if use_vectors:
                 if self.vector_db_type == "pinecone":
-                    self.vector_index.add(embeddings, metadata=batch_meta)
+                    self.vector_index.delete(removed_ids)
                 else:
-                    self.vector_index.add(embeddings)
-                
-            self.vector_index.save(os.path.join(INDEX_DIR, "faiss.index")) # No-op for Pinecone
-        else:
-            print("Skipping Vector DB build due to DISABLE_VECTOR_DB environment variable.")
-        
-        # Save doc_map (simple persistence for retrieval lookup)
-        import pickle
-        with open(os.path.join(INDEX_DIR, "doc_map.pkl"), "wb") as f:
-            pickle.dump(doc_map, f)
-            
-        print("Ingestion complete.")
+                    self.vector_index.remove(removed_rows)
+
+        # 2. Chunk and embed new and modified files as new rows
+        changed = sorted(new + modified)
+        first_row = len(store)
+        shards = self._chunk_and_embed(changed, first_row=first_row)
+        self._index_vectors(shards, first_row=first_row)
+        rows = self.bm25_index.add_documents(shards.texts())
+        # Every artifact addresses chunks by row id; the BM25 rows must line up with the chunk store's
+        if len(rows) and rows[0] != first_row:
+            raise RuntimeError(f"BM25 index appended rows from {rows[0]}, expected {first_row}; "
+                               "the index artifacts are out of sync (run a full rebuild)")
+        self._record_files(manifest, changed, shards.records(), first_row=first_row)
+
+        removed = set(removed_rows)
+        tombstone = {"content": "", "source": "", "id": ""}
+        existing = lambda: (tombstone if row in removed else store.record(row) for row in range(len(store)))
+        doc_map = RecordStream([(len(store), existing), (len(shards), shards.records)])
+
+        dead = self.bm25_index.num_deleted
+        print(f"{len(doc_map) - dead} live chunks, {dead} tombstoned rows (reclaimed by a full rebuild)")
+        self._save(doc_map, manifest)
+        shards.cleanup()
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Build or update the search indexes from data/raw.")
+    parser.add_argument("--full", action="store_true", help="rebuild everything instead of updating incrementally")
+    args = parser.parse_args()
     pipeline = IngestionPipeline()
-    pipeline.run()
+    pipeline.run(full=args.full)
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+MANIFEST_VERSION = 1
+# Name of the manifest inside the index directory
+MANIFEST_FILE = "manifest.json"
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Manifest:
+    """
+    What the current indexes were built from: for every source file its
+    content hash, mtime, size, and the chunk ids / chunk-store rows it produced.
+    Incremental ingestion diffs data/raw against it to find the files to
+    (re)chunk and the rows to delete.
+    """
+    def __init__(self, files: Optional[Dict[str, dict]] = None):
+        self.files = files or {}
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Manifest"]:
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION:
+            print(f"Ignoring manifest {path} with version {data.get('version')}")
+            return None
+        return cls(data["files"])
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def stat_entry(path: str) -> dict:
+        st = os.stat(path)
+        return {"hash": file_hash(path), "mtime": st.st_mtime, "size": st.st_size}
+
+    def diff(self, paths: List[str]):
+        """
+        Classifies source files against the manifest.
+        Returns (new, modified, deleted) path lists; unchanged files whose mtime
+        moved are re-stamped in place. mtime + size short-circuit hashing.
+        """
+        new, modified = [], []
+        for path in paths:
+            entry = self.files.get(path)
+            if entry is None:
+                new.append(path)
+                continue
+            st = os.stat(path)
+            if st.st_mtime == entry["mtime"] and st.st_size == entry["size"]:
+                continue
+            if file_hash(path) == entry["hash"]:
+                entry["mtime"] = st.st_mtime
+                continue
+            modified.append(path)
+        present = set(paths)
+        deleted = [path for path in self.files if path not in present]
+        return new, modified, deleted
+
+    def set(self, path: str, chunk_ids: List[str], rows: List[int]):
+        self.files[path] = {**self.stat_entry(path), "chunk_ids": chunk_ids, "rows": rows}
+
+    def reassign(self, path: str, chunk_ids: List[str], rows: List[int]):
+        """Replaces a file's chunks and rows, keeping its stamp (the file itself did not change)."""
+        self.files[path] = {**self.files[path], "chunk_ids": chunk_ids, "rows": rows}
+
+    def remove(self, path: str) -> dict:
+        return self.files.pop(path)
@@ -0,0 +1,202 @@
+"""
+On-disk shards for bounded-memory ingestion.
+
+Chunks are written as they are produced, a shard (text / source / id columns
+plus embeddings and near-duplicate clusters) every `shard_size` chunks, always
+ending on a file boundary.
+A checkpoint after each shard records how many input files are fully covered,
+so an interrupted run resumes after the last finished shard. The final
+indexes are built by streaming the shards back.
+"""
+import hashlib
+import json
+import os
+import shutil
+from typing import Callable, Iterator, List, Optional, Tuple
+import numpy as np
+from src.indexer import storage
+from src.indexer.chunk_store import hash_key
+from src.indexer.near_dup import NearDupIndex
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def plan_id(files: List[str], first_row: int, embed: bool, minhasher=None) -> str:
+    """
+    Identifies a run's work: same input files (path, size, mtime), start row,
+    embedding mode and near-dup signature settings (a MinHasher, or None).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    lsh = "" if minhasher is None else f"{minhasher.num_perm}/{minhasher.bands}/{minhasher.shingle_size}"
+    h.update(f"{first_row}:{embed}:{lsh};".encode())
+    for path in files:
+        st = os.stat(path)
+        h.update(f"{path}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()
+
+
+class RecordStream:
+    """
+    Sized, re-iterable view over record iterables, so that ChunkStore.save can
+    make its passes over the records without holding them in a list.
+    parts: (length, factory returning a fresh iterator) pairs, chained in order.
+    """
+    def __init__(self, parts: List[Tuple[int, Callable[[], Iterator[dict]]]]):
+        self.parts = parts
+
+    def __len__(self) -> int:
+        return sum(length for length, _ in self.parts)
+
+    def __iter__(self) -> Iterator[dict]:
+        for _, factory in self.parts:
+            yield from factory()
+
+
+class ShardSet:
+    """Finished shards of one run, read back one shard at a time."""
+    def __init__(self, root: str, shards: List[dict]):
+        self.root = root
+        self.shards = shards
+
+    def __len__(self) -> int:
+        return sum(shard["num_chunks"] for shard in self.shards)
+
+    def _columns(self, shard: dict):
+        path = os.path.join(self.root, shard["name"])
+        return [storage.StringColumn.open(path, name) for name in ("text", "source", "id")]
+
+    def _records(self, shard: dict) -> Iterator[dict]:
+        text, source, chunk_id = self._columns(shard)
+        clusters = None
+        if shard.get("clustered"):
+            clusters = storage.load_array(os.path.join(self.root, shard["name"]), "cluster_id").tolist()
+        for i in range(len(text)):
+            record = {"content": text[i], "source": source[i], "id": chunk_id[i]}
+            if clusters is not None:
+                record["cluster_id"] = clusters[i]
+            yield record
+
+    def records(self) -> Iterator[dict]:
+        for shard in self.shards:
+            yield from self._records(shard)
+
+    def texts(self) -> Iterator[str]:
+        for shard in self.shards:
+            yield from self._columns(shard)[0]
+
+    def as_stream(self) -> RecordStream:
+        return RecordStream([(len(self), self.records)])
+
+    def batches(self) -> Iterator[Tuple[int, List[dict], Optional[np.ndarray]]]:
+        """(offset of the shard's first chunk, its records, its embeddings or None) per shard."""
+        offset = 0
+        for shard in self.shards:
+            path = os.path.join(self.root, shard["name"])
+            records = list(self._records(shard))
+            embeddings = storage.load_array(path, "embeddings") if shard["embedded"] else None
+            yield offset, records, embeddings
+            offset += len(records)
+
+    def sample_embeddings(self, max_vectors: int, seed: int = 0) -> np.ndarray:
+        """Uniform sample of the shards' embeddings (all of them if there are at most max_vectors)."""
+        total = len(self)
+        rng = np.random.default_rng(seed)
+        keep = np.sort(rng.choice(total, size=max_vectors, replace=False)) if total > max_vectors else np.arange(total)
+        parts = []
+        for offset, _, embeddings in self.batches():
+            if embeddings is None:
+                continue
+            local = keep[(keep >= offset) & (keep < offset + len(embeddings))] - offset
+            parts.append(np.asarray(embeddings[local], dtype=np.float32))
+        return np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class ShardWriter:
+    """
+    Buffers chunk records per file and flushes a shard once `shard_size` chunks
+    are buffered. `embed` (texts -> array) is applied at flush time, one shard
+    at a time. When records carry LSH band keys ("lsh", from
+    MinHasher.band_keys), they are clustered against `near_dup` in row order
+    and the shard stores the keys and cluster ids. Resumes from the
+    checkpoint in `root` when it belongs to the same plan; otherwise starts over.
+    """
+    def __init__(self, root: str, plan: str, shard_size: int = 4096,
+                 embed: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 near_dup: Optional[NearDupIndex] = None):
+        self.root = root
+        self.plan = plan
+        self.shard_size = shard_size
+        self.embed = embed
+        self.near_dup = near_dup
+        self.shards = []
+        self.files_done = 0
+        checkpoint = self._read_checkpoint()
+        if checkpoint and checkpoint["plan"] == plan:
+            self.shards = checkpoint["shards"]
+            self.files_done = checkpoint["files_done"]
+            # Later chunks must also cluster against the chunks of the finished shards
+            for shard in self.shards:
+                if near_dup is not None and shard.get("clustered"):
+                    path = os.path.join(root, shard["name"])
+                    near_dup.register(storage.load_array(path, "lsh"), storage.load_array(path, "cluster_id"))
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+        os.makedirs(root, exist_ok=True)
+        self._buffer = []
+        self._buffered_files = 0
+
+    def _read_checkpoint(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.root, CHECKPOINT_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def num_chunks(self) -> int:
+        """Chunks in finished shards (the next shard starts at this offset)."""
+        return sum(shard["num_chunks"] for shard in self.shards)
+
+    def add_file(self, records: List[dict]):
+        self._buffer.extend(records)
+        self._buffered_files += 1
+        if len(self._buffer) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffered_files:
+            return
+        name = f"shard-{len(self.shards):05d}"
+        with storage.atomic_dir(os.path.join(self.root, name)) as tmp:
+            storage.write_meta(tmp, "ingest_shard", num_chunks=len(self._buffer))
+            storage.save_strings(tmp, "text", (r["content"] for r in self._buffer))
+            storage.save_strings(tmp, "source", (r["source"] for r in self._buffer))
+            storage.save_strings(tmp, "id", (r["id"] for r in self._buffer))
+            if self.embed is not None and self._buffer:
+                embeddings = self.embed([r["content"] for r in self._buffer])
+                storage.save_array(tmp, "embeddings", np.asarray(embeddings, dtype=np.float32))
+            clustered = self.near_dup is not None and bool(self._buffer) and "lsh" in self._buffer[0]
+            if clustered:
+                band_keys = np.vstack([r["lsh"] for r in self._buffer])
+                content_hash = np.fromiter((hash_key(r["content"]) for r in self._buffer), dtype=np.uint64,
+                                           count=len(self._buffer))
+                storage.save_array(tmp, "lsh", band_keys)
+                storage.save_array(tmp, "cluster_id", self.near_dup.assign(band_keys, content_hash))
+        self.shards.append({"name": name, "num_chunks": len(self._buffer),
+                            "embedded": self.embed is not None and bool(self._buffer), "clustered": clustered})
+        self.files_done += self._buffered_files
+        self._buffer = []
+        self._buffered_files = 0
+
+        # Checkpoint only after the shard directory is complete
+        tmp_path = os.path.join(self.root, CHECKPOINT_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"plan": self.plan, "files_done": self.files_done, "shards": self.shards}, f)
+        os.replace(tmp_path, os.path.join(self.root, CHECKPOINT_FILE))
+
+    def finish(self) -> ShardSet:
+        self.flush()
+        return ShardSet(self.root, self.shards)
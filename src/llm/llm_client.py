@@ -1,14 +1,30 @@
+import asyncio
 import os
-import openai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 
 class LLMClient:
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
         raise NotImplementedError
 
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        # Fallback for clients without a native async API: keep the event loop free
+        return await asyncio.to_thread(self.chat, messages, **kwargs)
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """Yields the response as text deltas. Default: the whole response as one piece."""
+        yield self.chat(messages, **kwargs)
+
+def _iter_deltas(response) -> Iterator[str]:
+    """Text deltas of an OpenAI-compatible streaming chat completion."""
+    for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
 class OpenAIClient(LLMClient):
     def __init__(self, api_key: str = None, model: str = "gpt-4o"):
+        import openai  # deferred: slow to import, loaded with the other startup components
         self.client = openai.OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+        self.async_client = openai.AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
         self.model = model
 
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
@@ -19,8 +35,26 @@ class OpenAIClient(LLMClient):
         )
         return response.choices[0].message.content
 
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            **kwargs
+        )
+        return response.choices[0].message.content
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            **kwargs
+        )
+        yield from _iter_deltas(response)
+
 class VLLMClient(LLMClient):
     def __init__(self, api_url: str = None, model: str = None):
+        import openai
         self.api_url = api_url or os.getenv("VLLM_API_URL", "http://localhost:8000/v1")
         self.model = model or os.getenv("VLLM_MODEL", "mistralai/Mistral-7B-Instruct-v0.2")
         # vLLM is OpenAI compatible
@@ -28,6 +62,10 @@ class VLLMClient(LLMClient):
             base_url=self.api_url,
             api_key="EMPTY"
         )
+        self.async_client = openai.AsyncOpenAI(
+            base_url=self.api_url,
+            api_key="EMPTY"
+        )
 
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
         response = self.client.chat.completions.create(
@@ -37,8 +75,26 @@ class VLLMClient(LLMClient):
         )
         return response.choices[0].message.content
 
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            **kwargs
+        )
+        return response.choices[0].message.content
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            **kwargs
+        )
+        yield from _iter_deltas(response)
+
 class GroqClient(LLMClient):
     def __init__(self, api_key: str = None, model: str = "llama-3.3-70b-versatile"):
+        import openai
         self.api_key = api_key or os.getenv("GROQ_API_KEY")
         if not self.api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables")
@@ -48,6 +104,19 @@ class GroqClient(LLMClient):
             api_key=self.api_key,
             timeout=30.0  # Add timeout
         )
+        self.async_client = openai.AsyncOpenAI(
+            base_url="https://api.groq.com/openai/v1",
+            api_key=self.api_key,
+            timeout=30.0
+        )
+
+    @staticmethod
+    def _error(e: Exception) -> Exception:
+        # Better error message
+        error_msg = f"Groq API Error: {str(e)}"
+        if "Connection error" in str(e):
+            error_msg += "\n\nPossible causes:\n1. Network blocked by Hugging Face Spaces\n2. Groq API is down\n3. Invalid API key"
+        return Exception(error_msg)
 
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
         try:
@@ -59,8 +128,29 @@ class GroqClient(LLMClient):
             )
             return response.choices[0].message.content
         except Exception as e:
-            # Better error message
-            error_msg = f"Groq API Error: {str(e)}"
-            if "Connection error" in str(e):
-                error_msg += "\n\nPossible causes:\n1. Network blocked by Hugging Face Spaces\n2. Groq API is down\n3. Invalid API key"
-            raise Exception(error_msg) from e
+            raise self._error(e) from e
+
+    async def achat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                timeout=30.0,
+                **kwargs
+            )
+            return response.choices[0].message.content
+        except Exception as e:
+            raise self._error(e) from e
+
+    def stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                timeout=30.0,
+                stream=True,
+                **kwargs
+            )
+            yield from _iter_deltas(response)
+        except Exception as e:
+            raise self._error(e) from e
@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import Hashable, Optional
+import numpy as np
+from src.config import get_section
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by query-embedding similarity.
+
+    Each entry holds (normalized query embedding, pipeline result incl. context
+    ids, index version, request params). A new query reuses the answer of the
+    most similar cached query if cosine >= threshold, the entry is younger than
+    the TTL, it was produced by the same index version and with the same
+    request params. Embeddings live in one preallocated matrix so a lookup is
+    a single mat-vec product. Least recently used entries are evicted when full.
+    """
+    def __init__(self, dimension: int, threshold: float = 0.95, ttl_seconds: float = 3600,
+                 max_entries: int = 2000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._vectors = np.zeros((max_entries, dimension), dtype=np.float32)
+        self._entries = [None] * max_entries
+        self._last_used = np.full(max_entries, -np.inf)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, dimension: int) -> Optional["SemanticAnswerCache"]:
+        cfg = get_section("answer_cache")
+        if not cfg.get("enabled"):
+            return None
+        return cls(dimension, threshold=cfg.get("similarity_threshold", 0.95),
+                   ttl_seconds=cfg.get("ttl_seconds", 3600), max_entries=cfg.get("max_entries", 2000))
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _drop(self, slot: int):
+        self._entries[slot] = None
+        self._last_used[slot] = -np.inf
+        self._vectors[slot] = 0
+
+    def lookup(self, query_embedding: np.ndarray, index_version: str, params: Hashable) -> Optional[dict]:
+        query = self._normalize(query_embedding)
+        now = time.time()
+        with self._lock:
+            sims = self._vectors @ query
+            for slot in np.argsort(-sims):
+                if sims[slot] < self.threshold:
+                    break
+                entry = self._entries[slot]
+                if entry is None:
+                    continue
+                if entry["index_version"] != index_version or now - entry["created"] > self.ttl_seconds:
+                    # Stale: built from another index, or expired
+                    self._drop(slot)
+                    continue
+                if entry["params"] != params:
+                    continue
+                self._last_used[slot] = now
+                self.hits += 1
+                return entry["result"]
+            self.misses += 1
+            return None
+
+    def store(self, query_embedding: np.ndarray, result: dict, index_version: str, params: Hashable):
+        with self._lock:
+            empty = [i for i, e in enumerate(self._entries) if e is None]
+            slot = empty[0] if empty else int(np.argmin(self._last_used))
+            now = time.time()
+            self._vectors[slot] = self._normalize(query_embedding)
+            self._entries[slot] = {
+                "result": result,
+                "index_version": index_version,
+                "params": params,
+                "created": now,
+            }
+            self._last_used[slot] = now
+
+    def clear(self):
+        with self._lock:
+            for slot in range(self.max_entries):
+                self._drop(slot)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": sum(e is not None for e in self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,55 +1,159 @@
+import math
+import re
+from typing import Callable, List, Optional, Tuple
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 def maximal_marginal_relevance(query_embedding: np.ndarray, doc_embeddings: np.ndarray, lambda_mult: float = 0.5, top_k: int = 5):
     """
     Selects docs that are relevant to query but diverse from each other.
+    Greedy MMR over cosine similarities: each step picks the doc maximizing
+    lambda_mult * sim(query, doc) - (1 - lambda_mult) * max sim(doc, selected).
+    Both similarity matrices are computed once up front; the max similarity to
+    the selected set is updated incrementally. Returns indices in pick order.
     """
-    if len(doc_embeddings) == 0:
+    docs = np.asarray(doc_embeddings, dtype=np.float32)
+    if len(docs) == 0 or top_k <= 0:
         return []
-    
-    # Simple MMR implementation
+    docs = docs / np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = lambda_mult * (docs @ query)
+    similarity = (1 - lambda_mult) * (docs @ docs.T)
+    # Max similarity to the selected docs (0 before the first pick)
+    redundancy = np.zeros(len(docs), dtype=np.float32)
+    available = np.ones(len(docs), dtype=bool)
+
     selected_indices = []
-    candidate_indices = list(range(len(doc_embeddings)))
-    
-    for _ in range(top_k):
-        best_score = -np.inf
-        best_idx = -1
-        
-        for idx in candidate_indices:
-            # Relevance
-            rel_score = cosine_similarity(query_embedding.reshape(1, -1), doc_embeddings[idx].reshape(1, -1))[0][0]
-            
-            # Diversity (sim to already selected)
-            if not selected_indices:
-                div_score = 0
-            else:
-                sims = cosine_similarity(doc_embeddings[idx].reshape(1, -1), doc_embeddings[selected_indices])[0]
-                div_score = np.max(sims)
-                
-            mmr_score = lambda_mult * rel_score - (1 - lambda_mult) * div_score
-            
-            if mmr_score > best_score:
-                best_score = mmr_score
-                best_idx = idx
-                
-        if best_idx != -1:
-            selected_indices.append(best_idx)
-            candidate_indices.remove(best_idx)
-            
+    for _ in range(min(top_k, len(docs))):
+        scores = np.where(available, relevance - redundancy, -np.inf)
+        best_idx = int(np.argmax(scores))
+        if selected_indices:
+            np.maximum(redundancy, similarity[best_idx], out=redundancy)
+        else:
+            redundancy = similarity[best_idx].copy()
+        selected_indices.append(best_idx)
+        available[best_idx] = False
     return selected_indices
 
-def deduplicate_docs(docs: list[dict], threshold: float = 0.95) -> list[dict]:
+def deduplicate_docs(docs: list[dict]) -> list[dict]:
     """
-    Remove near-duplicates based on content string similarity (simple) 
-    or just exact match for now to be fast.
+    Keeps the first doc of each near-duplicate cluster: docs are strings or
+    dicts with 'content' and, when they come from the chunk store, the
+    'cluster_id' assigned at ingestion (exact content match otherwise).
     """
     seen = set()
     unique_docs = []
     for doc in docs:
-        # Assuming doc is a string or dict with 'content'
-        content = doc if isinstance(doc, str) else doc.get('content', '')
-        if content not in seen:
-            seen.add(content)
+        key = doc if isinstance(doc, str) else doc.get('cluster_id', doc.get('content', ''))
+        if key not in seen:
+            seen.add(key)
             unique_docs.append(doc)
     return unique_docs
+
+def deduplicate_ids(rows: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """
+    Keeps the first occurrence of each key (e.g. ChunkStore.cluster_id) among
+    ranked row ids, without materializing any text.
+    """
+    seen = set()
+    keep = []
+    for row in rows.tolist():
+        key = int(keys[row])
+        if key not in seen:
+            seen.add(key)
+            keep.append(row)
+    return np.asarray(keep, dtype=np.int32)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+")
+_PIECE = re.compile(r"\w+|[^\w\s]")
+
+class TokenCounter:
+    """
+    Token counts with the LLM's tiktoken encoding: the model's own when
+    tiktoken knows it, cl100k_base otherwise (close for Llama/Mistral-style
+    BPE vocabularies), or an explicit `encoding`. tiktoken downloads its BPE
+    files on first use; if that fails (offline), counts are estimated from
+    words and punctuation, rounded up.
+    """
+    def __init__(self, model: Optional[str] = None, encoding: Optional[str] = None):
+        self.encoding = None
+        try:
+            import tiktoken
+            if encoding:
+                self.encoding = tiktoken.get_encoding(encoding)
+            else:
+                try:
+                    self.encoding = tiktoken.encoding_for_model(model or "")
+                except KeyError:
+                    self.encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"WARNING: Could not load a tiktoken encoding ({e}). Estimating token counts.")
+        self.name = self.encoding.name if self.encoding is not None else "estimate"
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(_PIECE.findall(text)) * 1.3)
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        if self.encoding is not None:
+            return [len(tokens) for tokens in self.encoding.encode_batch(texts, disallowed_special=())]
+        return [self.count(text) for text in texts]
+
+def split_units(text: str, window_words: int = 64) -> List[str]:
+    """Sentences of a chunk; sentences longer than window_words (tables, lists) are cut into word windows."""
+    units = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        words = sentence.split()
+        for start in range(0, len(words), window_words):
+            units.append(" ".join(words[start:start + window_words]))
+    return units
+
+def pack_context(query: str, passages: List[str], counter: TokenCounter, max_tokens: int,
+                 idf: Optional[Callable[[str], float]] = None, window_words: int = 64) -> Tuple[List[str], dict]:
+    """
+    Fits the reranked passages (best first) into max_tokens of context.
+
+    Each passage is cut into sentences / windows, scored by the summed idf of
+    the query terms they contain (1 per term without `idf`). Units are taken
+    by score, then by passage rank and position, while they fit the budget;
+    units without query terms only fill what budget is left. Each passage
+    keeps its selected units in their original order, with gaps marked "...".
+    Returns (packed passages in rank order, stats).
+    """
+    query_terms = set(_WORD.findall(query.lower()))
+    weight = {term: (idf(term) if idf else 1.0) for term in query_terms}
+    units = []  # (score, passage, position, text)
+    for p, passage in enumerate(passages):
+        for pos, unit in enumerate(split_units(passage, window_words)):
+            terms = set(_WORD.findall(unit.lower())) & query_terms
+            units.append((sum(weight[t] for t in terms), p, pos, unit))
+    tokens = counter.count_batch([unit for *_, unit in units])
+    # Passage separators ("\n\n") and gap markers
+    overhead = counter.count("\n\n ... ")
+
+    selected = {}
+    used = 0
+    for i in sorted(range(len(units)), key=lambda i: (-units[i][0], units[i][1], units[i][2])):
+        _, p, pos, unit = units[i]
+        cost = tokens[i] + overhead
+        if used + cost > max_tokens:
+            continue
+        selected.setdefault(p, []).append((pos, unit))
+        used += cost
+
+    packed = []
+    for p in sorted(selected):
+        parts, last = [], -1
+        for pos, unit in sorted(selected[p]):
+            if last >= 0 and pos != last + 1:
+                parts.append("...")
+            parts.append(unit)
+            last = pos
+        packed.append(" ".join(parts))
+    stats = {"max_tokens": max_tokens, "tokens": counter.count("\n\n".join(packed)), "tokenizer": counter.name,
+             "input_tokens": sum(tokens), "units": len(units), "selected_units": sum(map(len, selected.values())),
+             "passages": len(packed)}
+    return packed, stats
@@ -1,59 +1,265 @@
+import asyncio
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
+import numpy as np
 from src.retriever.hybrid_retriever import HybridRetriever
 from src.retriever.hyde import HyDERetriever
 from src.reranker.cross_encoder import Reranker
-from src.llm.llm_client import OpenAIClient, VLLMClient, GroqClient
-from src.embeddings.embedder import Embedder
-from src.pipeline.context_opt import deduplicate_docs
+from src.reranker.cascade import CascadeReranker
+from src.llm.llm_client import LLMClient, OpenAIClient, VLLMClient, GroqClient
+from src.embeddings.embedder import Embedder, QueryEmbeddingCache
+from src.pipeline.context_opt import TokenCounter, deduplicate_ids, maximal_marginal_relevance, pack_context
+from src.pipeline.answer_cache import SemanticAnswerCache
+from src.config import get_section
+from src.utils.startup import ComponentLoader
+from src.utils.tracing import Trace, cache_event, in_context, record, span, start_trace
+
+WARMUP_QUERY = "warmup query"
+
+SYSTEM_PROMPT = """
+You are an enterprise-grade question answering system.
+
+Rules:
+1. Answer strictly using ONLY the provided context.
+2. DO NOT use prior knowledge or assumptions.
+3. If the answer is not explicitly stated in the context, respond EXACTLY with:
+   "I do not have enough information in the provided documents to answer this question."
+4. Do not add explanations, guesses, or external facts.
+"""
 
 class QueryPipeline:
-    def __init__(self, use_hyde: bool = False):
-        self.embedder = Embedder()
-        self.retriever = HybridRetriever(
-            bm25_path="data/index/bm25.pkl",
-            faiss_path="data/index/faiss.index",
-            doc_map_path="data/index/doc_map.pkl",
-            embedder=self.embedder
+    def __init__(self, use_hyde: bool = False, index_dir: str = "data/index", llm: Optional[LLMClient] = None,
+                 embedder: Optional[Embedder] = None, loader: Optional[ComponentLoader] = None):
+        """
+        index_dir: directory holding the bm25 / faiss.index / chunks artifacts.
+        llm, embedder: injected instances (e.g. a stub LLM for benchmarks); built from the environment by default.
+        loader: records per-component load state and times (e.g. for a readiness endpoint).
+        Models, index artifacts and the LLM client load concurrently; __init__ returns once all are loaded.
+        """
+        self.startup = loader or ComponentLoader()
+        paths = dict(
+            bm25_path=os.path.join(index_dir, "bm25"),
+            faiss_path=os.path.join(index_dir, "faiss.index"),
+            chunk_store_path=os.path.join(index_dir, "chunks"),
+            legacy_doc_map_path=os.path.join(index_dir, "doc_map.pkl"),
         )
-        
-        # LLM Client Strategy
-        if os.getenv("GROQ_API_KEY"):
-             self.llm = GroqClient()
-        elif os.getenv("VLLM_API_URL"):
-            self.llm = VLLMClient()
-        else:
-            self.llm = OpenAIClient()
-            
+        HybridRetriever.load_artifacts(self.startup, **paths)
+        self.startup.start("embedder", lambda: embedder or Embedder(
+            query_cache=QueryEmbeddingCache.from_config("all-MiniLM-L6-v2")))
+        self.startup.start("reranker", Reranker)
+        self.startup.start("llm", lambda: llm or self._default_llm())
+
+        self.embedder = self.startup.get("embedder")
+        self.retriever = HybridRetriever(embedder=self.embedder, loader=self.startup, **paths)
+        self.store = self.retriever.store
+        self.index = self.retriever  # HybridRetriever, even when wrapped by HyDE below
+        self.answer_cache = SemanticAnswerCache.from_config(dimension=384)
+
+        self.llm = self.startup.get("llm")
+        # Token counts for context packing, in the LLM's tokenizer (may download the encoding on first use)
+        self.packing = get_section("context_packing")
+        self.startup.start("tokenizer", TokenCounter, getattr(self.llm, "model", None), self.packing.get("encoding"))
         if use_hyde:
             self.retriever = HyDERetriever(self.llm, self.retriever)
             
-        self.reranker = Reranker()
+        self.reranker = self.startup.get("reranker")
+        self.cascade = CascadeReranker.from_config(self.reranker)
+        self.mmr = get_section("mmr")
+        self.tokenizer = self.startup.get("tokenizer")
+
+        # Bounded pool for CPU-bound stages of arun (embedding, BM25/FAISS, rerank)
+        self._executor = ThreadPoolExecutor(max_workers=get_section("pipeline").get("cpu_workers", 4),
+                                            thread_name_prefix="pipeline")
+
+    @staticmethod
+    def _default_llm() -> LLMClient:
+        # LLM Client Strategy
+        if os.getenv("GROQ_API_KEY"):
+            return GroqClient()
+        if os.getenv("VLLM_API_URL"):
+            return VLLMClient()
+        return OpenAIClient()
+
+    def warmup(self) -> dict:
+        """
+        Runs one dummy query through the embedder, the retriever and the
+        cross-encoder (not the LLM), so that the first real request does not
+        pay for one-off costs: kernel/session setup, first page faults on the
+        memory-mapped indexes. Caches are bypassed. Returns seconds per step.
+        """
+        timings = {}
+        start = time.perf_counter()
+        query_embedding = np.asarray(self.embedder.embed([WARMUP_QUERY]), dtype=np.float32)
+        timings["embedder"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        rows, _ = self.index.search_batch([WARMUP_QUERY], top_k=5, query_embeddings=query_embedding)[0]
+        timings["retriever"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        self.reranker.score(WARMUP_QUERY, self.store.texts(rows) or [WARMUP_QUERY])
+        timings["reranker"] = round(time.perf_counter() - start, 3)
+        return timings
+
+    def run(self, query: str, top_k_retrieval: int = 20, top_k_rerank: int = 5, search_params: Optional[dict] = None,
+            alpha: Optional[float] = None, rerank_budget_ms: Optional[float] = None):
+        options = dict(top_k_retrieval=top_k_retrieval, top_k_rerank=top_k_rerank,
+                       search_params=search_params, alpha=alpha, rerank_budget_ms=rerank_budget_ms)
+        with start_trace() as trace:
+            with span("total"):
+                result = self._run(query, options)
+        return {**result, "timings": trace.timings}
+
+    def _run(self, query: str, options: dict) -> dict:
+        cached, cache_ctx = self._lookup_answer(query, options)
+        if cached is not None:
+            return cached
+
+        prepared = self._prepare(query, options, cache_ctx)
+        if "result" in prepared:
+            return self._store_answer(prepared["result"], cache_ctx)
+
+        with span("llm"):
+            answer = self.llm.chat(prepared["messages"])
+        return self._store_answer(self._result(query, answer, prepared), cache_ctx)
+
+    async def arun(self, query: str, top_k_retrieval: int = 20, top_k_rerank: int = 5,
+                   search_params: Optional[dict] = None, alpha: Optional[float] = None,
+                   rerank_budget_ms: Optional[float] = None):
+        """
+        Async variant of run for the API: CPU-bound stages (embedding, BM25/FAISS,
+        reranking) run on the pipeline's bounded executor and the LLM call is awaited,
+        so the event loop keeps serving other requests meanwhile.
+        """
+        options = dict(top_k_retrieval=top_k_retrieval, top_k_rerank=top_k_rerank,
+                       search_params=search_params, alpha=alpha, rerank_budget_ms=rerank_budget_ms)
+        with start_trace() as trace:
+            with span("total"):
+                result = await self._arun(query, options)
+        return {**result, "timings": trace.timings}
+
+    async def _arun(self, query: str, options: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        # in_context: spans recorded on executor threads land in this request's trace
+        cached, cache_ctx = await loop.run_in_executor(self._executor, in_context(self._lookup_answer), query, options)
+        if cached is not None:
+            return cached
+
+        prepared = await loop.run_in_executor(self._executor, in_context(self._prepare), query, options, cache_ctx)
+        if "result" in prepared:
+            return self._store_answer(prepared["result"], cache_ctx)
+
+        with span("llm"):
+            answer = await self.llm.achat(prepared["messages"])
+        return self._store_answer(self._result(query, answer, prepared), cache_ctx)
+
+    def run_stream(self, query: str, top_k_retrieval: int = 20, top_k_rerank: int = 5,
+                   search_params: Optional[dict] = None, alpha: Optional[float] = None,
+                   rerank_budget_ms: Optional[float] = None):
+        """
+        Streaming variant of run. Yields events:
+          {"type": "context", "context": [...], "retrieval_score": ...}  once retrieval + rerank are done
+          {"type": "token", "content": str}                              for each LLM text delta
+          {"type": "done", **result}                                     the same dict run() returns
+        """
+        options = dict(top_k_retrieval=top_k_retrieval, top_k_rerank=top_k_rerank,
+                       search_params=search_params, alpha=alpha, rerank_budget_ms=rerank_budget_ms)
+        # The trace is activated per segment: a context variable set before a yield
+        # is not guaranteed to survive until the generator is resumed
+        trace = Trace()
+        start = time.perf_counter()
+        with start_trace(trace):
+            cached, cache_ctx = self._lookup_answer(query, options)
+            if cached is None:
+                prepared = self._prepare(query, options, cache_ctx)
+                if "result" in prepared:
+                    cached = self._store_answer(prepared["result"], cache_ctx)
+
+        # Cache hit or refusal: the answer is already complete
+        if cached is not None:
+            yield {"type": "context", "context": cached["context"], "retrieval_score": cached["retrieval_score"]}
+            yield {"type": "token", "content": cached["answer"]}
+            record("total", time.perf_counter() - start, trace)
+            yield {"type": "done", **cached, "timings": trace.timings}
+            return
+
+        yield {"type": "context", "context": prepared["reranked"], "retrieval_score": prepared["reranked"][0][1]}
+        llm_start = time.perf_counter()
+        parts = []
+        for delta in self.llm.stream(prepared["messages"]):
+            parts.append(delta)
+            yield {"type": "token", "content": delta}
+        record("llm", time.perf_counter() - llm_start, trace)
+        result = self._store_answer(self._result(query, "".join(parts), prepared), cache_ctx)
+        record("total", time.perf_counter() - start, trace)
+        yield {"type": "done", **result, "timings": trace.timings}
+
+    def _lookup_answer(self, query: str, options: dict):
+        """
+        Semantic answer cache: paraphrases of an answered question skip retrieval and the LLM.
+        Returns (cached result or None, context needed to store the fresh result later).
+        """
+        if self.answer_cache is None:
+            return None, None
+        query_embedding = self.embedder.embed_queries([query])[0]
+        cache_ctx = {
+            "query_embedding": query_embedding,
+            "index_version": self.index.index_version,
+            "params": (options["top_k_retrieval"], options["top_k_rerank"], options["alpha"],
+                       tuple(sorted((options["search_params"] or {}).items())), options["rerank_budget_ms"]),
+        }
+        with span("answer_cache_lookup"):
+            cached = self.answer_cache.lookup(query_embedding, cache_ctx["index_version"], cache_ctx["params"])
+        cache_event("answer", cached is not None)
+        if cached is not None:
+            return {**cached, "query": query, "cache_hit": True}, cache_ctx
+        return None, cache_ctx
+
+    def _store_answer(self, result: dict, cache_ctx: Optional[dict]) -> dict:
+        if cache_ctx is not None:
+            self.answer_cache.store(cache_ctx["query_embedding"], result, cache_ctx["index_version"], cache_ctx["params"])
+        return {**result, "cache_hit": False}
+
+    def _prepare(self, query: str, options: dict, cache_ctx: Optional[dict] = None) -> dict:
+        """
+        Retrieval, dedup, rerank and the confidence gate. Returns either
+        {"result": ...} for an early refusal, or the prompt messages plus the
+        reranked context for the generation step.
+        """
+        query_embedding = cache_ctx["query_embedding"] if cache_ctx else None
+        use_mmr = bool(self.mmr.get("enabled"))
+        if use_mmr and query_embedding is None:
+            # Embedded once here and handed to the retriever, which would otherwise embed the query itself
+            query_embedding = self.embedder.embed_queries([query])[0]
 
-    def run(self, query: str, top_k_retrieval: int = 20, top_k_rerank: int = 5):
         # 1. Retrieve
-        print(f"Retrieving for query: {query}")
-        t0 = time.time()
-        retrieved_docs = self.retriever.search(query, top_k=top_k_retrieval)
-        t1 = time.time()
-        print(f"⏱️ Retrieval took: {t1 - t0:.2f}s")
-        
-        # 2. Deduplicate
-        unique_docs = deduplicate_docs(retrieved_docs)
+        # (embed / bm25 / vector_search / fusion spans are recorded inside the retriever)
+        with span("retrieve"):
+            retrieved_rows, fused_scores = self.retriever.search_ids(query, top_k=options["top_k_retrieval"],
+                                                          alpha=options["alpha"],
+                                                          search_params=options["search_params"],
+                                                          query_embedding=query_embedding)
         
-        # 3. Rerank
-        # Reranker expects strings
-        # Reranker expects strings
-        doc_contents = [d if isinstance(d, str) else d['content'] for d in unique_docs]
-        
-        # OPTIMIZATION: Limit reranking to top 10 to reduce CPU latency
-        doc_contents = doc_contents[:10]
+        # 2. Deduplicate (near-duplicate clusters assigned at ingestion; exact content matches at least)
+        with span("dedup"):
+            unique_rows = deduplicate_ids(retrieved_rows, self.store.cluster_id)
+
+        # 2b. Diversify (optional): MMR over the stored chunk vectors, so fewer, less redundant candidates are reranked
+        if use_mmr:
+            with span("mmr"):
+                unique_rows = self._diversify(query_embedding, unique_rows)
         
-        t2 = time.time()
-        reranked = self.reranker.rerank(query, doc_contents, top_k=top_k_rerank)
-        t3 = time.time()
-        print(f"⏱️ Reranking took: {t3 - t2:.2f}s")
+        # 3. Rerank: cascade over all unique candidates in fused order, within the latency budget
+        with span("rerank"):
+            fused_by_row = dict(zip(retrieved_rows.tolist(), np.asarray(fused_scores).tolist()))
+            reranked_rows, scores, rerank_stats = self.cascade.rerank(
+                query, unique_rows, self.store, top_k=options["top_k_rerank"],
+                budget_ms=options["rerank_budget_ms"],
+                fused_scores=[fused_by_row[row] for row in unique_rows.tolist()])
+            reranked = list(zip(self.store.texts(reranked_rows), scores.tolist()))
+            reranked_rows = reranked_rows.tolist()
         
         # 4. Generate
         
@@ -62,51 +268,70 @@ class QueryPipeline:
         
         # reranked is list of (doc, score)
         if not reranked or reranked[0][1] < RETRIEVAL_SCORE_THRESHOLD:
-            return {
+            return {"result": {
                 "query": query,
                 "answer": "I do not have enough information in the provided documents to answer this question.",
                 "context": [],
+                "context_ids": [],
                 "retrieval_score": reranked[0][1] if reranked else -99.9,
                 "hallucination_score": 0.0,
-                "groundedness": 1.0
-            }
+                "groundedness": 1.0,
+                "rerank_stats": rerank_stats
+            }}
             
-        context_text = "\n\n".join([doc for doc, score in reranked])
-        
-        SYSTEM_PROMPT = """
-You are an enterprise-grade question answering system.
+        # Pack the context into the token budget (the system prompt is sent once, as the system message)
+        with span("pack"):
+            context_stats = None
+            passages = [doc for doc, score in reranked]
+            if self.packing.get("enabled", True):
+                passages, context_stats = pack_context(query, passages, self.tokenizer,
+                                                       max_tokens=self.packing.get("max_tokens", 1500),
+                                                       idf=self._term_idf,
+                                                       window_words=self.packing.get("window_words", 64))
+            context_text = "\n\n".join(passages)
 
-Rules:
-1. Answer strictly using ONLY the provided context.
-2. DO NOT use prior knowledge or assumptions.
-3. If the answer is not explicitly stated in the context, respond EXACTLY with:
-   "I do not have enough information in the provided documents to answer this question."
-4. Do not add explanations, guesses, or external facts.
-"""
-        
-        user_prompt = f"""
-{SYSTEM_PROMPT}
-
-Context:
+        user_prompt = f"""Context:
 {context_text}
 
 Question:
 {query}
 """
-        
         messages = [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_prompt}
         ]
-        
-        t4 = time.time()
-        answer = self.llm.chat(messages)
-        t5 = time.time()
-        print(f"⏱️ LLM Generation took: {t5 - t4:.2f}s")
-        
+        return {"messages": messages, "reranked": reranked, "reranked_rows": reranked_rows,
+                "rerank_stats": rerank_stats, "context_stats": context_stats}
+
+    def _term_idf(self, term: str) -> float:
+        """BM25 idf of a query term in the ingested corpus (0 for terms it has never seen)."""
+        bm25 = self.index.bm25
+        term_id = bm25.vocab.get(term)
+        return 0.0 if term_id is None else float(bm25.idf[term_id])
+
+    def _diversify(self, query_embedding: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """
+        Keeps mmr.top_k of the candidate rows, picked by maximal marginal
+        relevance, in pick order. Vectors come from the index, not the
+        embedder; rows are returned unchanged if they are unavailable.
+        """
+        if len(rows) <= 1:
+            return rows
+        vectors = self.index.vectors(rows)
+        if vectors is None:
+            return rows
+        order = maximal_marginal_relevance(query_embedding, vectors, lambda_mult=self.mmr.get("lambda", 0.7),
+                                           top_k=self.mmr.get("top_k") or len(rows))
+        return rows[np.asarray(order, dtype=np.int64)]
+
+    def _result(self, query: str, answer: str, prepared: dict) -> dict:
+        reranked = prepared["reranked"]
         return {
             "query": query,
             "answer": answer,
             "context": reranked,
-            "retrieval_score": reranked[0][1]
+            "context_ids": [self.store.chunk_id[row] for row in prepared["reranked_rows"]],
+            "retrieval_score": reranked[0][1],
+            "rerank_stats": prepared["rerank_stats"],
+            "context_stats": prepared["context_stats"]
         }
@@ -0,0 +1,116 @@
+import time
+from typing import Optional, Sequence
+import numpy as np
+from src.config import get_section
+from src.reranker.cross_encoder import Reranker
+
+class CascadeReranker:
+    """
+    Latency-budgeted rerank over the fused candidate list.
+
+    Candidates arrive ordered by the cheap fused retrieval score. They are sent
+    to the cross-encoder in growing batches (initial_batch, x growth, ...) from
+    the top of that order. Scoring stops when every candidate is scored, when
+    `patience` consecutive batches leave the top-k unchanged, or when the next
+    batch would not fit in the remaining time budget, estimated from the
+    per-pair cost measured so far. The first batch is always scored.
+
+    With `margin` set and the fused scores passed in, candidates are also
+    pruned on the cheap signal: fused scores are min-max normalized over the
+    candidate list, and an unscored candidate is dropped once its normalized
+    fused score is more than `margin` below that of every row currently in the
+    cross-encoder top-k; it is confidently placed below the cut and not worth a
+    pair.
+    """
+    def __init__(self, reranker: Reranker, budget_ms: Optional[float] = 300, initial_batch: int = 8,
+                 growth: float = 2.0, patience: int = 1, max_candidates: Optional[int] = None,
+                 margin: Optional[float] = None):
+        self.reranker = reranker
+        self.budget_ms = budget_ms
+        self.initial_batch = max(1, initial_batch)
+        self.growth = max(1.0, growth)
+        self.patience = max(1, patience)
+        self.max_candidates = max_candidates
+        self.margin = margin
+
+    @classmethod
+    def from_config(cls, reranker: Reranker) -> "CascadeReranker":
+        cfg = get_section("reranker").get("cascade") or {}
+        return cls(reranker, budget_ms=cfg.get("budget_ms", 300), initial_batch=cfg.get("initial_batch", 8),
+                   growth=cfg.get("growth", 2.0), patience=cfg.get("patience", 1),
+                   max_candidates=cfg.get("max_candidates"), margin=cfg.get("margin"))
+
+    def rerank(self, query: str, rows: Sequence[int], store, top_k: int, budget_ms: Optional[float] = None,
+               fused_scores: Optional[Sequence[float]] = None):
+        """
+        rows: deduplicated candidate rows, best fused score first.
+        budget_ms: per-request override of the configured budget (None = configured).
+        fused_scores: the rows' fused retrieval scores, for margin pruning (None = no pruning).
+        Returns (rows, scores, stats) for the top_k by cross-encoder score, best first.
+        stats: {"candidates", "pruned", "pairs_scored", "batches", "stop_reason", "elapsed_ms"}.
+        """
+        budget = self.budget_ms if budget_ms is None else budget_ms
+        rows = np.asarray(rows, dtype=np.int32)
+        if self.max_candidates is not None:
+            rows = rows[:self.max_candidates]
+        prior = None
+        if self.margin is not None and fused_scores is not None and len(rows):
+            prior = np.asarray(fused_scores, dtype=np.float32)[:len(rows)]
+            spread = float(prior.max() - prior.min())
+            prior = (prior - prior.min()) / spread if spread > 0 else np.ones_like(prior)
+
+        start = time.perf_counter()
+        scores = np.empty(len(rows), dtype=np.float32)
+        scored = 0
+        batches = 0
+        batch_size = self.initial_batch
+        unchanged = 0
+        pruned = 0
+        top = None
+        stop_reason = "exhausted"
+        while scored < len(rows):
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if batches and budget is not None:
+                per_pair_ms = elapsed_ms / scored
+                fits = int((budget - elapsed_ms) / per_pair_ms) if per_pair_ms > 0 else batch_size
+                if fits < 1:
+                    stop_reason = "budget"
+                    break
+                batch_size = min(batch_size, fits)
+
+            batch = rows[scored:scored + batch_size]
+            # Text is only materialized for rows sent to the cross-encoder; content
+            # hashes key the reranker's score cache (see Reranker.score)
+            scores[scored:scored + len(batch)] = self.reranker.score(
+                query, store.texts(batch), doc_ids=[int(store.content_hash[r]) for r in batch])
+            scored += len(batch)
+            batches += 1
+            batch_size = int(np.ceil(batch_size * self.growth))
+
+            new_top = set(np.argsort(-scores[:scored], kind="stable")[:top_k].tolist())
+            unchanged = unchanged + 1 if new_top == top else 0
+            top = new_top
+            if unchanged >= self.patience and scored < len(rows):
+                stop_reason = "stable"
+                break
+
+            if prior is not None and scored < len(rows) and len(top) >= top_k:
+                floor = float(prior[list(top)].min()) - self.margin
+                keep = np.concatenate([np.ones(scored, dtype=bool), prior[scored:] >= floor])
+                if not keep.all():
+                    rows, prior = rows[keep], prior[keep]
+                    scores = scores[:len(rows)]
+                    pruned += int((~keep).sum())
+
+        if stop_reason == "exhausted" and pruned:
+            stop_reason = "margin"
+        order = np.argsort(-scores[:scored], kind="stable")[:top_k]
+        stats = {
+            "candidates": int(len(rows)) + pruned,
+            "pruned": pruned,
+            "pairs_scored": int(scored),
+            "batches": batches,
+            "stop_reason": stop_reason,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+        return rows[order], scores[order], stats
@@ -1,15 +1,68 @@
-from sentence_transformers import CrossEncoder
+from typing import Optional
+import numpy as np
+from src.config import get_section
+from src.utils.cache import LRUCache, normalize_text, text_digest
+from src.utils.batching import MicroBatcher
+from src.inference.onnx_export import load_model
+from src.utils.tracing import RERANK_PAIRS, cache_event
 
 class Reranker:
-    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
-        self.model = CrossEncoder(model_name)
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", score_cache_size: Optional[int] = None,
+                 batching: Optional[dict] = None, backend: Optional[str] = None, quantization: Optional[str] = None):
+        from sentence_transformers import CrossEncoder  # deferred: heavy import
+        self.model_name = model_name
+        # torch or ONNX Runtime (optionally int8), per the inference config unless overridden
+        self.model = load_model(CrossEncoder, model_name, backend=backend, quantization=quantization)
+        cfg = get_section("reranker")
+        # Cross-encoder scores keyed by (model, normalized query hash, chunk id)
+        if score_cache_size is None:
+            cache_cfg = cfg.get("score_cache") or {}
+            score_cache_size = cache_cfg.get("max_entries", 50000) if cache_cfg.get("enabled") else 0
+        self.score_cache = LRUCache(max_entries=score_cache_size) if score_cache_size else None
+        # Pairs from concurrent requests share predict batches (reranker.batching in the config)
+        self.batcher = MicroBatcher.from_config(self.model.predict, batching if batching is not None else cfg.get("batching"),
+                                                name="reranker-batcher")
+
+    def _predict(self, query: str, docs: list[str]) -> list[float]:
+        pairs = [[query, doc] for doc in docs]
+        RERANK_PAIRS.inc(len(pairs))
+        if self.batcher is not None:
+            # Plain floats like the unbatched path (np.float32 breaks JSON serialization downstream)
+            return np.asarray(self.batcher.submit(pairs)).tolist()
+        return self.model.predict(pairs).tolist()
+
+    def score(self, query: str, docs: list[str], doc_ids: Optional[list] = None) -> list[float]:
+        """
+        Cross-encoder relevance score of each doc, in input order.
+        doc_ids: stable identifiers of the docs; when given (and the score cache is
+        enabled), only pairs not scored before are sent to the model.
+        """
+        if not docs:
+            return []
+        if self.score_cache is None or doc_ids is None:
+            return self._predict(query, docs)
+
+        query_key = f"{self.model_name}\x00{text_digest(normalize_text(query))}"
+        keys = [f"{query_key}\x00{doc_id}" for doc_id in doc_ids]
+        scores = [self.score_cache.get(key) for key in keys]
+        missing = [i for i, s in enumerate(scores) if s is None]
+        for s in scores:
+            cache_event("rerank_score", s is not None)
+        if missing:
+            fresh = self._predict(query, [docs[i] for i in missing])
+            for i, s in zip(missing, fresh):
+                self.score_cache.put(keys[i], s)
+                scores[i] = s
+        return scores
+
+    def cache_stats(self) -> dict:
+        return self.score_cache.stats() if self.score_cache is not None else {}
 
     def rerank(self, query: str, docs: list[str], top_k: int = 5):
         if not docs:
             return []
         
-        pairs = [[query, doc] for doc in docs]
-        scores = self.model.predict(pairs).tolist()
+        scores = self.score(query, docs)
         
         # Combine docs with scores
         doc_scores = list(zip(docs, scores))
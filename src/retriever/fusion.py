@@ -0,0 +1,61 @@
+from typing import List, Sequence, Tuple
+import numpy as np
+
+FUSION_METHODS = ("rrf", "minmax", "zscore")
+
+def _top_k(rows: np.ndarray, scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    return rows[order].astype(np.int32), scores[order].astype(np.float32)
+
+def _accumulate(rows: List[np.ndarray], contributions: List[np.ndarray], top_k: int):
+    """Sums per-backend contributions by row id (vectorized, no per-row dict)."""
+    if not rows or not sum(len(r) for r in rows):
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    all_rows = np.concatenate(rows)
+    unique_rows, inverse = np.unique(all_rows, return_inverse=True)
+    fused = np.bincount(inverse, weights=np.concatenate(contributions), minlength=len(unique_rows))
+    return _top_k(unique_rows, fused, top_k)
+
+def weighted_rrf(ranked_rows: Sequence[np.ndarray], weights: Sequence[float], top_k: int, k: int = 60):
+    """
+    Weighted Reciprocal Rank Fusion: score(d) = sum_i w_i / (k + rank_i(d)).
+    ranked_rows: one array of row ids per backend, best first.
+    """
+    rows, contributions = [], []
+    for backend_rows, weight in zip(ranked_rows, weights):
+        if weight <= 0 or not len(backend_rows):
+            continue
+        rows.append(np.asarray(backend_rows))
+        contributions.append(weight / (k + np.arange(len(backend_rows), dtype=np.float64)))
+    return _accumulate(rows, contributions, top_k)
+
+def _normalize(scores: np.ndarray, method: str) -> np.ndarray:
+    scores = np.asarray(scores, dtype=np.float64)
+    if method == "zscore":
+        std = scores.std()
+        return (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+    lo, hi = scores.min(), scores.max()
+    return (scores - lo) / (hi - lo) if hi > lo else np.ones_like(scores)
+
+def convex_combination(ranked_rows: Sequence[np.ndarray], ranked_scores: Sequence[np.ndarray],
+                       weights: Sequence[float], top_k: int, method: str = "minmax"):
+    """
+    score(d) = sum_i w_i * norm_i(s_i(d)), with per-backend min-max or z-score
+    normalization. Scores must be "higher is better"; a row missing from a
+    backend's candidates gets no contribution from it.
+    """
+    rows, contributions = [], []
+    for backend_rows, backend_scores, weight in zip(ranked_rows, ranked_scores, weights):
+        if weight <= 0 or not len(backend_rows):
+            continue
+        rows.append(np.asarray(backend_rows))
+        contributions.append(weight * _normalize(backend_scores, method))
+    return _accumulate(rows, contributions, top_k)
+
+def fuse(method: str, ranked_rows: Sequence[np.ndarray], ranked_scores: Sequence[np.ndarray],
+         weights: Sequence[float], top_k: int, rrf_k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    if method == "rrf":
+        return weighted_rrf(ranked_rows, weights, top_k, k=rrf_k)
+    if method in ("minmax", "zscore"):
+        return convex_combination(ranked_rows, ranked_scores, weights, top_k, method=method)
+    raise ValueError(f"Unknown fusion method '{method}'. Expected one of {FUSION_METHODS}")
@@ -1,126 +1,186 @@
-from typing import List, Tuple
+import os
+from typing import List, Optional, Tuple
 import numpy as np
 from src.indexer.bm25_index import BM25Index
 from src.indexer.faiss_index import FaissIndex
 from src.indexer.pinecone_index import PineconeIndex
+from src.indexer.chunk_store import load_chunk_store
+from src.indexer.storage import artifact_fingerprint
 from src.embeddings.embedder import Embedder
+from src.retriever.fusion import fuse
+from src.retriever.segments import LiveIndex
+from src.config import get_section
+from src.utils.startup import ComponentLoader
+from src.utils.tracing import in_context, span
 import concurrent.futures
 
+def _load_bm25(path: str) -> BM25Index:
+    bm25 = BM25Index()
+    bm25.load(path)
+    return bm25
+
+def _load_vector_index(faiss_path: str):
+    """FAISS or Pinecone per VECTOR_DB_TYPE, or None (BM25-only mode) if disabled or unavailable."""
+    vector_db_type = os.getenv("VECTOR_DB_TYPE", "faiss").lower()
+    if os.getenv("DISABLE_VECTOR_DB"):
+        print("Vector DB disabled via environment variable. Running in BM25-only mode.")
+        return None
+    try:
+        if vector_db_type == "pinecone":
+            vector_index = PineconeIndex.from_config(dimension=384)
+            print("Successfully connected to Pinecone.")
+        else:
+            vector_index = FaissIndex(dimension=384)
+            vector_index.load(faiss_path)  # Index type and its params come from the saved metadata
+            print("Successfully loaded FAISS index.")
+        return vector_index
+    except Exception as e:
+        print(f"WARNING: Could not load Vector index ({e}). Running in BM25-only mode.")
+        return None
+
+
 class HybridRetriever:
-    def __init__(self, bm25_path: str, faiss_path: str, doc_map_path: str, embedder: Embedder):
-        self.bm25 = BM25Index()
-        self.bm25.load(bm25_path)
-        
-        self.embedder = embedder
+    def __init__(self, bm25_path: str, faiss_path: str, chunk_store_path: str, embedder: Embedder,
+                 legacy_doc_map_path: str = None, loader: Optional[ComponentLoader] = None):
+        """
+        loader: shared ComponentLoader the artifacts are loaded through (see load_artifacts);
+        by default they still load concurrently, on a private one.
+        """
+        self.artifact_paths = [bm25_path, faiss_path, chunk_store_path]
         self.embedder = embedder
-        self.vector_index = None
-        import os
         self.vector_db_type = os.getenv("VECTOR_DB_TYPE", "faiss").lower()
-        if not os.getenv("DISABLE_VECTOR_DB"):
-            try:
-                if self.vector_db_type == "pinecone":
-                    self.vector_index = PineconeIndex(dimension=384)
-                    print("Successfully connected to Pinecone.")
-                else:
-                    self.vector_index = FaissIndex(dimension=384)
-                    self.vector_index.load(faiss_path)
-                    print("Successfully loaded FAISS index.")
-            except Exception as e:
-                print(f"WARNING: Could not load Vector index ({e}). Running in BM25-only mode.")
-        else:
-            print("Vector DB disabled via environment variable. Running in BM25-only mode.")
-
-        # Load doc map
-        # Load doc map
-        import pickle
-        import gzip
-        import os
-        
-        if doc_map_path.endswith(".gz") or (not os.path.exists(doc_map_path) and os.path.exists(doc_map_path + ".gz")):
-             real_path = doc_map_path if doc_map_path.endswith(".gz") else doc_map_path + ".gz"
-             print(f"Loading compressed doc_map from {real_path}")
-             with gzip.open(real_path, 'rb') as f:
-                 self.doc_map = pickle.load(f)
-        else:
-            with open(doc_map_path, 'rb') as f:
-                self.doc_map = pickle.load(f)
 
-    def search(self, query: str, top_k: int = 10, alpha: float = 0.5) -> List[dict]:
+        loader = loader or ComponentLoader()
+        self.load_artifacts(loader, bm25_path, faiss_path, chunk_store_path, legacy_doc_map_path)
+        bm25 = loader.get("bm25")
+        vector_index = loader.get("vector_index")
+        # Chunk text/metadata, addressed by int row id (memory-mapped, or built from a legacy doc_map pickle)
+        store = loader.get("chunk_store")
+
+        # Ingested indexes plus documents upserted/deleted at runtime, searched through snapshots
+        self.live = LiveIndex.from_config(
+            bm25, vector_index, store, embedder, vector_db_type=self.vector_db_type,
+            paths={"bm25": bm25_path, "faiss": faiss_path, "chunks": chunk_store_path},
+        )
+        # Stable ChunkStore-like view over the current snapshot (base rows and live segment rows)
+        self.store = self.live.store
+
+        # Fusion settings (configs/default.yaml -> retrieval)
+        cfg = get_section("retrieval")
+        self.config_weights = cfg.get("weights") or {}
+        self.fusion_method = cfg.get("fusion", "rrf")
+        self.rrf_k = cfg.get("rrf_k", 60)
+        self.candidate_depth = cfg.get("candidates") or {}
+        # Long-lived pool for the dense branch, so queries do not pay thread startup
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=cfg.get("workers", 4), thread_name_prefix="retriever"
+        )
+
+    @staticmethod
+    def load_artifacts(loader: ComponentLoader, bm25_path: str, faiss_path: str, chunk_store_path: str,
+                       legacy_doc_map_path: str = None):
+        """Starts loading the BM25 index, vector index and chunk store concurrently (no-op once started)."""
+        loader.start("bm25", _load_bm25, bm25_path)
+        loader.start("vector_index", _load_vector_index, faiss_path)
+        loader.start("chunk_store", load_chunk_store, chunk_store_path, legacy_doc_map_path)
+
+    @property
+    def bm25(self) -> BM25Index:
+        return self.live.snapshot.base.bm25
+
+    @property
+    def vector_index(self):
+        return self.live.snapshot.base.vector_index
+
+    @property
+    def index_version(self) -> str:
+        """Changes whenever the index artifacts are rewritten (re-ingestion, a live-index fold) or documents change at runtime."""
+        return f"{artifact_fingerprint(self.artifact_paths)}:{self.live.snapshot.version}"
+
+    def _weights(self, alpha: Optional[float]) -> Tuple[float, float]:
+        """(bm25 weight, dense weight). alpha overrides the configured retrieval.weights."""
+        if alpha is None:
+            bm25_w, dense_w = self.config_weights.get("bm25", 0.5), self.config_weights.get("dense", 0.5)
+            total = bm25_w + dense_w
+            alpha = dense_w / total if total > 0 else 0.5
+        alpha = min(max(float(alpha), 0.0), 1.0)
+        return 1.0 - alpha, alpha
+
+    def search_ids(self, query: str, top_k: int = 10, alpha: Optional[float] = None,
+                   search_params: dict = None, query_embedding: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
         """
         Hybrid search using BM25 and Dense embeddings.
-        alpha: weight for dense score (0 = pure BM25, 1 = pure Dense)
+        alpha: weight for dense score (0 = pure BM25, 1 = pure Dense); None uses retrieval.weights
+        search_params: query-time ANN knobs for FAISS ({"ef_search": ..} / {"nprobe": ..})
+        query_embedding: precomputed query vector, to avoid embedding the query twice
+        Returns (row ids into self.store, fused scores), best first.
         """
-        # 1. BM25 Search
-        # We need to normalize scores to combine them properly, usually RRF is safer if scores are not calibrated
-        # For simplicity here, we get top N and use RRF
-        
-        top_n = top_k * 2
-        scores = {}
+        query_embeddings = None if query_embedding is None else np.asarray(query_embedding).reshape(1, -1)
+        return self.search_batch([query], top_k=top_k, alpha=alpha, search_params=search_params,
+                                 query_embeddings=query_embeddings)[0]
+
+    def search_batch(self, queries: List[str], top_k: int = 10, alpha: Optional[float] = None,
+                     search_params: dict = None, bm25_depth: Optional[int] = None,
+                     dense_depth: Optional[int] = None,
+                     query_embeddings: np.ndarray = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Batched search_ids: all queries are embedded in one forward pass, FAISS is
+        searched with the whole query matrix, BM25 shares posting-list reads across
+        queries, and results are fused per query.
+        bm25_depth / dense_depth: candidates pulled from each backend before fusion
+        (default: retrieval.candidates from the config, else 2 x top_k).
+        """
+        bm25_weight, dense_weight = self._weights(alpha)
+        bm25_depth = bm25_depth or self.candidate_depth.get("bm25") or top_k * 2
+        dense_depth = dense_depth or self.candidate_depth.get("dense") or top_k * 2
+        empty = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+        # One snapshot for the whole batch: upserts, deletes and merges published meanwhile are not seen
+        snapshot = self.live.snapshot
 
         def run_bm25():
             try:
-                return self.bm25.search(query, top_k=top_n)
+                with span("bm25"):
+                    return snapshot.bm25_search_batch(queries, top_k=bm25_depth)
             except Exception as e:
                 print(f"BM25 Error: {e}")
-                return [], []
+                return [empty for _ in queries]
 
         def run_vector():
-            if self.vector_index:
-                try:
-                    query_emb = self.embedder.embed([query])
-                    return self.vector_index.search(query_emb, top_k=top_n)
-                except Exception as e:
-                    print(f"Vector Search Error: {e}")
-                    return None, None
-            return None, None
-
-        # Execute in parallel
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future_bm25 = executor.submit(run_bm25)
-            future_vector = executor.submit(run_vector)
-            
-            bm25_docs, bm25_scores = future_bm25.result()
-            dense_dists, dense_ids = future_vector.result()
-
-        # Process BM25
-        for rank, doc in enumerate(bm25_docs):
-            key = doc
-            scores[key] = scores.get(key, 0) + (1 / (60 + rank))
-
-        # Process Dense
-        if dense_ids:
             try:
-                # Merge using Reciprocal Rank Fusion (RRF)
-                if self.vector_db_type == "pinecone":
-                    # For Pinecone, dense_ids are unique chunk IDs (uuid), we need to map them to content/doc if possible
-                    # or just trust the search result if metadata is rich.
-                    # Since we keyed scores by content string for RRF, we need content.
-                    # PineconeIndex.search returns matches with metadata inside (we need to update interface or return structure)
-                    # Actually, our wrapper PineconeIndex.search returns (scores, ids).
-                    # But ids in Pinecone are STRINGS. In local FAISS, dense_indices are INTEGERS (indexes into doc_map).
-                    
-                    # We need a way to look up content from ID.
-                    # Doc map has ID now!
-                    id_to_content = {d.get("id"): d["content"] for d in self.doc_map if "id" in d} # Optimization: Precompute in init?
-                    
-                    for rank, doc_id in enumerate(dense_ids[0]):
-                         content = id_to_content.get(doc_id)
-                         if content:
-                             key = content
-                             scores[key] = scores.get(key, 0) + (1 / (60 + rank))
-                             
-                else:
-                    # Legacy FAISS (indices are ints)
-                    for rank, idx in enumerate(dense_ids[0]):
-                        if idx == -1: continue
-                        doc_data = self.doc_map[idx]
-                        key = doc_data['content']
-                        scores[key] = scores.get(key, 0) + (1 / (60 + rank))
-                        
+                query_emb = query_embeddings if query_embeddings is not None else self.embedder.embed_queries(queries)
+                with span("vector_search"):
+                    return snapshot.dense_search(query_emb, top_k=dense_depth, params=search_params)
             except Exception as e:
-                print(f"Error during dense search: {e}")
-            
-        # Sort by RRF score
-        sorted_docs = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        
-        return [doc for doc, score in sorted_docs[:top_k]]
+                print(f"Vector Search Error: {e}")
+                return None
+
+        # Skip a backend entirely when fusion would give it zero weight
+        future_vector = None
+        if snapshot.base.vector_index is not None and dense_weight > 0:
+            future_vector = self._executor.submit(in_context(run_vector))
+        bm25_results = run_bm25() if bm25_weight > 0 else [empty for _ in queries]
+        dense_results = future_vector.result() if future_vector else None
+
+        results = []
+        with span("fusion"):
+            for qi, bm25_hits in enumerate(bm25_results):
+                dense_hits = dense_results[qi] if dense_results is not None else empty
+                results.append(fuse(
+                    self.fusion_method,
+                    ranked_rows=(bm25_hits[0], dense_hits[0]),
+                    ranked_scores=(bm25_hits[1], dense_hits[1]),
+                    weights=(bm25_weight, dense_weight),
+                    top_k=top_k,
+                    rrf_k=self.rrf_k,
+                ))
+        return results
+
+    def vectors(self, rows) -> Optional[np.ndarray]:
+        """Stored embeddings of result rows (e.g. for MMR), or None if the vector index cannot provide them."""
+        return self.live.snapshot.vectors(rows)
+
+    def search(self, query: str, top_k: int = 10, alpha: Optional[float] = None,
+               search_params: dict = None) -> List[str]:
+        """Same as search_ids, but materializes the chunk text of the results."""
+        rows, _ = self.search_ids(query, top_k=top_k, alpha=alpha, search_params=search_params)
+        return self.store.texts(rows)
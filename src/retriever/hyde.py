@@ -4,6 +4,7 @@ class HyDERetriever:
     def __init__(self, llm_client: LLMClient, base_retriever):
         self.llm = llm_client
         self.retriever = base_retriever
+        self.store = base_retriever.store
 
     def generate_hypothetical_doc(self, query: str) -> str:
         messages = [
@@ -12,10 +13,16 @@ class HyDERetriever:
         ]
         return self.llm.chat(messages, temperature=0.7)
 
-    def search(self, query: str, top_k: int = 10):
+    def search_ids(self, query: str, top_k: int = 10, alpha: float = None, search_params: dict = None,
+                   query_embedding=None):
+        # query_embedding belongs to the user query, not the hypothetical doc, so it is not reused here
         # 1. Generate hypothetical doc
         hypothetical_doc = self.generate_hypothetical_doc(query)
         print(f"DEBUG: HyDE Doc: {hypothetical_doc[:100]}...")
         
         # 2. Retrieve using the hypothetical doc as query
-        return self.retriever.search(hypothetical_doc, top_k=top_k)
+        return self.retriever.search_ids(hypothetical_doc, top_k=top_k, alpha=alpha, search_params=search_params)
+
+    def search(self, query: str, top_k: int = 10, alpha: float = None, search_params: dict = None):
+        rows, _ = self.search_ids(query, top_k=top_k, alpha=alpha, search_params=search_params)
+        return self.store.texts(rows)
@@ -0,0 +1,675 @@
+import copy
+import os
+import threading
+import uuid
+from typing import Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from src.config import get_section
+from src.indexer.bm25_index import BM25Index
+from src.indexer.chunk_store import ChunkStore, hash_key
+from src.indexer.near_dup import MinHasher
+from src.indexer.pinecone_index import MAX_TOP_K as PINECONE_MAX_TOP_K
+from src.indexer import storage
+from src.indexer.storage import artifact_fingerprint
+from src.ingestion.chunkers import SlidingWindowChunker
+from src.ingestion.cleaner import clean_text
+from src.ingestion.manifest import MANIFEST_FILE, Manifest
+from src.ingestion.shards import RecordStream
+
+_TOMBSTONE = {"content": "", "source": "", "id": ""}
+_EMPTY = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+
+
+def _merge_hits(parts: List[Tuple[np.ndarray, np.ndarray]], deleted: np.ndarray, top_k: int):
+    """Best top_k (rows, scores) over several segments' hits, without deleted rows."""
+    parts = [p for p in parts if len(p[0])]
+    if not parts:
+        return _EMPTY
+    rows = np.concatenate([p[0] for p in parts]).astype(np.int64)
+    scores = np.concatenate([p[1] for p in parts]).astype(np.float32)
+    if len(deleted):
+        live = ~np.isin(rows, deleted)
+        rows, scores = rows[live], scores[live]
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    return rows[order].astype(np.int32), scores[order]
+
+
+class BaseSegment:
+    """The ingested indexes (BM25, vector index, chunk store), rows 0 .. len(store) - 1."""
+    def __init__(self, bm25: BM25Index, vector_index, store: ChunkStore):
+        self.bm25 = bm25
+        self.vector_index = vector_index
+        self.store = store
+
+
+class Segment:
+    """
+    Chunks upserted at runtime, searchable as soon as the segment is published:
+    a small BM25 index plus the chunk embeddings (searched brute force).
+    Rows are global row ids in ascending order, all above the base and every
+    older segment.
+    """
+    def __init__(self, rows: np.ndarray, records: List[dict], embeddings: Optional[np.ndarray]):
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.records = records
+        self.embeddings = None if embeddings is None else np.ascontiguousarray(embeddings, dtype=np.float32)
+        self._sq_norms = None if embeddings is None else (self.embeddings ** 2).sum(axis=1)
+        self.content_hash = np.fromiter((hash_key(r["content"]) for r in records), dtype=np.uint64,
+                                        count=len(records))
+        self.cluster_id = np.fromiter((r.get("cluster_id", h) for r, h in zip(records, self.content_hash.tolist())),
+                                      dtype=np.uint64, count=len(records))
+        self.bm25 = BM25Index()
+        self.bm25.build(r["content"] for r in records)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    def merge(cls, segments: Sequence["Segment"], deleted: np.ndarray) -> Optional["Segment"]:
+        """One segment holding the live chunks of `segments` (deleted rows dropped), or None if none is left."""
+        rows = np.concatenate([s.rows for s in segments])
+        keep = ~np.isin(rows, deleted)
+        if not keep.any():
+            return None
+        records = [r for s in segments for r in s.records]
+        embeddings = None
+        if all(s.embeddings is not None for s in segments):
+            embeddings = np.concatenate([s.embeddings for s in segments])[keep]
+        return cls(rows[keep], [r for r, k in zip(records, keep) if k], embeddings)
+
+    def position(self, row: int) -> int:
+        """Index of a row within this segment, or -1."""
+        pos = int(np.searchsorted(self.rows, row))
+        return pos if pos < len(self.rows) and self.rows[pos] == row else -1
+
+    def deleted_positions(self, deleted: np.ndarray) -> np.ndarray:
+        """Positions within this segment of the given deleted rows."""
+        return np.flatnonzero(np.isin(self.rows, deleted))
+
+    def bm25_search_batch(self, bm25: BM25Index, queries: List[str], top_k: int, exclude: Optional[np.ndarray] = None):
+        """
+        bm25: this segment's index, or a view of it scoring with corpus-wide statistics.
+        exclude: positions (see deleted_positions) left out of the results.
+        """
+        return [(self.rows[hits].astype(np.int32), scores)
+                for hits, scores in bm25.search_batch(queries, top_k=top_k, exclude=exclude)]
+
+    def dense_search(self, query_emb: np.ndarray, top_k: int, metric: str = "l2",
+                     exclude: Optional[np.ndarray] = None):
+        """
+        (rows, similarities) per query: -squared L2 distance like FAISS, or cosine like Pinecone.
+        exclude: positions (see deleted_positions) left out of the results.
+        """
+        if self.embeddings is None or len(self.rows) <= (0 if exclude is None else len(exclude)):
+            return [_EMPTY for _ in range(len(query_emb))]
+        query_emb = np.asarray(query_emb, dtype=np.float32)
+        dots = query_emb @ self.embeddings.T
+        if metric == "cosine":
+            norms = np.sqrt(self._sq_norms)[None, :] * np.linalg.norm(query_emb, axis=1)[:, None]
+            sims = dots / np.maximum(norms, 1e-12)
+        else:
+            sims = 2 * dots - self._sq_norms[None, :] - (query_emb ** 2).sum(axis=1)[:, None]
+        live = len(self.rows)
+        if exclude is not None and len(exclude):
+            sims[:, exclude] = -np.inf
+            live -= len(exclude)
+        top_k = min(top_k, live)
+        top = np.argpartition(-sims, top_k - 1, axis=1)[:, :top_k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        return [(self.rows[t].astype(np.int32), s.astype(np.float32))
+                for t, s in zip(top, np.take_along_axis(top_sims, order, axis=1))]
+
+
+class Snapshot:
+    """
+    Immutable state searched by readers: the base, the live segments, and the
+    rows deleted since they were last folded into the base (filtered out of
+    every result). Writers publish a new snapshot instead of modifying one,
+    so a search that holds a snapshot sees the same index throughout.
+    """
+    def __init__(self, base: BaseSegment, segments: Tuple[Segment, ...], deleted: np.ndarray, version: int,
+                 vector_db_type: str = "faiss"):
+        self.base = base
+        self.segments = tuple(segments)
+        self.deleted = np.asarray(deleted, dtype=np.int64)
+        self.version = version
+        self.vector_db_type = vector_db_type
+        self.base_len = len(base.store)
+        self.num_rows = int(self.segments[-1].rows[-1]) + 1 if self.segments else self.base_len
+        self._starts = np.fromiter((s.rows[0] for s in self.segments), dtype=np.int64, count=len(self.segments))
+        self._bm25_views = self._corpus_bm25_views()
+        # Deleted rows per part (base rows, then positions within each segment), filtered inside every search
+        self._base_deleted = self.deleted[self.deleted < self.base_len]
+        self._segment_deleted = [s.deleted_positions(self.deleted) for s in self.segments]
+
+    def _corpus_bm25_views(self) -> List[BM25Index]:
+        """
+        BM25 views of the base and of each segment that all score with the
+        statistics of the union (N, avgdl, df), so that their scores rank
+        together exactly as one index over every chunk would.
+        """
+        base = self.base.bm25
+        if not self.segments:
+            return [base]
+        indexes = [base] + [s.bm25 for s in self.segments]
+        stats = [index.term_stats() for index in indexes]
+        n_docs = sum(s[0] for s in stats)
+        avgdl = sum(s[1] for s in stats) / n_docs if n_docs else 0.0
+
+        base_df = stats[0][2].copy()
+        extra = {}  # summed df of terms the base has never seen
+        for index, (_, _, df) in zip(indexes[1:], stats[1:]):
+            for term, term_id in index.vocab.items():
+                base_id = base.vocab.get(term)
+                if base_id is None:
+                    extra[term] = extra.get(term, 0.0) + df[term_id]
+                else:
+                    base_df[base_id] += df[term_id]
+
+        all_df = np.concatenate([base_df, np.fromiter(extra.values(), dtype=np.float64, count=len(extra))])
+        mean_idf = float((np.log(n_docs - all_df + 0.5) - np.log(all_df + 0.5)).mean()) if len(all_df) else 0.0
+
+        views = [base.with_corpus_stats(n_docs, avgdl, base_df, mean_idf=mean_idf)]
+        for index in indexes[1:]:
+            df = np.zeros(len(index.vocab), dtype=np.float64)
+            for term, term_id in index.vocab.items():
+                base_id = base.vocab.get(term)
+                df[term_id] = extra[term] if base_id is None else base_df[base_id]
+            views.append(index.with_corpus_stats(n_docs, avgdl, df, mean_idf=mean_idf))
+        return views
+
+    def bm25_search_batch(self, queries: List[str], top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        per_segment = [self._bm25_views[0].search_batch(queries, top_k=top_k, exclude=self._base_deleted)]
+        for segment, view, exclude in zip(self.segments, self._bm25_views[1:], self._segment_deleted):
+            per_segment.append(segment.bm25_search_batch(view, queries, top_k, exclude=exclude))
+        return [_merge_hits([hits[qi] for hits in per_segment], self.deleted, top_k) for qi in range(len(queries))]
+
+    def dense_search(self, query_emb: np.ndarray, top_k: int, params: dict = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """(rows, similarities) per query, best first; params are FAISS query knobs (ignored by Pinecone)."""
+        query_emb = np.asarray(query_emb, dtype=np.float32)
+        vector_index = self.base.vector_index
+        per_segment = []
+        if self.vector_db_type == "pinecone":
+            # Pinecone cannot filter rows: over-fetch past the deleted base rows, within its top_k limit
+            # (LiveIndex folds before the deletes outgrow it)
+            depth = min(top_k + len(self._base_deleted), PINECONE_MAX_TOP_K)
+            # Pinecone returns chunk id strings (cosine scores); map them through the id -> row table
+            scores, ids = vector_index.search(query_emb, top_k=depth)
+            base_hits = [(self.base.store.rows_for_ids(ids[qi]),
+                          np.asarray(scores[qi][:len(ids[qi])], dtype=np.float32))
+                         for qi in range(len(query_emb))]
+            metric = "cosine"
+        else:
+            # FAISS positions are row ids; L2 distances become similarities
+            distances, ids = vector_index.search(query_emb, top_k=top_k, params=params, exclude=self._base_deleted)
+            base_hits = [(np.asarray(ids[qi], dtype=np.int32), -np.asarray(distances[qi], dtype=np.float32))
+                         for qi in range(len(query_emb))]
+            metric = "l2"
+        per_segment.append([(rows[rows >= 0], sims[rows >= 0]) for rows, sims in base_hits])
+        for segment, exclude in zip(self.segments, self._segment_deleted):
+            per_segment.append(segment.dense_search(query_emb, top_k, metric=metric, exclude=exclude))
+        return [_merge_hits([hits[qi] for hits in per_segment], self.deleted, top_k) for qi in range(len(query_emb))]
+
+    def vectors(self, rows: Iterable[int]) -> Optional[np.ndarray]:
+        """
+        Stored embeddings of the given rows (len(rows) x dimension), read back
+        from the vector index (base rows) and the segments (upserted rows)
+        rather than re-embedded. None when any of them is unavailable: no
+        vector index, a row deleted meanwhile, or an index that cannot
+        return vectors.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        vector_index = self.base.vector_index
+        if vector_index is None:
+            return None
+        in_base = rows < self.base_len
+        try:
+            base_rows = rows[in_base]
+            if self.vector_db_type == "pinecone":
+                base_vectors = vector_index.fetch([self.base.store.chunk_id[int(r)] for r in base_rows])
+            else:
+                base_vectors = vector_index.reconstruct(base_rows)
+        except Exception as e:
+            print(f"WARNING: Could not read stored vectors ({e}).")
+            return None
+        matrix = np.zeros((len(rows), base_vectors.shape[1]), dtype=np.float32)
+        matrix[in_base] = base_vectors
+        for i in np.flatnonzero(~in_base):
+            segment, pos = self._locate(int(rows[i]))
+            if segment is None or segment.embeddings is None:
+                return None
+            matrix[i] = segment.embeddings[pos]
+        return matrix
+
+    def _locate(self, row: int) -> Tuple[Optional[Segment], int]:
+        """(segment, position) of a row above the base; (None, -1) if it no longer exists."""
+        index = int(np.searchsorted(self._starts, row, side="right")) - 1
+        if index < 0:
+            return None, -1
+        segment = self.segments[index]
+        pos = segment.position(row)
+        return (segment, pos) if pos >= 0 else (None, -1)
+
+    def record(self, row: int) -> dict:
+        row = int(row)
+        if row < self.base_len:
+            return self.base.store.record(row)
+        segment, pos = self._locate(row)
+        return _TOMBSTONE if segment is None else segment.records[pos]
+
+    def texts(self, rows: Iterable[int]) -> List[str]:
+        rows = [int(r) for r in rows]
+        if all(r < self.base_len for r in rows):
+            return self.base.store.texts(rows)
+        return [self.record(r)["content"] for r in rows]
+
+    def content_hash(self, row: int) -> int:
+        if row < self.base_len:
+            return int(self.base.store.content_hash[row])
+        segment, pos = self._locate(row)
+        return hash_key("") if segment is None else int(segment.content_hash[pos])
+
+    def cluster_id(self, row: int) -> int:
+        if row < self.base_len:
+            return int(self.base.store.cluster_id[row])
+        segment, pos = self._locate(row)
+        return hash_key("") if segment is None else int(segment.cluster_id[pos])
+
+    def row_for_id(self, chunk_id: str) -> int:
+        row = self.base.store.row_for_id(chunk_id)
+        if row >= 0:
+            return row
+        for segment in self.segments:
+            for pos, record in enumerate(segment.records):
+                if record["id"] == chunk_id:
+                    return int(segment.rows[pos])
+        return -1
+
+
+class _SnapshotColumn:
+    """Column of the current snapshot indexed by row (int -> value, array of rows -> array)."""
+    def __init__(self, live: "LiveIndex", value, dtype):
+        self._live = live
+        self._value = value
+        self._dtype = dtype
+
+    def __getitem__(self, rows):
+        snapshot = self._live.snapshot
+        if np.ndim(rows) == 0:
+            return self._value(snapshot, int(rows))
+        return np.array([self._value(snapshot, int(r)) for r in np.asarray(rows).tolist()], dtype=self._dtype)
+
+
+class LiveStore:
+    """
+    ChunkStore-compatible view (texts, record, content_hash, cluster_id, chunk_id, ...)
+    that reads through the current snapshot, so rows of live segments
+    resolve as well as base rows. Consumers can hold on to it across merges.
+    """
+    def __init__(self, live: "LiveIndex"):
+        self._live = live
+        self.content_hash = _SnapshotColumn(live, Snapshot.content_hash, np.uint64)
+        self.cluster_id = _SnapshotColumn(live, Snapshot.cluster_id, np.uint64)
+        self.chunk_id = _SnapshotColumn(live, lambda snapshot, row: snapshot.record(row)["id"], object)
+        self.source = _SnapshotColumn(live, lambda snapshot, row: snapshot.record(row)["source"], object)
+
+    def __len__(self) -> int:
+        return self._live.snapshot.num_rows
+
+    def texts(self, rows: Iterable[int]) -> List[str]:
+        return self._live.snapshot.texts(rows)
+
+    def record(self, row: int) -> dict:
+        return self._live.snapshot.record(row)
+
+    def row_for_id(self, chunk_id: str) -> int:
+        return self._live.snapshot.row_for_id(chunk_id)
+
+    def rows_for_ids(self, chunk_ids: Iterable[str]) -> np.ndarray:
+        snapshot = self._live.snapshot
+        return np.fromiter((snapshot.row_for_id(i) for i in chunk_ids), dtype=np.int32)
+
+
+class LiveIndex:
+    """
+    Runtime document upserts and deletes on top of the ingested indexes.
+
+    An upsert chunks, embeds and near-dup clusters the documents like
+    ingestion does and publishes them as a new in-memory segment; a delete tombstones the rows
+    of the documents. Both publish a new Snapshot, so documents are searchable
+    (or gone) as soon as the call returns, without touching the base.
+
+    A background thread keeps the number of segments bounded: past
+    `max_segments` it compacts the live segments into one, and once they hold
+    `fold_chunks` chunks (or `fold_deletes` rows are deleted) it folds them into
+    copies of the base indexes, applies the tombstones there and publishes the
+    result. Merges build new objects and never touch a published snapshot.
+
+    With `persist` set, a fold also replaces the ingested artifacts (and the
+    ingestion manifest) as one generation, like ingestion does, but only if
+    they are still the ones this process loaded: once ingestion or another
+    worker has rewritten them, folds stay in memory.
+    """
+    def __init__(self, bm25: BM25Index, vector_index, store: ChunkStore, embedder, vector_db_type: str = "faiss",
+                 paths: Optional[dict] = None, max_segments: int = 8, fold_chunks: int = 10000,
+                 fold_deletes: int = 10000, merge_interval_seconds: float = 2.0, persist: bool = False):
+        """
+        paths: {"bm25", "faiss", "chunks"} artifact paths the base was loaded
+        from, all in one index directory (the one the folded base is written back to).
+        """
+        self.embedder = embedder
+        self.vector_db_type = vector_db_type
+        self.paths = paths
+        self.max_segments = max_segments
+        self.fold_chunks = fold_chunks
+        self.fold_deletes = fold_deletes
+        self.merge_interval = merge_interval_seconds
+        self.persist = persist and paths is not None
+        # Version stamp of the artifacts the base was loaded from; a fold only persists over that generation
+        self._fingerprint = artifact_fingerprint(self._artifact_paths()) if self.persist else None
+        ingestion_cfg = get_section("ingestion")
+        self.chunker = SlidingWindowChunker(ingestion_cfg.get("chunk_size", 512), ingestion_cfg.get("chunk_overlap", 50))
+        # Upserted chunks join the ingested near-dup clusters (only when the store was built with clustering)
+        self.minhasher = MinHasher.from_config() if store.near_dup is not None else None
+        self.near_dup = store.near_dup.copy() if self.minhasher is not None else None
+
+        self.snapshot = Snapshot(BaseSegment(bm25, vector_index, store), (), np.zeros(0, dtype=np.int64), 0,
+                                 vector_db_type=vector_db_type)
+        self.store = LiveStore(self)
+        self._next_row = self.snapshot.num_rows
+        self._doc_rows = None
+        # Writers publish under _write_lock; merges run one at a time under _merge_lock
+        self._write_lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._merger = None
+        self.merges = {"compactions": 0, "folds": 0}
+
+    @classmethod
+    def from_config(cls, bm25: BM25Index, vector_index, store: ChunkStore, embedder, vector_db_type: str = "faiss",
+                    paths: Optional[dict] = None) -> "LiveIndex":
+        """Merge policy from the `live_index` section of the config."""
+        cfg = get_section("live_index")
+        fold_deletes = cfg.get("fold_deletes", 10000)
+        if vector_db_type == "pinecone":
+            # Dense search over-fetches past deleted base rows within Pinecone's top_k limit; fold before
+            # the deletes leave less headroom than the dense candidate depth
+            retrieval = get_section("retrieval")
+            depth = (retrieval.get("candidates") or {}).get("dense") or 2 * retrieval.get("top_k_retrieval", 20)
+            fold_deletes = min(fold_deletes, max(1, PINECONE_MAX_TOP_K - depth))
+        return cls(bm25, vector_index, store, embedder, vector_db_type=vector_db_type, paths=paths,
+                   max_segments=cfg.get("max_segments", 8), fold_chunks=cfg.get("fold_chunks", 10000),
+                   fold_deletes=fold_deletes,
+                   merge_interval_seconds=cfg.get("merge_interval_seconds", 2.0),
+                   persist=cfg.get("persist", False))
+
+    def _publish(self, base: BaseSegment, segments, deleted: np.ndarray):
+        """Swaps in a new snapshot (caller holds _write_lock); readers pick it up on their next search."""
+        self.snapshot = Snapshot(base, tuple(segments), deleted, self.snapshot.version + 1,
+                                 vector_db_type=self.vector_db_type)
+
+    def _rows_by_document(self) -> dict:
+        """Document id (record source) -> rows; built from the base store on the first write."""
+        if self._doc_rows is None:
+            doc_rows = {}
+            for row, source in enumerate(self.snapshot.base.store.source):
+                if source:
+                    doc_rows.setdefault(source, []).append(row)
+            self._doc_rows = doc_rows
+        return self._doc_rows
+
+    def _chunk(self, documents: List[dict]) -> List[Tuple[str, List[dict]]]:
+        prepared = []
+        for doc in documents:
+            doc_id = str(doc["id"])
+            records = []
+            for chunk in self.chunker.chunk(clean_text(doc["text"])):
+                # Same stable id scheme as ingestion, with the document id in place of the file path
+                chunk_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, doc_id + chunk[:50]))
+                records.append({"source": doc_id, "content": chunk, "id": chunk_id})
+            prepared.append((doc_id, records))
+        return prepared
+
+    def upsert(self, documents: List[dict]) -> dict:
+        """
+        Adds or replaces documents ({"id", "text"}); the chunks of a replaced
+        document are deleted. Returns counts and the published snapshot version.
+        """
+        prepared = self._chunk(documents)
+        records = [r for _, doc_records in prepared for r in doc_records]
+        # The model runs outside the write lock; only the publish is serialized
+        embeddings = None
+        if self.snapshot.base.vector_index is not None and records:
+            embeddings = np.asarray(self.embedder.embed([r["content"] for r in records]), dtype=np.float32)
+        band_keys = None
+        if self.minhasher is not None and records:
+            band_keys = np.vstack([self.minhasher.band_keys(r["content"]) for r in records])
+
+        with self._write_lock:
+            if band_keys is not None:
+                # Assigned in publish order, so clusters match what re-ingesting the rows in order would give
+                content_hash = np.fromiter((hash_key(r["content"]) for r in records), dtype=np.uint64,
+                                           count=len(records))
+                for record, cluster in zip(records, self.near_dup.assign(band_keys, content_hash).tolist()):
+                    record["cluster_id"] = cluster
+            doc_rows = self._rows_by_document()
+            replaced = [row for doc_id, _ in prepared for row in doc_rows.pop(doc_id, [])]
+            rows = np.arange(self._next_row, self._next_row + len(records), dtype=np.int64)
+            self._next_row += len(records)
+            offset = 0
+            for doc_id, doc_records in prepared:
+                doc_rows[doc_id] = rows[offset:offset + len(doc_records)].tolist()
+                offset += len(doc_records)
+
+            snapshot = self.snapshot
+            segments = snapshot.segments + ((Segment(rows, records, embeddings),) if records else ())
+            deleted = np.union1d(snapshot.deleted, np.asarray(replaced, dtype=np.int64))
+            self._publish(snapshot.base, segments, deleted)
+            version = self.snapshot.version
+        self._start_merger()
+        return {"documents": len(prepared), "chunks": len(records), "replaced_chunks": len(replaced),
+                "version": version}
+
+    def delete(self, doc_ids: Iterable[str]) -> dict:
+        """Tombstones every chunk of the given documents; unknown ids are reported, not an error."""
+        with self._write_lock:
+            doc_rows = self._rows_by_document()
+            rows, missing = [], []
+            for doc_id in doc_ids:
+                doc_id = str(doc_id)
+                if doc_id in doc_rows:
+                    rows.extend(doc_rows.pop(doc_id))
+                else:
+                    missing.append(doc_id)
+            snapshot = self.snapshot
+            if rows:
+                self._publish(snapshot.base, snapshot.segments,
+                              np.union1d(snapshot.deleted, np.asarray(rows, dtype=np.int64)))
+            version = self.snapshot.version
+        if rows:
+            self._start_merger()
+        return {"deleted_chunks": len(rows), "missing": missing, "version": version}
+
+    def compact(self) -> bool:
+        """Merges the live segments into one, dropping their deleted rows. Returns whether it ran."""
+        with self._merge_lock:
+            snapshot = self.snapshot
+            segments = snapshot.segments
+            if len(segments) < 2:
+                return False
+            merged = Segment.merge(segments, snapshot.deleted)
+            dropped = np.intersect1d(snapshot.deleted, np.concatenate([s.rows for s in segments]))
+            with self._write_lock:
+                current = self.snapshot
+                # Only writers append segments, so the ones published meanwhile follow the merged prefix
+                rest = current.segments[len(segments):]
+                self._publish(current.base, ((merged,) if merged is not None else ()) + rest,
+                              np.setdiff1d(current.deleted, dropped))
+            self.merges["compactions"] += 1
+            return True
+
+    def fold(self) -> bool:
+        """
+        Folds the live segments and the deleted rows into the base. Returns
+        whether there was anything to fold.
+        """
+        with self._merge_lock:
+            snapshot = self.snapshot
+            segments, deleted, base = snapshot.segments, snapshot.deleted, snapshot.base
+            if not segments and not len(deleted):
+                return False
+            base_len, upto = snapshot.base_len, snapshot.num_rows
+            applied = deleted[deleted < upto]
+
+            # Every row in [base_len, upto) becomes a base row; ones with no live chunk are tombstones
+            dead = set(applied.tolist())
+            live = {}
+            for segment in segments:
+                for pos, row in enumerate(segment.rows.tolist()):
+                    live[row] = pos, segment
+            live_rows = np.array([r for r in sorted(live) if r not in dead], dtype=np.int64)
+            gaps = np.setdiff1d(np.arange(base_len, upto, dtype=np.int64), live_rows)
+
+            def new_records():
+                for row in range(base_len, upto):
+                    if row in live and row not in dead:
+                        pos, segment = live[row]
+                        yield segment.records[pos]
+                    else:
+                        yield _TOMBSTONE
+
+            bm25 = copy.copy(base.bm25)
+            bm25.add_documents(r["content"] for r in new_records())
+            tombstoned = np.union1d(applied, gaps)
+            if len(tombstoned):
+                bm25.delete(tombstoned)
+
+            vector_index = base.vector_index
+            if vector_index is not None:
+                located = [live[r] for r in live_rows.tolist()]
+                live_records = [segment.records[pos] for pos, segment in located]
+                embeddings = [segment.embeddings[pos] for pos, segment in located]
+                base_deleted = applied[applied < base_len]
+                if self.vector_db_type == "pinecone":
+                    # Pinecone is updated in place; the published snapshot filters those rows until the swap.
+                    # Deletes go first: a replaced document's new chunks can reuse the chunk ids of its old ones
+                    if len(base_deleted):
+                        vector_index.delete([base.store.chunk_id[int(r)] for r in base_deleted])
+                    if embeddings:
+                        vector_index.add(np.vstack(embeddings), ids=[r["id"] for r in live_records])
+                else:
+                    vector_index = vector_index.clone()
+                    if embeddings:
+                        vector_index.add(np.vstack(embeddings), ids=live_rows)
+                    vector_index.remove(base_deleted)
+
+            def base_records():
+                for row, record in enumerate(base.store.records()):
+                    yield _TOMBSTONE if row in dead else record
+
+            records = RecordStream([(base_len, base_records), (upto - base_len, new_records)])
+            near_dup = None
+            if self.near_dup is not None:
+                with self._write_lock:
+                    near_dup = self.near_dup.copy()
+            persisted = False
+            if self.persist:
+                sources = {}  # record source -> its (row, chunk id) among the new base rows
+                for row in live_rows.tolist():
+                    pos, segment = live[row]
+                    record = segment.records[pos]
+                    sources.setdefault(record["source"], []).append((row, record["id"]))
+                persisted = self._persist(base, bm25, vector_index, records, near_dup, dead, sources)
+            if persisted:
+                bm25 = BM25Index()
+                bm25.load(self.paths["bm25"])
+                store = ChunkStore.load(self.paths["chunks"])
+            else:
+                store = ChunkStore.from_records(list(records), near_dup=near_dup)
+
+            with self._write_lock:
+                current = self.snapshot
+                rest = current.segments[len(segments):]
+                # Rows deleted after this fold started stay filtered until the next one
+                self._publish(BaseSegment(bm25, vector_index, store), rest, np.setdiff1d(current.deleted, applied))
+            self.merges["folds"] += 1
+            return True
+
+    def _artifact_paths(self) -> List[str]:
+        return [self.paths["bm25"], self.paths["faiss"], self.paths["chunks"]]
+
+    def _persist(self, base: BaseSegment, bm25: BM25Index, vector_index, records, near_dup, dead: set,
+                 sources: dict) -> bool:
+        """
+        Writes a folded base over the ingested artifacts: into a staging copy of
+        the index directory, manifest last, swapped in by rename. Refused (False)
+        when the artifacts changed since this process loaded them.
+        dead: rows tombstoned by the fold; sources: record source -> [(row, chunk id)] of its new rows.
+        """
+        index_dir = os.path.dirname(os.path.abspath(self.paths["chunks"]))
+        with storage.locked(index_dir):
+            if artifact_fingerprint(self._artifact_paths()) != self._fingerprint:
+                print("WARNING: Index artifacts were rewritten since they were loaded (re-ingestion or another "
+                      "worker's fold); keeping this fold in memory only.")
+                self.persist = False
+                return False
+            manifest = Manifest.load(os.path.join(index_dir, MANIFEST_FILE))
+            with storage.atomic_dir(index_dir, carry_over=True) as staging:
+                if vector_index is not None:
+                    vector_index.save(os.path.join(staging, os.path.basename(self.paths["faiss"])))  # No-op for Pinecone
+                bm25.save(os.path.join(staging, os.path.basename(self.paths["bm25"])))
+                ChunkStore.save(records, os.path.join(staging, os.path.basename(self.paths["chunks"])),
+                                near_dup=near_dup)
+                if manifest is not None:
+                    # Files whose chunks were replaced or deleted through the API own their new rows from now on
+                    base_len = len(base.store)
+                    touched = set(sources) | {base.store.source[r] for r in dead if r < base_len}
+                    for path in touched & set(manifest.files):
+                        entry = manifest.files[path]
+                        kept = [(row, chunk_id) for chunk_id, row in zip(entry["chunk_ids"], entry["rows"])
+                                if row not in dead]
+                        kept += sources.get(path, [])
+                        manifest.reassign(path, [chunk_id for _, chunk_id in kept], [row for row, _ in kept])
+                    manifest.save(os.path.join(staging, MANIFEST_FILE))
+            self._fingerprint = artifact_fingerprint(self._artifact_paths())
+        return True
+
+    def merge(self) -> Optional[str]:
+        """Runs whichever merge is due ("fold" or "compaction"), if any."""
+        snapshot = self.snapshot
+        live_chunks = sum(len(s) for s in snapshot.segments)
+        if live_chunks >= self.fold_chunks or len(snapshot.deleted) >= self.fold_deletes:
+            return "fold" if self.fold() else None
+        if len(snapshot.segments) > self.max_segments:
+            return "compaction" if self.compact() else None
+        return None
+
+    def _start_merger(self):
+        self._wake.set()
+        if self._merger is None:
+            with self._write_lock:
+                if self._merger is None:
+                    self._merger = threading.Thread(target=self._merge_loop, name="live-index-merger", daemon=True)
+                    self._merger.start()
+
+    def _merge_loop(self):
+        while True:
+            self._wake.wait(self.merge_interval)
+            self._wake.clear()
+            try:
+                self.merge()
+            except Exception as e:
+                print(f"Live index merge failed: {e}")
+
+    def stats(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version,
+            "base_rows": snapshot.base_len,
+            "segments": len(snapshot.segments),
+            "live_chunks": sum(len(s) for s in snapshot.segments),
+            "deleted_rows": len(snapshot.deleted),
+            **self.merges,
+        }
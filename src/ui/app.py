@@ -8,6 +8,13 @@ st.set_page_config(page_title="Enterprise RAG Search", layout="wide")
 import os
 
 API_URL = os.getenv("API_URL", "http://localhost:8000/api/v1/chat")
+STREAM_URL = os.getenv("STREAM_URL", API_URL.rstrip("/") + "/stream")
+
+def sse_events(response):
+    """Parses a text/event-stream response into JSON event payloads."""
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith("data: "):
+            yield json.loads(line[len("data: "):])
 
 st.title("Enterprise RAG Search")
 
@@ -31,28 +38,45 @@ for msg in st.session_state.get("messages", []):
 
 if query:
     with st.chat_message("assistant"):
-        with st.spinner("Searching..."):
-            try:
-                payload = {
-                    "query": query,
-                    "top_k_retrieval": top_k_retrieval,
-                    "top_k_rerank": top_k_rerank,
-                    # "use_hyde": use_hyde
-                }
-                response = requests.post(API_URL, json=payload)
+        try:
+            payload = {
+                "query": query,
+                "top_k_retrieval": top_k_retrieval,
+                "top_k_rerank": top_k_rerank,
+                # "use_hyde": use_hyde
+            }
+            answer_box = st.empty()
+            answer = ""
+            context = []
+            with st.spinner("Searching..."):
+                response = requests.post(STREAM_URL, json=payload, stream=True)
                 response.raise_for_status()
-                data = response.json()
-                
-                answer = data["answer"]
-                st.write(answer)
-                
-                with st.expander("View Context"):
-                    for i, (doc, score) in enumerate(data["context"]):
-                        st.markdown(f"**Relevance Score:** {score:.4f}")
-                        st.text(doc)
-                        st.divider()
-                        
-                st.session_state.messages.append({"role": "assistant", "content": answer})
-                
-            except Exception as e:
-                st.error(f"Error: {e}")
+                events = sse_events(response)
+                # The context event arrives once retrieval and reranking are done
+                first = next(events, None)
+                if first is None:
+                    raise RuntimeError("The stream ended before any event was received")
+                if first["type"] == "error":
+                    raise RuntimeError(first["detail"])
+                context = first.get("context", [])
+
+            for event in events:
+                if event["type"] == "token":
+                    answer += event["content"]
+                    answer_box.write(answer + "▌")
+                elif event["type"] == "done":
+                    answer = event["answer"]
+                elif event["type"] == "error":
+                    raise RuntimeError(event["detail"])
+            answer_box.write(answer)
+            
+            with st.expander("View Context"):
+                for i, (doc, score) in enumerate(context):
+                    st.markdown(f"**Relevance Score:** {score:.4f}")
+                    st.text(doc)
+                    st.divider()
+                    
+            st.session_state.messages.append({"role": "assistant", "content": answer})
+            
+        except Exception as e:
+            st.error(f"Error: {e}")
@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional, Sequence
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching for model inference shared by concurrent requests.
+
+    Callers submit a list of items and block on a future. A single worker thread
+    drains the queue into one batch until it holds `max_batch_size` items or
+    `max_wait_ms` has passed since the first item arrived, runs `fn` once on the
+    concatenated items, and hands each caller back its own slice of the output.
+    """
+    def __init__(self, fn: Callable[[list], Sequence], max_batch_size: int = 64, max_wait_ms: float = 5.0,
+                 name: str = "batcher"):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_queue_depth = 0
+        # Batch sizes bucketed by power of two: {1: n, 2: n, 4: n, ...} (bucket = upper bound)
+        self.batch_size_histogram = {}
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def from_config(cls, fn: Callable[[list], Sequence], cfg: Optional[dict], name: str) -> Optional["MicroBatcher"]:
+        """Builds a batcher from a `batching` config section, or returns None if disabled."""
+        if not cfg or not cfg.get("enabled"):
+            return None
+        return cls(fn, max_batch_size=cfg.get("max_batch_size", 64), max_wait_ms=cfg.get("max_wait_ms", 5.0),
+                   name=name)
+
+    def submit(self, items: list):
+        """Runs fn on items as part of a shared batch; blocks until this caller's results are ready."""
+        if not items:
+            return self.fn(items)
+        future = Future()
+        self._queue.put((items, future))
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch, size
+
+    def _run(self):
+        while True:
+            batch, size = self._collect()
+            flat = [item for items, _ in batch for item in items]
+            try:
+                outputs = self.fn(flat)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for items, future in batch:
+                future.set_result(outputs[offset:offset + len(items)])
+                offset += len(items)
+
+            bucket = 1
+            while bucket < size:
+                bucket *= 2
+            with self._lock:
+                self.batches += 1
+                self.items += size
+                self.batch_size_histogram[bucket] = self.batch_size_histogram.get(bucket, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+                "batch_size_histogram": dict(sorted(self.batch_size_histogram.items())),
+            }
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+_WS_RE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Cache-key normalization: NFKC, lowercase, collapsed whitespace."""
+    return _WS_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip().lower()
+
+def text_digest(text: str) -> str:
+    """Short stable digest of a (normalized) string, for compact cache keys."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU map bounded by entry count and by approximate memory size.
+    `sizeof` returns the byte cost of a value; keys are charged by length.
+    """
+    def __init__(self, max_entries: int = 10000, max_bytes: Optional[int] = None,
+                 sizeof: Callable[[Any], int] = lambda value: 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _cost(self, key, value) -> int:
+        return len(key) + self.sizeof(value)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        cost = self._cost(key, value)
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._cost(key, self._data.pop(key))
+            if self.max_bytes is not None and cost > self.max_bytes:
+                return
+            self._data[key] = value
+            self._bytes += cost
+            while len(self._data) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                old_key, old_value = self._data.popitem(last=False)
+                self._bytes -= self._cost(old_key, old_value)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data.pop(key)
+            self._bytes -= self._cost(key, value)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class FileCache:
+    """
+    Bytes-valued cache in a local SQLite file, shared by every worker process
+    on the host. Bounded by entry count; the least recently written entries
+    are pruned once the table grows past max_entries.
+    """
+    def __init__(self, path: str, max_entries: int = 100000):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, written REAL)")
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, value: bytes):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO cache (key, value, written) VALUES (?, ?, ?)",
+                               (key, value, time.time()))
+            self._writes += 1
+            # Prune in bulk every so often instead of on every write
+            if self._writes % 1000 == 0:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY written DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,))
@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+class ComponentLoader:
+    """
+    Loads named components (models, index artifacts, clients) concurrently,
+    one background thread each, and records each one's state (loading,
+    ready, failed) and load time for readiness reporting. `get` blocks until
+    a component has loaded and re-raises its load error. Starting a component
+    whose load failed loads it again.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._components: Dict[str, dict] = {}
+
+    def _entry(self, name: str) -> Optional[dict]:
+        """A new entry to load `name` into, or None if it is loading or loaded already."""
+        with self._lock:
+            current = self._components.get(name)
+            if current is not None and current["state"] != "failed":
+                return None
+            entry = {"state": "loading", "started": time.perf_counter(), "seconds": None, "error": None,
+                     "value": None, "exception": None, "done": threading.Event()}
+            self._components[name] = entry
+            return entry
+
+    @staticmethod
+    def _load(entry: dict, fn: Callable, args: tuple, kwargs: dict):
+        try:
+            entry["value"] = fn(*args, **kwargs)
+            entry["state"] = "ready"
+        except Exception as e:
+            entry["exception"] = e
+            entry["error"] = f"{type(e).__name__}: {e}"
+            entry["state"] = "failed"
+        finally:
+            entry["seconds"] = round(time.perf_counter() - entry["started"], 3)
+            entry["done"].set()
+
+    def start(self, name: str, fn: Callable, *args, **kwargs):
+        """Starts loading `name` = fn(*args, **kwargs) in the background; no-op if loading or loaded."""
+        entry = self._entry(name)
+        if entry is not None:
+            threading.Thread(target=self._load, args=(entry, fn, args, kwargs), name=f"load-{name}",
+                             daemon=True).start()
+
+    def run(self, name: str, fn: Callable, *args, **kwargs) -> Any:
+        """Like start followed by get, but on the calling thread."""
+        entry = self._entry(name)
+        if entry is not None:
+            self._load(entry, fn, args, kwargs)
+        return self.get(name)
+
+    def get(self, name: str) -> Any:
+        with self._lock:
+            entry = self._components[name]
+        entry["done"].wait()
+        if entry["exception"] is not None:
+            raise entry["exception"]
+        return entry["value"]
+
+    def state(self, name: str) -> Optional[str]:
+        """loading | ready | failed, or None if the component was never started."""
+        with self._lock:
+            entry = self._components.get(name)
+        return None if entry is None else entry["state"]
+
+    def status(self) -> Dict[str, dict]:
+        """Per component: state, load seconds (elapsed so far while loading) and the error, if any."""
+        now = time.perf_counter()
+        with self._lock:
+            components = dict(self._components)
+        report = {}
+        for name, entry in components.items():
+            seconds = entry["seconds"]
+            if seconds is None:
+                seconds = round(now - entry["started"], 3)
+            report[name] = {"state": entry["state"], "seconds": seconds}
+            if entry["error"]:
+                report[name]["error"] = entry["error"]
+        return report
@@ -0,0 +1,81 @@
+"""
+Lightweight request tracing: named spans feed Prometheus histograms and, when
+a Trace is active in the current context, a per-request timing breakdown.
+
+    with start_trace() as trace:
+        with span("bm25"):
+            ...
+    trace.timings  # {"bm25": 3.1, ...} in milliseconds
+
+The active trace lives in a ContextVar. Work handed to a thread pool must be
+submitted through `in_context` so its spans land in the caller's trace.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+from prometheus_client import Counter, Histogram
+
+# Spans are short (sub-ms cache lookups) to long (LLM generation), hence the wide range
+LATENCY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_LATENCY = Histogram("rag_stage_latency_seconds", "Latency of a pipeline stage", ["stage"],
+                          buckets=LATENCY_BUCKETS)
+STAGE_ERRORS = Counter("rag_stage_errors_total", "Exceptions raised inside a pipeline stage", ["stage"])
+CACHE_EVENTS = Counter("rag_cache_events_total", "Cache lookups by cache and result (hit/miss)",
+                       ["cache", "result"])
+HTTP_LATENCY = Histogram("rag_http_request_seconds", "API request latency", ["method", "path", "status"],
+                         buckets=LATENCY_BUCKETS)
+RERANK_PAIRS = Counter("rag_rerank_pairs_total", "Query/chunk pairs scored by the cross-encoder")
+
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+
+
+class Trace:
+    """Per-request accumulator of span durations (ms); repeated spans are summed."""
+    def __init__(self):
+        self.timings = {}
+
+    def record(self, stage: str, seconds: float):
+        self.timings[stage] = round(self.timings.get(stage, 0.0) + seconds * 1000, 3)
+
+
+def record(stage: str, seconds: float, trace: Optional[Trace] = None):
+    """Records a duration measured by the caller (e.g. spanning generator yields)."""
+    STAGE_LATENCY.labels(stage).observe(seconds)
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.record(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def start_trace(trace: Optional[Trace] = None):
+    """Makes `trace` (or a new Trace) the active one for spans in this context."""
+    trace = trace or Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def in_context(fn: Callable) -> Callable:
+    """Binds fn to a copy of the current context, for executor.submit / run_in_executor."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+def cache_event(cache: str, hit: bool):
+    CACHE_EVENTS.labels(cache, "hit" if hit else "miss").inc()
@@ -0,0 +1,87 @@
+"""
+Synthetic corpora for benchmarks, seeded from the real documents in data/raw.
+
+Chunks are spliced from random spans of the cleaned seed text, so term
+statistics (vocabulary, Zipf tail, chunk length) stay close to production
+while the corpus can be scaled far past the seed size.
+"""
+import re
+import zlib
+from pathlib import Path
+from typing import Iterator, List
+import numpy as np
+from src.ingestion.readers import get_reader
+from src.ingestion.cleaner import clean_text
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class SyntheticCorpus:
+    def __init__(self, raw_dir: str = "data/raw", seed: int = 0, chunk_words: int = 256, spans_per_chunk: int = 4):
+        self.seed = seed
+        self.chunk_words = chunk_words
+        self.spans_per_chunk = spans_per_chunk
+        words = []
+        for path in sorted(Path(raw_dir).glob("*.*")):
+            try:
+                words.extend(clean_text(get_reader(path).read(path)).split())
+            except ValueError:
+                continue  # unsupported file type
+        if len(words) < chunk_words:
+            raise ValueError(f"Not enough seed text in {raw_dir} ({len(words)} words)")
+        self.words = np.array(words, dtype=object)
+
+    def chunks(self, n: int) -> Iterator[str]:
+        """n synthetic chunks, deterministic for a given seed."""
+        rng = np.random.default_rng(self.seed)
+        span = self.chunk_words // self.spans_per_chunk
+        for _ in range(n):
+            starts = rng.integers(0, len(self.words) - span, size=self.spans_per_chunk)
+            yield " ".join(" ".join(self.words[s:s + span]) for s in starts)
+
+    def records(self, n: int) -> List[dict]:
+        """ChunkStore / doc_map records: {"id", "source", "content"}."""
+        return [{"id": f"synthetic-{self.seed}-{i}", "source": f"synthetic/{i // 100}.txt", "content": chunk}
+                for i, chunk in enumerate(self.chunks(n))]
+
+    def queries(self, n: int, min_words: int = 3, max_words: int = 8) -> List[str]:
+        """Short queries cut from the seed text, so they have lexical and semantic matches."""
+        rng = np.random.default_rng(self.seed + 1)
+        queries = []
+        for _ in range(n):
+            length = int(rng.integers(min_words, max_words + 1))
+            start = int(rng.integers(0, len(self.words) - length))
+            queries.append(" ".join(self.words[start:start + length]))
+        return queries
+
+
+class HashingEmbedder:
+    """
+    Deterministic feature-hashing embedder (signed bag of words). No model
+    download, and fast enough to index millions of chunks, so FAISS can be
+    benchmarked at scales where the real embedder would dominate the run.
+    """
+    query_cache = None
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self._features = {}
+
+    def _feature(self, token: str):
+        feature = self._features.get(token)
+        if feature is None:
+            h = zlib.crc32(token.encode("utf-8"))
+            feature = self._features[token] = (h % self.dimension, 1.0 if (h >> 31) & 1 else -1.0)
+        return feature
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in _TOKEN_RE.findall(text.lower()):
+                dim, sign = self._feature(token)
+                out[i, dim] += sign
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        return self.embed(queries)
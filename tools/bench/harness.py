@@ -0,0 +1,89 @@
+"""Timing, memory and baseline-comparison helpers for the benchmark suite."""
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Sequence
+import numpy as np
+from src.llm.llm_client import LLMClient
+
+# Metrics gated against the baseline: name -> True if higher is better
+GATED_METRICS = {"p95_ms": False, "p99_ms": False, "qps": True, "seconds": False}
+
+
+class StubLLM(LLMClient):
+    """Local stand-in for the LLM so pipeline benchmarks measure only our own stages."""
+    def __init__(self, answer: str = "Benchmark answer.", delay_ms: float = 0.0):
+        self.answer = answer
+        self.delay = delay_ms / 1000.0
+
+    def chat(self, messages, **kwargs) -> str:
+        if self.delay:
+            time.sleep(self.delay)
+        return self.answer
+
+    def stream(self, messages, **kwargs) -> Iterator[str]:
+        for word in self.chat(messages).split(" "):
+            yield word + " "
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(fn: Callable, inputs: Sequence, warmup: int = 5, concurrency: int = 1) -> Dict[str, float]:
+    """
+    Calls fn on every input (after `warmup` untimed calls) and reports latency
+    percentiles, throughput over the whole run, and peak RSS.
+    With concurrency > 1 the calls run on a thread pool, as concurrent API requests would.
+    """
+    for item in inputs[:warmup]:
+        fn(item)
+
+    def timed(item):
+        start = time.perf_counter()
+        fn(item)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, inputs))
+    else:
+        latencies = [timed(item) for item in inputs]
+    wall = time.perf_counter() - start
+
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "n": len(inputs),
+        "concurrency": concurrency,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+        "qps": round(len(inputs) / wall, 2) if wall > 0 else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2) -> List[str]:
+    """
+    Regressions of `results` against `baseline` (both {size: {stage: metrics}}).
+    A metric regresses when it is worse than the baseline by more than `tolerance`
+    (relative). Sizes or stages missing from either side are not compared.
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, metrics in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if not base or "skipped" in metrics or "skipped" in base:
+                continue
+            for metric, higher_is_better in GATED_METRICS.items():
+                if metric not in metrics or not base.get(metric):
+                    continue
+                ratio = metrics[metric] / base[metric]
+                worse = ratio < 1 - tolerance if higher_is_better else ratio > 1 + tolerance
+                if worse:
+                    regressions.append(f"{size}/{stage}/{metric}: {base[metric]} -> {metrics[metric]} "
+                                       f"({(ratio - 1) * 100:+.1f}%)")
+    return regressions
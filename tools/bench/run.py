@@ -0,0 +1,208 @@
+"""
+Retrieval benchmark suite.
+
+    python -m tools.bench.run --sizes 10000,100000 --baseline tools/bench/baseline.json
+    python -m tools.bench.run --sizes 10000,100000 --save-baseline tools/bench/baseline.json
+
+For each corpus size: generates a synthetic corpus seeded from data/raw,
+builds BM25 / FAISS / chunk store with the ingestion components, then
+measures p50/p95/p99 latency, QPS and peak RSS of BM25 search, FAISS search,
+fusion, reranking and the full QueryPipeline (with a stub LLM). Each size
+runs in a fresh process so peak RSS is per size. Results are written as JSON;
+with --baseline the run exits non-zero if any gated metric regressed.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+
+from tools.bench.corpus import HashingEmbedder, SyntheticCorpus
+from tools.bench.harness import StubLLM, compare, measure, peak_rss_mb
+
+STAGES = ("bm25", "faiss", "fusion", "rerank", "pipeline")
+
+
+def _embedder(kind: str):
+    if kind == "model":
+        from src.embeddings.embedder import Embedder
+        return Embedder(model_name="all-MiniLM-L6-v2", batching={})
+    return HashingEmbedder()
+
+
+def build_indexes(records: list, index_dir: str, embedder, batch_size: int = 256) -> dict:
+    """Builds the same artifacts IngestionPipeline.run writes, timing each one."""
+    from src.indexer.bm25_index import BM25Index
+    from src.indexer.chunk_store import ChunkStore
+    from src.indexer.faiss_index import FaissIndex
+
+    os.makedirs(index_dir, exist_ok=True)
+    texts = [r["content"] for r in records]
+    timings = {}
+
+    start = time.perf_counter()
+    bm25 = BM25Index()
+    bm25.build(texts)
+    bm25.save(os.path.join(index_dir, "bm25"))
+    timings["build_bm25"] = {"seconds": round(time.perf_counter() - start, 3)}
+
+    start = time.perf_counter()
+    embeddings = np.vstack([embedder.embed(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)])
+    timings["build_embed"] = {"seconds": round(time.perf_counter() - start, 3)}
+
+    start = time.perf_counter()
+    index = FaissIndex.from_config(dimension=embeddings.shape[1])
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    index.save(os.path.join(index_dir, "faiss.index"))
+    timings["build_faiss"] = {"seconds": round(time.perf_counter() - start, 3)}
+
+    start = time.perf_counter()
+    ChunkStore.save(records, os.path.join(index_dir, "chunks"))
+    timings["build_chunk_store"] = {"seconds": round(time.perf_counter() - start, 3)}
+
+    for metrics in timings.values():
+        metrics["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return timings
+
+
+def run_size(size: int, args: dict) -> dict:
+    """Benchmarks one corpus size; runs in its own process."""
+    from src.indexer.bm25_index import BM25Index
+    from src.indexer.faiss_index import FaissIndex
+    from src.retriever.fusion import fuse
+
+    corpus = SyntheticCorpus(args["raw_dir"], seed=args["seed"], chunk_words=args["chunk_words"])
+    queries = corpus.queries(args["queries"])
+    embedder = _embedder(args["embedder"])
+    index_dir = os.path.join(args["work_dir"], str(size))
+    results = build_indexes(corpus.records(size), index_dir, embedder)
+
+    depth, top_k, stages, concurrency = args["depth"], args["top_k"], args["stages"], args["concurrency"]
+    bm25 = BM25Index()
+    bm25.load(os.path.join(index_dir, "bm25"))
+    faiss_index = FaissIndex(embedder.embed(["dimension probe"]).shape[1])
+    faiss_index.load(os.path.join(index_dir, "faiss.index"))
+    query_embeddings = embedder.embed_queries(queries)
+    positions = list(range(len(queries)))
+
+    bm25_hits = [bm25.search(q, top_k=depth) for q in queries]
+    distances, ids = faiss_index.search(query_embeddings, top_k=depth)
+    dense_hits = [(ids[i][ids[i] >= 0].astype(np.int32), -distances[i][ids[i] >= 0]) for i in positions]
+
+    def fused(i):
+        return fuse("rrf", (bm25_hits[i][0], dense_hits[i][0]), (bm25_hits[i][1], dense_hits[i][1]),
+                    (0.3, 0.7), top_k=top_k)
+
+    if "bm25" in stages:
+        results["bm25"] = measure(lambda q: bm25.search(q, top_k=depth), queries, concurrency=concurrency)
+    if "faiss" in stages:
+        results["faiss"] = measure(lambda i: faiss_index.search(query_embeddings[i:i + 1], top_k=depth), positions,
+                                   concurrency=concurrency)
+    if "fusion" in stages:
+        results["fusion"] = measure(fused, positions, concurrency=concurrency)
+
+    if "rerank" in stages or "pipeline" in stages:
+        try:
+            from src.indexer.chunk_store import ChunkStore
+            from src.reranker.cross_encoder import Reranker
+            reranker = Reranker(score_cache_size=0)
+        except Exception as e:  # model or sentence-transformers unavailable
+            reranker = None
+            skip = {"skipped": f"reranker unavailable: {e}"}
+            results.update({stage: skip for stage in ("rerank", "pipeline") if stage in stages})
+
+        if reranker is not None and "rerank" in stages:
+            store = ChunkStore.load(os.path.join(index_dir, "chunks"))
+            candidates = [store.texts(fused(i)[0][:args["rerank_depth"]]) for i in positions]
+            results["rerank"] = measure(lambda i: reranker.score(queries[i], candidates[i]), positions,
+                                        concurrency=concurrency)
+        if reranker is not None and "pipeline" in stages:
+            from src.pipeline.query_pipeline import QueryPipeline
+            pipeline = QueryPipeline(index_dir=index_dir, llm=StubLLM(), embedder=embedder)
+            results["pipeline"] = measure(lambda q: pipeline.run(q, top_k_retrieval=top_k), queries,
+                                          concurrency=concurrency)
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="comma-separated corpus sizes, in chunks")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"subset of {','.join(STAGES)}")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20, help="fused candidates (top_k_retrieval)")
+    parser.add_argument("--depth", type=int, default=40, help="candidates per backend before fusion")
+    parser.add_argument("--rerank-depth", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--embedder", choices=("hashing", "model"), default="hashing",
+                        help="hashing: fast synthetic vectors (any scale); model: the real sentence-transformer")
+    parser.add_argument("--chunk-words", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--raw-dir", default="data/raw")
+    parser.add_argument("--work-dir", default="data/bench")
+    parser.add_argument("--out", default="data/bench/results.json")
+    parser.add_argument("--baseline", help="baseline JSON to compare against; exit 1 on regression")
+    parser.add_argument("--save-baseline", help="also write the results to this path as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    config = vars(args) | {"stages": [s for s in args.stages.split(",") if s]}
+    results = {}
+    for size in sizes:
+        print(f"Benchmarking {size} chunks...")
+        # Fresh process per size: peak RSS is per size and nothing is warm from the previous run
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results[str(size)] = pool.submit(run_size, size, config).result()
+        for stage, metrics in results[str(size)].items():
+            print(f"  {stage:18s} {json.dumps(metrics)}")
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "args": config,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline and not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; skipping the regression check (record one with `make bench-baseline`)")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], tolerance=args.tolerance)
+        if regressions:
+            print(f"Performance regressions vs {args.baseline} (commit {baseline['meta']['commit']}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,11 @@ def debug_retrieval():
     
     embedder = Embedder()
     retriever = HybridRetriever(
-        bm25_path="data/index/bm25.pkl",
+        bm25_path="data/index/bm25",
         faiss_path="data/index/faiss.index",
-        doc_map_path="data/index/doc_map.pkl",
-        embedder=embedder
+        chunk_store_path="data/index/chunks",
+        embedder=embedder,
+        legacy_doc_map_path="data/index/doc_map.pkl"
     )
     
     reranker = Reranker()
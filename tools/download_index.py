@@ -1,12 +1,16 @@
 
 import os
 import sys
-from huggingface_hub import hf_hub_download
+from huggingface_hub import hf_hub_download, snapshot_download
 
 # Config
 REPO_ID = "yuvis/enterprise-rag-index"
 DATA_DIR = "data"
 INDEX_DIR = "data/index"
+# Pickle-free artifacts written by ingestion (memory-mapped at load time)
+INDEX_PATTERNS = ["index/bm25/*", "index/chunks/*"]
+# Legacy pickles, fetched only when the repo does not hold the directories yet
+LEGACY_FILES = ["index/bm25.pkl", "index/doc_map.pkl"]
 
 def download_index():
     print(f"🚀 Downloading index from {REPO_ID}...")
@@ -15,25 +19,27 @@ def download_index():
     os.makedirs(INDEX_DIR, exist_ok=True)
     
     try:
-        # Download BM25
-        print("Downloading BM25 Index...")
-        hf_hub_download(
+        # Download BM25 index and chunk store directories
+        print("Downloading BM25 Index and Chunk Store...")
+        snapshot_download(
             repo_id=REPO_ID,
-            filename="index/bm25.pkl",
-            repo_type="dataset",
-            local_dir=DATA_DIR,
-            local_dir_use_symlinks=False
-        )
-        
-        # Download Doc Map
-        print("Downloading Metadata Map...")
-        hf_hub_download(
-            repo_id=REPO_ID,
-            filename="index/doc_map.pkl",
             repo_type="dataset",
+            allow_patterns=INDEX_PATTERNS,
             local_dir=DATA_DIR,
             local_dir_use_symlinks=False
         )
+
+        if not (os.path.isdir(os.path.join(INDEX_DIR, "bm25")) and os.path.isdir(os.path.join(INDEX_DIR, "chunks"))):
+            # Index uploaded before the pickle-free format
+            print("No index directories in the repo; downloading the legacy pickles...")
+            for filename in LEGACY_FILES:
+                hf_hub_download(
+                    repo_id=REPO_ID,
+                    filename=filename,
+                    repo_type="dataset",
+                    local_dir=DATA_DIR,
+                    local_dir_use_symlinks=False
+                )
         print("✅ Download complete! Files baked into image.")
         
     except Exception as e:
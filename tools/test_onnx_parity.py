@@ -0,0 +1,76 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.embeddings.embedder import Embedder
+from src.reranker.cross_encoder import Reranker
+
+# Minimum cosine similarity between torch and ONNX embeddings, per quantization
+COSINE_TOLERANCE = {None: 0.999, "int8": 0.98}
+RERANK_TOP_K = 3
+
+QUERIES = [
+    "What were the company's operating profits?",
+    "Net sales increased compared to the previous year",
+    "Which company announced layoffs?",
+]
+
+def load_passages(limit: int = 32) -> list[str]:
+    passages = []
+    for path in sorted(Path("data/raw").glob("*.txt")):
+        text = path.read_text(encoding="utf-8", errors="ignore").strip()
+        if text:
+            passages.append(text[:1000])
+        if len(passages) >= limit:
+            break
+    return passages or QUERIES
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+def test_onnx_parity(quantization: str = None):
+    tolerance = COSINE_TOLERANCE["int8" if quantization else None]
+    passages = load_passages()
+    failures = 0
+
+    print(f"Embedder parity (quantization={quantization}, min cosine {tolerance})...")
+    reference = Embedder(batching={}, backend="torch")
+    candidate = Embedder(batching={}, backend="onnx", quantization=quantization)
+    ref_vecs, ref_time = timed(reference.embed, passages)
+    onnx_vecs, onnx_time = timed(candidate.embed, passages)
+    ref_vecs = ref_vecs / np.linalg.norm(ref_vecs, axis=1, keepdims=True)
+    onnx_vecs = onnx_vecs / np.linalg.norm(onnx_vecs, axis=1, keepdims=True)
+    cosines = np.sum(ref_vecs * onnx_vecs, axis=1)
+    print(f"  min cosine {cosines.min():.5f}, mean {cosines.mean():.5f}; "
+          f"torch {ref_time * 1000:.0f} ms, onnx {onnx_time * 1000:.0f} ms")
+    if cosines.min() < tolerance:
+        print("  FAIL: embeddings diverge")
+        failures += 1
+
+    print(f"Reranker parity (top-{RERANK_TOP_K} order must match)...")
+    reference = Reranker(score_cache_size=0, batching={}, backend="torch")
+    candidate = Reranker(score_cache_size=0, batching={}, backend="onnx", quantization=quantization)
+    for query in QUERIES:
+        ref_scores = np.asarray(reference.score(query, passages))
+        onnx_scores = np.asarray(candidate.score(query, passages))
+        ref_top = np.argsort(-ref_scores)[:RERANK_TOP_K].tolist()
+        onnx_top = np.argsort(-onnx_scores)[:RERANK_TOP_K].tolist()
+        diff = np.abs(ref_scores - onnx_scores).max()
+        print(f"  '{query}': max score diff {diff:.4f}, top-{RERANK_TOP_K} {ref_top} vs {onnx_top}")
+        if ref_top != onnx_top:
+            print("  FAIL: rerank order differs")
+            failures += 1
+
+    return failures
+
+if __name__ == "__main__":
+    # Usage: python tools/test_onnx_parity.py [avx2|avx512|avx512_vnni|arm64]
+    quantization = sys.argv[1] if len(sys.argv) > 1 else None
+    sys.exit(1 if test_onnx_parity(quantization) else 0)
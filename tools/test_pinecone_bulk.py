@@ -0,0 +1,95 @@
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.indexer.pinecone_index import PineconeIndex
+from src.indexer.pinecone_local import LocalPinecone
+
+DIMENSION = 384
+NUM_VECTORS = 5000
+NUM_QUERIES = 32
+TOP_K = 10
+# Simulated service behaviour: per-request latency and share of throttled (429) requests
+LATENCY_MS = 20
+THROTTLE_RATE = 0.1
+
+def make_index(workers: int) -> PineconeIndex:
+    client = LocalPinecone(latency_ms=LATENCY_MS, throttle_rate=THROTTLE_RATE)
+    return PineconeIndex(DIMENSION, client=client, workers=workers, backoff_seconds=0.01, max_backoff_seconds=0.1)
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+def test_pinecone_bulk(workers: int = 8):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(NUM_VECTORS, DIMENSION)).astype(np.float32)
+    ids = [str(uuid.UUID(int=i)) for i in range(NUM_VECTORS)]
+    queries = rng.normal(size=(NUM_QUERIES, DIMENSION)).astype(np.float32)
+    failures = 0
+
+    # Brute-force cosine reference
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ unit.T, axis=1)[:, :TOP_K]
+
+    results = {}
+    for pool in (1, workers):
+        index = make_index(pool)
+        _, upsert_time = timed(index.add, vectors, ids=ids)
+        (scores, hits), query_time = timed(index.search, queries, top_k=TOP_K)
+        stats = index.index.describe_index_stats()
+        results[pool] = (upsert_time, query_time)
+        print(f"workers={pool}: upsert {NUM_VECTORS} vectors {upsert_time:.2f}s, "
+              f"{NUM_QUERIES} queries {query_time:.2f}s, {index.retries} retries, "
+              f"{stats['total_vector_count']} vectors stored")
+
+        if stats["total_vector_count"] != NUM_VECTORS:
+            print("  FAIL: vectors lost despite retries")
+            failures += 1
+        wrong = sum(hit_ids != [ids[i] for i in row] for hit_ids, row in zip(hits, expected))
+        if wrong:
+            print(f"  FAIL: {wrong} queries differ from brute force")
+            failures += 1
+
+        index.delete(ids[:100])
+        if index.index.describe_index_stats()["total_vector_count"] != NUM_VECTORS - 100:
+            print("  FAIL: delete count")
+            failures += 1
+        # Deleted ids are gone from fetches and queries; every survivor still returns its own vector
+        gone = index._call(index.index.fetch, ids=ids[:100])["vectors"]
+        if gone:
+            print(f"  FAIL: {len(gone)} deleted ids still fetchable")
+            failures += 1
+        try:
+            survivors = index.fetch(ids[100:])
+        except KeyError as e:
+            print(f"  FAIL: surviving id {e} is missing after the delete")
+            survivors = None
+            failures += 1
+        if survivors is not None and not np.allclose(survivors, unit[100:], atol=1e-5):
+            print("  FAIL: surviving ids return other vectors after the delete")
+            failures += 1
+        _, hits = index.search(queries, top_k=TOP_K)
+        expected_live = 100 + np.argsort(-(queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ unit[100:].T,
+                                         axis=1)[:, :TOP_K]
+        wrong = sum(hit_ids != [ids[i] for i in row] for hit_ids, row in zip(hits, expected_live))
+        if wrong:
+            print(f"  FAIL: {wrong} queries after the delete differ from brute force over the survivors")
+            failures += 1
+
+    upsert_speedup = results[1][0] / results[workers][0]
+    query_speedup = results[1][1] / results[workers][1]
+    print(f"Speedup with {workers} workers: upsert x{upsert_speedup:.1f}, query x{query_speedup:.1f}")
+    return failures
+
+if __name__ == "__main__":
+    # Usage: python tools/test_pinecone_bulk.py [workers]
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    sys.exit(1 if test_pinecone_bulk(workers) else 0)